@@ -0,0 +1,172 @@
+"""
+Microbenchmark for response compression: bytes on the wire against CPU time per response for each available encoding, by endpoint.
+
+Payloads are built in memory the way the routes build them (GET /users/{userId} with N sessions, a batch of CLI command results, a CLI log export streamed in pages, and GET /hello-world), so no database is required. Transfer time is the compressed size at each --mbps link rate; compression pays off for a response when the time saved on the wire exceeds the CPU it costs. Streamed exports are compressed page by page with a flush per page, as CompressionMiddleware sends them.
+
+Usage:
+    python -m benchmarks.compression [--sessions 10 100 1000] [--rows 1000] [--mbps 1 10 100] [--seconds 0.5]
+"""
+
+import argparse
+import datetime
+import json
+import time
+from typing import Callable, Dict, List
+
+import project.compression
+import project.getHelloWorld_service
+import project.getUser_service
+from benchmarks.serialization import make_user
+
+LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+
+
+def user_payload(sessions: int) -> bytes:
+    return project.getUser_service.encode_json(
+        project.getUser_service.user_details_content(
+            make_user(sessions),
+            project.getUser_service.DEFAULT_USER_FIELDS,
+            sessions,
+        )
+    )
+
+
+def batch_payload(commands: int) -> bytes:
+    results = [
+        {"message": "Hello World" if i % 10 else "Command not recognized"}
+        for i in range(commands)
+    ]
+    return json.dumps({"results": results}, separators=(",", ":")).encode()
+
+
+def export_pages(rows: int, page_size: int) -> List[bytes]:
+    start = datetime.datetime(2024, 4, 23, 16, 8, 33, tzinfo=datetime.timezone.utc)
+    lines = [
+        json.dumps(
+            {
+                "id": i,
+                "userId": 1,
+                "time": (start + datetime.timedelta(seconds=i)).isoformat(),
+                "command": "hello",
+            },
+            separators=(",", ":"),
+        )
+        + "\n"
+        for i in range(rows)
+    ]
+    return [
+        "".join(lines[i : i + page_size]).encode() for i in range(0, rows, page_size)
+    ]
+
+
+def _one_shot(encoder: project.compression.Encoder, pages: List[bytes]) -> bytes:
+    return encoder.compress(pages[0])
+
+
+def _streamed(encoder: project.compression.Encoder, pages: List[bytes]) -> bytes:
+    stream = encoder.stream()
+    chunks = [stream.compress(page) + stream.flush() for page in pages[:-1]]
+    chunks.append(stream.compress(pages[-1]) + stream.finish())
+    return b"".join(chunks)
+
+
+def _measure(fn: Callable[[], bytes], seconds: float) -> float:
+    for _ in range(5):
+        fn()
+    iterations = 0
+    started = time.process_time()
+    while (elapsed := time.process_time() - started) < seconds:
+        fn()
+        iterations += 1
+    return elapsed / iterations
+
+
+def _compare(
+    pages: List[bytes],
+    compress: Callable,
+    encoders: List[project.compression.Encoder],
+    mbps: List[float],
+    seconds: float,
+) -> List[Dict[str, object]]:
+    size = sum(len(page) for page in pages)
+    identity_ms = {rate: size * 8 / (rate * 1e3) for rate in mbps}
+    results = [
+        {
+            "encoding": "identity",
+            "bytes": size,
+            "ratio": 1.0,
+            "cpu_us": 0.0,
+            **{
+                f"transfer_ms_{rate:g}mbps": round(identity_ms[rate], 3)
+                for rate in mbps
+            },
+        }
+    ]
+    for encoder in encoders:
+        compressed = len(compress(encoder, pages))
+        cpu = _measure(lambda: compress(encoder, pages), seconds)
+        result = {
+            "encoding": encoder.name,
+            "bytes": compressed,
+            "ratio": round(compressed / size, 3),
+            "cpu_us": round(cpu * 1e6, 1),
+        }
+        for rate in mbps:
+            transfer = compressed * 8 / (rate * 1e3)
+            result[f"transfer_ms_{rate:g}mbps"] = round(transfer, 3)
+            # Positive when compressing is faster end to end than sending identity bytes.
+            result[f"net_saved_ms_{rate:g}mbps"] = round(
+                identity_ms[rate] - transfer - cpu * 1e3, 3
+            )
+        results.append(result)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--mbps", type=float, nargs="*", default=[1, 10, 100])
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+    encoders = project.compression.available_encoders(["gzip", "br", "zstd"], LEVELS)
+    payloads = [
+        (
+            "GET /hello-world",
+            [project.getHelloWorld_service.HELLO_WORLD_RESPONSE_BODY],
+            _one_shot,
+        )
+    ]
+    payloads += [
+        (f"GET /users/{{userId}} ({count} sessions)", [user_payload(count)], _one_shot)
+        for count in args.sessions
+    ]
+    payloads += [
+        (
+            f"POST /api/cli/helloworld/batch ({args.rows} commands)",
+            [batch_payload(args.rows)],
+            _one_shot,
+        ),
+        (
+            f"GET /users/{{userId}}/logs/cli/export ({args.rows} rows, streamed)",
+            export_pages(args.rows, args.page_size),
+            _streamed,
+        ),
+    ]
+    report = {
+        "encodings": [encoder.name for encoder in encoders],
+        "min_size": project.compression.response_compressor.minimum_size,
+        "endpoints": [
+            {
+                "endpoint": name,
+                "results": _compare(pages, compress, encoders, args.mbps, args.seconds),
+            }
+            for name, pages, compress in payloads
+        ],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Microbenchmark for GET /hello-world comparing the validated response path with the precomputed fast path.
+
+The app is driven in-process through its ASGI interface, so the numbers measure framework and handler cost only, with no network or server overhead. No database is required.
+
+Usage:
+    python -m benchmarks.hello_world [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import project.server
+
+_SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/hello-world",
+    "raw_path": b"/hello-world",
+    "query_string": b"",
+    "root_path": "",
+    "headers": [(b"host", b"localhost")],
+    "client": ("127.0.0.1", 50000),
+    "server": ("localhost", 8000),
+}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _run(requests: int, fast_path: bool) -> float:
+    project.server.HELLO_WORLD_FAST_PATH = fast_path
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    app = project.server.app
+    for _ in range(min(requests, 500)):
+        await app(dict(_SCOPE), _receive, send)
+    statuses.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(_SCOPE), _receive, send)
+    elapsed = time.perf_counter() - started
+    assert statuses == [200] * requests, "unexpected response status"
+    return requests / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    legacy = asyncio.run(_run(args.requests, fast_path=False))
+    fast = asyncio.run(_run(args.requests, fast_path=True))
+    print(
+        json.dumps(
+            {
+                "endpoint": "GET /hello-world",
+                "requests": args.requests,
+                "legacy_rps": round(legacy, 1),
+                "fast_path_rps": round(fast, 1),
+                "speedup": round(fast / legacy, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Microbenchmark for GET /users/{userId} response serialization, comparing the validated response_model path with the FAST_SERIALIZATION path.
+
+Both paths start from the same in-memory Prisma User row with N sessions and end with the JSON body, so the numbers are CPU time per request spent turning rows into bytes. No database is required.
+
+Usage:
+    python -m benchmarks.serialization [--sessions 1 10 100 1000] [--seconds 1]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+from typing import Callable
+
+import prisma.enums
+import prisma.models
+import project.getUser_service
+import project.server
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+
+def make_user(sessions: int) -> prisma.models.User:
+    now = datetime.datetime(2024, 4, 23, 16, 8, 33, tzinfo=datetime.timezone.utc)
+    return prisma.models.User(
+        id=1,
+        email="bench@example.com",
+        password="x",
+        role=prisma.enums.Role.User,
+        version=1,
+        createdAt=now,
+        updatedAt=now,
+        sessions=[
+            prisma.models.Session(
+                id=i,
+                userId=1,
+                createdAt=now,
+                expiresAt=now + datetime.timedelta(hours=1),
+            )
+            for i in range(sessions)
+        ],
+    )
+
+
+def _response_field():
+    for route in project.server.app.routes:
+        if getattr(route, "path", None) == "/users/{userId}" and "GET" in route.methods:
+            return route.response_field
+    raise RuntimeError("GET /users/{userId} route not found")
+
+
+async def validated(user: prisma.models.User, field) -> bytes:
+    # What getUser followed by FastAPI's response handling does for each request.
+    content = project.getUser_service.user_details_content(
+        user, project.getUser_service.DEFAULT_USER_FIELDS, len(user.sessions)
+    )
+    res = project.getUser_service.UserDetailsResponse(**content)
+    body = await serialize_response(
+        field=field, response_content=res, exclude_unset=True
+    )
+    return JSONResponse(body).body
+
+
+async def fast(user: prisma.models.User, field) -> bytes:
+    return project.getUser_service.encode_json(
+        project.getUser_service.user_details_content(
+            user, project.getUser_service.DEFAULT_USER_FIELDS, len(user.sessions)
+        )
+    )
+
+
+async def _measure(
+    fn: Callable, user: prisma.models.User, field, seconds: float
+) -> float:
+    for _ in range(20):
+        await fn(user, field)
+    iterations = 0
+    started = time.process_time()
+    while (elapsed := time.process_time() - started) < seconds:
+        await fn(user, field)
+        iterations += 1
+    return elapsed / iterations
+
+
+async def _run(sessions: list, seconds: float) -> list:
+    field = _response_field()
+    results = []
+    for count in sessions:
+        user = make_user(count)
+        assert await validated(user, field) == await fast(user, field)
+        legacy = await _measure(validated, user, field, seconds)
+        compiled = await _measure(fast, user, field, seconds)
+        results.append(
+            {
+                "sessions": count,
+                "validated_us": round(legacy * 1e6, 1),
+                "fast_us": round(compiled * 1e6, 1),
+                "cpu_saved_us": round((legacy - compiled) * 1e6, 1),
+                "speedup": round(legacy / compiled, 2),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, nargs="*", default=[1, 10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+    results = asyncio.run(_run(args.sessions, args.seconds))
+    print(
+        json.dumps(
+            {"endpoint": "GET /users/{userId}", "per_request": results}, indent=2
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+-- Adds the User.version column used for conditional updates (PUT /users/{userId}?version=).
+--
+-- Databases created with `prisma db push` from the current schema.prisma already have it. Once
+-- CLILog/APILog are partitioned, `prisma db push` must not be used any more (it would drop the
+-- partitions it does not know about), so apply it with:
+--     prisma db execute --schema schema.prisma --file migrations/add_user_version.sql
+--
+-- Adding a column with a constant default does not rewrite the table. Safe to re-run.
+
+ALTER TABLE "User" ADD COLUMN IF NOT EXISTS "version" INTEGER NOT NULL DEFAULT 1;
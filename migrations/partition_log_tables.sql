@@ -0,0 +1,74 @@
+-- Converts CLILog and APILog into tables range-partitioned on their timestamp column.
+--
+-- Apply once, after `prisma db push` has created the tables:
+--     prisma db execute --schema schema.prisma --file migrations/partition_log_tables.sql
+--
+-- Each existing table is kept as the partition "<table>_legacy", covering everything up to the end
+-- of the current UTC day, and a "<table>_default" partition catches rows outside every range.
+-- project.partitions creates upcoming partitions and drops (or detaches) expired ones from then on.
+--
+-- Attaching the legacy table scans it once to check its rows fit the range and to build the
+-- (id, timestamp) primary key index, under an exclusive lock; on large tables run this in a
+-- maintenance window. Tables that are already partitioned are skipped, so the script can be re-run.
+
+DO $$
+DECLARE
+    log_table record;
+    legacy text;
+    cutoff timestamp(3);
+BEGIN
+    FOR log_table IN
+        SELECT * FROM (VALUES ('CLILog', 'executedAt'), ('APILog', 'requestTime')) AS t (name, time_column)
+    LOOP
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = log_table.name AND pg_table_is_visible(c.oid)
+        );
+        legacy := log_table.name || '_legacy';
+
+        EXECUTE format(
+            'SELECT date_trunc(''day'', greatest(max(%I), now() AT TIME ZONE ''UTC'')) + interval ''1 day'' FROM %I',
+            log_table.time_column, log_table.name
+        ) INTO cutoff;
+
+        -- Free the names Prisma expects, so the partitioned table matches schema.prisma.
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', log_table.name, legacy);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', legacy, log_table.name || '_pkey');
+        EXECUTE format(
+            'ALTER TABLE %I RENAME CONSTRAINT %I TO %I',
+            legacy, log_table.name || '_userId_fkey', legacy || '_userId_fkey'
+        );
+        EXECUTE format(
+            'ALTER INDEX %I RENAME TO %I',
+            log_table.name || '_userId_' || log_table.time_column || '_id_idx',
+            legacy || '_userId_' || log_table.time_column || '_id_idx'
+        );
+
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS, CONSTRAINT %I PRIMARY KEY ("id", %I)) PARTITION BY RANGE (%I)',
+            log_table.name, legacy, log_table.name || '_pkey', log_table.time_column, log_table.time_column
+        );
+        EXECUTE format(
+            'CREATE INDEX %I ON %I ("userId", %I, "id")',
+            log_table.name || '_userId_' || log_table.time_column || '_id_idx',
+            log_table.name, log_table.time_column
+        );
+        EXECUTE format(
+            'ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY ("userId") REFERENCES "User" ("id") ON DELETE CASCADE ON UPDATE CASCADE',
+            log_table.name, log_table.name || '_userId_fkey'
+        );
+        -- The id sequence must outlive the legacy partition once it is dropped.
+        EXECUTE format(
+            'ALTER SEQUENCE %I OWNED BY %I."id"', log_table.name || '_id_seq', log_table.name
+        );
+
+        EXECUTE format(
+            'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)',
+            log_table.name, legacy, cutoff
+        );
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I DEFAULT', log_table.name || '_default', log_table.name
+        );
+    END LOOP;
+END $$;
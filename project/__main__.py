@@ -0,0 +1,78 @@
+"""
+Production launcher: `python -m project`.
+
+Starts uvicorn with one worker per CPU (or WEB_CONCURRENCY), using uvloop and httptools when they are installed. It splits the Postgres connection budget across workers through Prisma's connection_limit URL parameter, so the total stays under max_connections.
+"""
+
+import importlib.util
+import logging
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def database_url_for_workers(database_url: str, workers: int) -> str:
+    """
+    Adds Prisma connection pool parameters to a database URL, giving each worker an equal share of DB_CONNECTION_BUDGET. Parameters already present in the URL are left untouched.
+
+    Args:
+        database_url (str): The configured DATABASE_URL.
+        workers (int): Number of server processes that will share the budget.
+
+    Returns:
+        str: The URL with connection_limit, pool_timeout and connect_timeout set.
+    """
+    budget = int(os.getenv("DB_CONNECTION_BUDGET", "80"))
+    defaults = {
+        "connection_limit": str(max(1, budget // workers)),
+        "pool_timeout": os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"),
+        "connect_timeout": os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"),
+    }
+    parts = urlsplit(database_url)
+    query = dict(parse_qsl(parts.query))
+    for key, value in defaults.items():
+        query.setdefault(key, value)
+    return urlunsplit(parts._replace(query=urlencode(query, safe="/:")))
+
+
+def main() -> None:
+    workers = worker_count()
+    # Workers inherit the environment, so the Prisma clients in each pick these up on connect.
+    for name in ("DATABASE_URL", "DATABASE_REPLICA_URL"):
+        database_url = os.getenv(name)
+        if database_url:
+            os.environ[name] = database_url_for_workers(database_url, workers)
+    loop = "uvloop" if _module_available("uvloop") else "asyncio"
+    http = "httptools" if _module_available("httptools") else "h11"
+    logger.info("Starting %d workers (loop=%s, http=%s)", workers, loop, http)
+    uvicorn.run(
+        "project.server:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=int(os.getenv("BACKLOG", "2048")),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_TIMEOUT_SECONDS", "75")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "20")),
+        proxy_headers=True,
+        access_log=os.getenv("ACCESS_LOG", "1") == "1",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import datetime
+import logging
+import os
+import random
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+import project.auth_tokens
+import project.log_writer
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parses a comma-separated list of 'METHOD /path=rate' rules, where rate is the fraction of requests to record (0 to 1) and /path is a route template.
+
+    Example:
+        parse_sample_rates("GET /users/{userId}=0.1")
+        > {'GET /users/{userId}': 0.1}
+    """
+    rates = {}
+    for rule in spec.split(","):
+        if not rule.strip():
+            continue
+        route, _, rate = rule.rpartition("=")
+        method, _, path = " ".join(route.split()).partition(" ")
+        rates[f"{method.upper()} {path}"] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class ApiAuditor:
+    """
+    Decides which authenticated API calls are written to APILog and hands them to the write-behind log writer.
+
+    Each route is sampled at its configured rate (the default rate for routes without one). Records are queued without waiting, and at most max_queued log records may be pending at once: under overload, audit records are dropped and counted instead of slowing requests down or growing memory, and CLILog writes keep the rest of the queue.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        default_rate: float,
+        rates: Dict[str, float],
+        max_queued: int,
+    ) -> None:
+        self.enabled = enabled
+        self.default_rate = default_rate
+        self.rates = rates
+        self.max_queued = max_queued
+        self.recorded = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.unauthenticated = 0
+
+    def record(
+        self,
+        user_id: Optional[int],
+        request_type: str,
+        request_time: datetime.datetime,
+    ) -> None:
+        if user_id is None:
+            self.unauthenticated += 1
+            return
+        rate = self.rates.get(request_type, self.default_rate)
+        if rate < 1 and random.random() >= rate:
+            self.sampled_out += 1
+            return
+        if project.log_writer.log_writer.offer_api_log(
+            userId=user_id,
+            requestType=request_type,
+            requestTime=request_time,
+            max_queued=self.max_queued,
+        ):
+            self.recorded += 1
+        else:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "unauthenticated": self.unauthenticated,
+        }
+
+
+def _token(scope: Scope) -> Optional[str]:
+    query_string = scope.get("query_string", b"")
+    if b"token" not in query_string:
+        return None
+    query = parse_qs(query_string.decode("latin-1"))
+    for param in project.auth_tokens.TOKEN_QUERY_PARAMS:
+        if param in query:
+            return query[param][0]
+    return None
+
+
+def _peek_user_id(token: str) -> Optional[int]:
+    # Runs outside the route's error handling, so a token that cannot be read must not fail the request.
+    try:
+        return project.auth_tokens.peek_user_id(token)
+    except Exception:
+        logger.exception("Could not identify the caller for auditing")
+        return None
+
+
+class ApiAuditMiddleware:
+    """
+    ASGI middleware that records calls carrying an auth token as APILog rows of "METHOD /route/template". The caller is identified without a database query (see project.auth_tokens.peek_user_id): before the request, so that e.g. a logout is attributed to the session it ends, or else after it, once the request has loaded the session into the cache. Calls whose user cannot be identified, including those with invalid, expired or revoked tokens, are not recorded.
+    """
+
+    def __init__(self, app: ASGIApp, auditor: ApiAuditor) -> None:
+        self.app = app
+        self.auditor = auditor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        token = (
+            _token(scope) if scope["type"] == "http" and self.auditor.enabled else None
+        )
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+        request_time = datetime.datetime.now(datetime.timezone.utc)
+        user_id = _peek_user_id(token)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                if user_id is None:
+                    user_id = _peek_user_id(token)
+                self.auditor.record(
+                    user_id, f"{scope['method']} {route.path}", request_time
+                )
+
+
+api_auditor = ApiAuditor(
+    enabled=os.getenv("API_AUDIT_ENABLED", "1") == "1",
+    default_rate=float(os.getenv("API_AUDIT_SAMPLE_RATE", "1")),
+    rates=parse_sample_rates(os.getenv("API_AUDIT_SAMPLE_RATES", "")),
+    max_queued=int(os.getenv("API_AUDIT_MAX_QUEUED", "5000")),
+)
@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import prisma
+import prisma.models
+import project.session_cache
+from project.session_cache import CachedSession
+
+logger = logging.getLogger(__name__)
+
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", "session")
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET", "")
+
+SIGNED_TOKEN_PREFIX = "st1."
+
+# Query parameters that carry an auth token on the routes of this API.
+TOKEN_QUERY_PARAMS = ("token", "session_token")
+
+
+def signed_tokens_enabled() -> bool:
+    return AUTH_TOKEN_MODE == "signed"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    if not AUTH_TOKEN_SECRET:
+        raise RuntimeError("AUTH_TOKEN_SECRET must be set to use signed tokens")
+    digest = hmac.new(
+        AUTH_TOKEN_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256
+    ).digest()
+    return _b64encode(digest)
+
+
+def issue_signed_token(
+    user_id: int, role: str, session_id: int, expires_at: datetime.datetime
+) -> str:
+    """
+    Issues an HMAC-signed token carrying everything needed to authorize a request, so it can be verified without a database read.
+
+    Args:
+        user_id (int): The id of the user the token belongs to.
+        role (str): The user's role at the time of issue.
+        session_id (int): The backing Session row, used for revocation.
+        expires_at (datetime.datetime): When the token stops being valid.
+
+    Returns:
+        str: The encoded token.
+    """
+    claims = {
+        "uid": user_id,
+        "role": role,
+        "sid": session_id,
+        "exp": int(expires_at.timestamp()),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{SIGNED_TOKEN_PREFIX}{payload}.{_sign(payload)}"
+
+
+def decode_signed_token(token: str) -> Optional[Tuple[int, CachedSession]]:
+    """
+    Verifies a signed token's signature and returns its session id and claims. Expiry and revocation are not checked here.
+
+    Args:
+        token (str): The token provided by the client.
+
+    Returns:
+        Optional[Tuple[int, CachedSession]]: The session id and claims, or None if the token is malformed, its signature does not match, or signed tokens are not enabled.
+    """
+    if not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    if not signed_tokens_enabled() or not AUTH_TOKEN_SECRET:
+        # Nothing could have issued it, and there is no secret to check it against.
+        return None
+    try:
+        payload, signature = token[len(SIGNED_TOKEN_PREFIX) :].split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        return claims["sid"], CachedSession(
+            userId=claims["uid"], role=claims["role"], expiresAt=float(claims["exp"])
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def is_token_well_formed(token: str) -> bool:
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        return signed_tokens_enabled()
+    return project.session_cache.parse_session_token(token) is not None
+
+
+def session_id_from_token(token: str) -> Optional[int]:
+    """
+    Returns the session id referenced by either a signed token or a 'token-{id}' session token.
+    """
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        decoded = decode_signed_token(token)
+        return decoded[0] if decoded else None
+    return project.session_cache.parse_session_token(token)
+
+
+def peek_user_id(token: str) -> Optional[int]:
+    """
+    Returns the id of the user a token belongs to when that is known without a database query: from a signed token's claims or from the session cache. Tokens that are expired or revoked return None, as do malformed ones.
+    """
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        decoded = decode_signed_token(token)
+        if decoded is None or revocation_list.is_revoked(decoded[0]):
+            return None
+        session = decoded[1]
+    else:
+        session_id = project.session_cache.parse_session_token(token)
+        if session_id is None or revocation_list.is_revoked(session_id):
+            return None
+        session = project.session_cache.session_cache.peek(session_id)
+    if session is None or not session.expiresAt or session.expiresAt <= time.time():
+        return None
+    return session.userId
+
+
+async def resolve_token(token: str) -> Optional[CachedSession]:
+    """
+    Resolves an auth token to its session. Signed tokens are verified with pure CPU work; session tokens go through the cached database lookup. Both are checked against the revocation list, so a session logged out or deleted on another worker is denied here even while this worker's cache still holds it. Callers are still responsible for checking expiresAt.
+
+    Args:
+        token (str): The token provided by the client.
+
+    Returns:
+        Optional[CachedSession]: The session, or None if the token is invalid, unknown or revoked.
+    """
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        decoded = decode_signed_token(token)
+        if decoded is None:
+            return None
+        session_id, session = decoded
+        if revocation_list.is_revoked(session_id):
+            return None
+        return session
+    session_id = project.session_cache.parse_session_token(token)
+    if session_id is None or revocation_list.is_revoked(session_id):
+        return None
+    return await project.session_cache.get_session(session_id)
+
+
+class RevocationList:
+    """
+    Compact in-memory denylist of revoked (logged-out or deleted) session ids, for both signed and session tokens. Entries are kept only until the session would have expired anyway. Each process periodically pulls revocations recorded by other workers and instances from the RevokedSession table, which bounds how long another worker's session cache can keep serving a revoked session to AUTH_REVOCATION_SYNC_SECONDS.
+
+    The sync cursor is the newest revokedAt read so far, not this process's clock, and each sync re-reads sync_overlap seconds behind it. Revocations stamped by an instance whose clock lags, or committed after a later one was already read, are still picked up as long as they are within the overlap.
+    """
+
+    def __init__(self, sync_interval: float, sync_overlap: float) -> None:
+        self.sync_interval = sync_interval
+        self.sync_overlap = datetime.timedelta(seconds=sync_overlap)
+        self._revoked: Dict[int, float] = {}
+        self._cursor: Optional[datetime.datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.syncs = 0
+        self.sync_failures = 0
+
+    def is_revoked(self, session_id: int) -> bool:
+        return session_id in self._revoked
+
+    def add(self, session_id: int, expires_at: Optional[float]) -> None:
+        self._revoked[session_id] = (
+            expires_at if expires_at is not None else float("inf")
+        )
+
+    def prune(self) -> None:
+        now = time.time()
+        for session_id in [s for s, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[session_id]
+
+    async def sync(self) -> None:
+        where = {}
+        if self._cursor is not None:
+            where["revokedAt"] = {"gte": self._cursor - self.sync_overlap}
+        rows = await prisma.models.RevokedSession.prisma().find_many(where=where)
+        for row in rows:
+            self.add(
+                row.sessionId, row.expiresAt.timestamp() if row.expiresAt else None
+            )
+            if self._cursor is None or row.revokedAt > self._cursor:
+                self._cursor = row.revokedAt
+        self.prune()
+        self.syncs += 1
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.sync()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "revoked": len(self._revoked),
+            "syncs": self.syncs,
+            "sync_failures": self.sync_failures,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                self.sync_failures += 1
+                logger.exception("Failed to sync token revocations")
+
+
+revocation_list = RevocationList(
+    sync_interval=float(os.getenv("AUTH_REVOCATION_SYNC_SECONDS", "5")),
+    sync_overlap=float(os.getenv("AUTH_REVOCATION_SYNC_OVERLAP_SECONDS", "300")),
+)
+
+
+async def revoke_sessions(
+    sessions: Iterable[Tuple[int, Optional[datetime.datetime]]]
+) -> None:
+    """
+    Revokes the tokens of the given sessions, locally right away and for other processes through the RevokedSession table.
+
+    Args:
+        sessions (Iterable[Tuple[int, Optional[datetime.datetime]]]): (session id, expiresAt) pairs to revoke.
+    """
+    rows = []
+    for session_id, expires_at in sessions:
+        revocation_list.add(session_id, expires_at.timestamp() if expires_at else None)
+        rows.append({"sessionId": session_id, "expiresAt": expires_at})
+    if rows:
+        await prisma.models.RevokedSession.prisma().create_many(
+            data=rows, skip_duplicates=True
+        )
@@ -0,0 +1,268 @@
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import prisma
+import prisma.enums
+import prisma.models
+import project.db
+import project.password_hashing
+from pydantic import BaseModel, ValidationError, field_validator
+
+
+class BulkUserInput(BaseModel):
+    """
+    One account to provision. Fields mirror the parameters of createUser.
+    """
+
+    username: str
+    password: str
+    role: prisma.enums.Role
+
+    @field_validator("password")
+    @classmethod
+    def _hashable(cls, password: str) -> str:
+        project.password_hashing.check_password_length(password)
+        return password
+
+
+class BulkCreateUserResult(BaseModel):
+    """
+    Outcome for one submitted row: 'created' with the new userId, 'duplicate' if the username already exists (or repeats earlier in the upload), or 'invalid' with the validation error.
+    """
+
+    index: int
+    username: Optional[str] = None
+    status: str
+    userId: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkCreateUsersResponse(BaseModel):
+    """
+    Per-row results of a bulk provisioning request, in submission order.
+    """
+
+    created: int
+    results: List[BulkCreateUserResult]
+
+
+def _insert_users_sql(count: int) -> str:
+    """
+    One multi-row INSERT for a chunk, in the manner of createUser's: usernames that are taken, including by a concurrent insert, are skipped rather than failing the chunk, and only the rows actually inserted are returned.
+    """
+    values = ", ".join(
+        f'(${3 * i + 1}, ${3 * i + 2}, ${3 * i + 3}::"Role")' for i in range(count)
+    )
+    return (
+        f'INSERT INTO "User" ("email", "password", "role") VALUES {values}\n'
+        'ON CONFLICT ("email") DO NOTHING\n'
+        'RETURNING "id", "email"'
+    )
+
+
+class BulkUploadError(Exception):
+    """
+    Raised when a bulk request is rejected part way through. Chunks processed before the failure stay inserted; created counts them.
+    """
+
+    def __init__(self, message: str, created: int) -> None:
+        super().__init__(message)
+        self.created = created
+
+
+class TooManyRowsError(BulkUploadError):
+    """
+    The request has more rows than allowed. Routes answer it with 413.
+    """
+
+
+class InvalidUploadError(BulkUploadError):
+    """
+    The uploaded body is not valid UTF-8. Routes answer it with 400.
+    """
+
+
+async def _create_chunk(
+    rows: List[BulkUserInput], indexes: List[int], seen: set
+) -> List[BulkCreateUserResult]:
+    results: Dict[int, BulkCreateUserResult] = {}
+    pending: List[int] = []
+    for offset, row in enumerate(rows):
+        if row.username in seen:
+            results[offset] = BulkCreateUserResult(
+                index=indexes[offset], username=row.username, status="duplicate"
+            )
+        else:
+            seen.add(row.username)
+            pending.append(offset)
+    # Usernames already taken are looked up first so their passwords are not hashed:
+    # a bcrypt hash costs far more than the query. The INSERT still decides the outcome.
+    emails = [rows[offset].username for offset in pending]
+    existing = {
+        user.email
+        for user in await prisma.models.User.prisma().find_many(
+            where={"email": {"in": emails}}
+        )
+    }
+    to_insert = [offset for offset in pending if rows[offset].username not in existing]
+    hashes = await asyncio.gather(
+        *(
+            project.password_hashing.hash_password(rows[offset].password)
+            for offset in to_insert
+        )
+    )
+    ids: Dict[str, int] = {}
+    if to_insert:
+        args: List[str] = []
+        for offset, hashed in zip(to_insert, hashes):
+            args += [rows[offset].username, hashed, rows[offset].role.value]
+        inserted = await prisma.get_client().query_raw(
+            _insert_users_sql(len(to_insert)), *args
+        )
+        ids = {row["email"]: int(row["id"]) for row in inserted}
+        project.db.replica_router.mark_written(
+            *(project.db.user_key(user_id) for user_id in ids.values())
+        )
+    for offset in pending:
+        username = rows[offset].username
+        if username in existing or username not in ids:
+            # Existing before the request, or inserted concurrently by someone else:
+            # the INSERT only returns the rows it actually created.
+            results[offset] = BulkCreateUserResult(
+                index=indexes[offset], username=username, status="duplicate"
+            )
+        else:
+            results[offset] = BulkCreateUserResult(
+                index=indexes[offset],
+                username=username,
+                status="created",
+                userId=ids[username],
+            )
+    return [results[offset] for offset in range(len(rows))]
+
+
+async def bulkCreateUsers(
+    rows: AsyncIterator[dict] | Iterable[dict],
+    chunk_size: int = 500,
+    max_rows: Optional[int] = None,
+) -> BulkCreateUsersResponse:
+    """
+    Provisions many users at once. Rows are validated, then processed in chunks: usernames that already exist are looked up with one query so no bcrypt work is spent on them, the remaining passwords are hashed in parallel on the bcrypt worker pool, and the chunk is inserted with a single INSERT ... ON CONFLICT DO NOTHING, whose returned rows tell created from duplicate (including usernames taken concurrently, after the lookup). Rows can come from a list or from an async stream (e.g. a CSV or NDJSON upload being parsed), so uploads are processed while they are still arriving.
+
+    Args:
+        rows (AsyncIterator[dict] | Iterable[dict]): Raw rows with username, password and role.
+        chunk_size (int): Rows hashed and inserted per database round trip.
+        max_rows (Optional[int]): Maximum rows accepted. A stream is cut off as soon as it goes past it, so an oversized upload is never read to the end.
+
+    Returns:
+        BulkCreateUsersResponse: Per-row results, in submission order.
+
+    Raises:
+        TooManyRowsError: More than max_rows rows were submitted.
+        InvalidUploadError: A streamed upload is not valid UTF-8.
+
+    Example:
+        await bulkCreateUsers([{"username": "a@example.com", "password": "pw", "role": "User"}])
+        > BulkCreateUsersResponse(created=1, results=[BulkCreateUserResult(index=0, username='a@example.com', status='created', userId=1, error=None)])
+    """
+    results: List[BulkCreateUserResult] = []
+    seen: set = set()
+    chunk: List[BulkUserInput] = []
+    chunk_indexes: List[int] = []
+
+    async def flush() -> None:
+        results.extend(await _create_chunk(chunk, chunk_indexes, seen))
+        chunk.clear()
+        chunk_indexes.clear()
+
+    def created() -> int:
+        return sum(result.status == "created" for result in results)
+
+    index = 0
+    try:
+        async for raw in _aiter(rows):
+            if max_rows is not None and index >= max_rows:
+                raise TooManyRowsError(f"Request exceeds {max_rows} users.", created())
+            try:
+                chunk.append(BulkUserInput.model_validate(raw))
+                chunk_indexes.append(index)
+            except ValidationError as e:
+                results.append(
+                    BulkCreateUserResult(
+                        index=index,
+                        username=raw.get("username") if isinstance(raw, dict) else None,
+                        status="invalid",
+                        error=str(e.errors()[0]["msg"]),
+                    )
+                )
+            index += 1
+            if len(chunk) >= chunk_size:
+                await flush()
+    except UnicodeDecodeError:
+        raise InvalidUploadError(
+            f"Upload is not valid UTF-8 (after row {index}).", created()
+        ) from None
+    if chunk:
+        await flush()
+    results.sort(key=lambda result: result.index)
+    return BulkCreateUsersResponse(created=created(), results=results)
+
+
+async def _aiter(rows: AsyncIterator[dict] | Iterable[dict]) -> AsyncIterator[dict]:
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """
+    Parses an NDJSON byte stream into rows as lines arrive. Lines that are not JSON objects are passed through so validation reports them as invalid.
+    """
+    async for line in _lines(chunks):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield {}
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """
+    Parses a CSV byte stream with a username,password,role header into rows as lines arrive. Each record must fit on one line: a record with a quoted field spanning several lines is read to its closing quote and passed through empty, so validation reports it as one invalid row.
+    """
+    header: Optional[List[str]] = None
+    multiline = False
+    async for line in _lines(chunks):
+        if multiline:
+            # An odd number of quotes closes the field opened on an earlier line.
+            if line.count('"') % 2:
+                multiline = False
+                yield {}
+            continue
+        if line.count('"') % 2:
+            multiline = True
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader(io.StringIO(line)))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield dict(zip(header, values))
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
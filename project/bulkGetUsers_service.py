@@ -0,0 +1,64 @@
+from typing import List
+
+import prisma
+import prisma.models
+import project.db
+import project.getUser_service
+from pydantic import BaseModel
+
+
+class BulkUsersResponse(BaseModel):
+    """
+    Users found for a bulk lookup, in the order their ids were requested, plus the ids that do not exist.
+    """
+
+    users: List[project.getUser_service.UserDetailsResponse]
+    missing: List[int]
+
+
+async def bulkGetUsers(
+    userIds: List[int], session_limit: int = 50, active_only: bool = False
+) -> BulkUsersResponse:
+    """
+    Retrieves many users by id with a single find_many query instead of one getUser call per id. Tombstoned users are reported as missing, as getUser reports them as not found.
+
+    Each user comes with the first page of their sessions, newest first, as getUser returns it; nextSessionCursor is set when more follow, to be fetched from GET /users/{userId}.
+
+    Args:
+        userIds (List[int]): Ids of the users to fetch. Duplicates are returned once.
+        session_limit (int): Maximum sessions returned per user.
+        active_only (bool): Only return sessions that have not expired.
+
+    Returns:
+        BulkUsersResponse: The users found, with their sessions, and the ids that were not.
+
+    Example:
+        await bulkGetUsers([1, 2, 99])
+        > BulkUsersResponse(users=[UserDetailsResponse(id=1, ...), UserDetailsResponse(id=2, ...)], missing=[99])
+    """
+    ids = list(dict.fromkeys(userIds))
+    users = await project.db.replica_router.read(
+        lambda client: prisma.models.User.prisma(client).find_many(
+            where={"id": {"in": ids}, "deletedAt": None},
+            include=project.getUser_service.sessions_include(
+                session_limit, None, active_only
+            ),
+        ),
+        *(project.db.user_key(user_id) for user_id in ids),
+    )
+    by_id = {user.id: user for user in users}
+    found = []
+    missing = []
+    for user_id in ids:
+        user = by_id.get(user_id)
+        if user is None:
+            missing.append(user_id)
+            continue
+        found.append(
+            project.getUser_service.UserDetailsResponse(
+                **project.getUser_service.user_details_content(
+                    user, project.getUser_service.DEFAULT_USER_FIELDS, session_limit
+                )
+            )
+        )
+    return BulkUsersResponse(users=found, missing=missing)
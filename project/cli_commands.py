@@ -0,0 +1,360 @@
+import enum
+import inspect
+import logging
+import shlex
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+import prisma.enums
+import project.metrics
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+UNRECOGNIZED_MESSAGE = "Command not recognized"
+
+# Metric label for commands that are not registered, so arbitrary input cannot create new series.
+_UNKNOWN_LABEL = "<unknown>"
+
+
+class CommandLogging(str, enum.Enum):
+    """
+    How an invocation is persisted to CLILog.
+
+    record: written as part of the request (in the batch endpoint, with the batch's bulk insert).
+    defer: handed to the write-behind log writer, so it never adds a database round trip to the request.
+    skip: not persisted, for commands that do not need an audit trail.
+
+    The single-command endpoint already sends recorded rows through the log writer, so record and defer behave the same there.
+    """
+
+    record = "record"
+    defer = "defer"
+    skip = "skip"
+
+
+class CommandContext(NamedTuple):
+    """
+    The caller of a command, as resolved from their token.
+    """
+
+    userId: int
+    role: str
+
+
+class Command:
+    """
+    A registered command. Everything needed to parse its arguments (positional order, flag names, the pydantic validator) is worked out here, once, so that dispatching an invocation is a dictionary lookup plus one validation call.
+    """
+
+    __slots__ = (
+        "name",
+        "handler",
+        "args_model",
+        "role",
+        "logging",
+        "description",
+        "is_async",
+        "positional",
+        "flags",
+        "_validate",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[..., Any],
+        args_model: Optional[Type[BaseModel]],
+        role: Optional[str],
+        logging: CommandLogging,
+        description: str,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.args_model = args_model
+        self.role = role
+        self.logging = logging
+        self.description = description
+        self.is_async = inspect.iscoroutinefunction(handler)
+        fields = args_model.model_fields if args_model is not None else {}
+        self.positional = tuple(fields)
+        self.flags = frozenset(
+            field_name
+            for field_name, field in fields.items()
+            if field.annotation is bool
+        )
+        self._validate = (
+            args_model.__pydantic_validator__.validate_python
+            if args_model is not None
+            else None
+        )
+
+    def allows(self, role: str) -> bool:
+        return self.role is None or role in (self.role, prisma.enums.Role.Admin)
+
+    def parse(self, tokens: List[str]) -> Any:
+        """
+        Maps command-line tokens onto the argument schema: bare tokens fill fields in declaration order, `--name value` or `--name=value` set a field by name, and `--name` alone sets a boolean field.
+
+        Raises:
+            ValueError: If the tokens do not match the schema.
+        """
+        if self._validate is None:
+            if tokens:
+                raise ValueError(f"'{self.name}' takes no arguments")
+            return None
+        values: Dict[str, Any] = {}
+        position = 0
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            index += 1
+            if token.startswith("--"):
+                key, has_value, value = token[2:].partition("=")
+                if key not in self.positional:
+                    raise ValueError(f"unknown option '--{key}'")
+                if not has_value:
+                    if key in self.flags:
+                        value = "true"
+                    elif index < len(tokens):
+                        value = tokens[index]
+                        index += 1
+                    else:
+                        raise ValueError(f"option '--{key}' needs a value")
+                values[key] = value
+                continue
+            while (
+                position < len(self.positional) and self.positional[position] in values
+            ):
+                position += 1
+            if position >= len(self.positional):
+                raise ValueError(f"unexpected argument '{token}'")
+            values[self.positional[position]] = token
+            position += 1
+        try:
+            return self._validate(values)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            raise ValueError(
+                f"{location}: {error['msg']}" if location else error["msg"]
+            )
+
+
+class Invocation(NamedTuple):
+    """
+    A parsed command line: the command it resolved to (None if unknown) and its validated arguments, or the error to report instead of running it.
+    """
+
+    name: str
+    command: Optional[Command]
+    args: Any
+    error: Optional[str]
+
+    @property
+    def logging(self) -> CommandLogging:
+        # Unknown and malformed commands are recorded too, as an audit trail of attempts.
+        return (
+            self.command.logging if self.command is not None else CommandLogging.record
+        )
+
+
+class CommandRegistry:
+    """
+    Table of CLI commands keyed by name. Handlers are registered with the command() decorator and receive the caller's CommandContext and their validated arguments (None for commands without an argument schema); they may be plain or async functions and return the message sent back to the CLI.
+
+    Every execution is timed into operation_duration_seconds{kind="cli_command"} and counted in cli_commands_total by command and outcome.
+    """
+
+    def __init__(self) -> None:
+        self._commands: Dict[str, Command] = {}
+        self.executed = 0
+        self.unknown = 0
+        self.invalid = 0
+        self.denied = 0
+        self.failed = 0
+
+    def register(
+        self,
+        name: str,
+        handler: Callable[..., Any],
+        args: Optional[Type[BaseModel]] = None,
+        role: Optional[str] = None,
+        logging: CommandLogging = CommandLogging.record,
+        description: str = "",
+    ) -> Command:
+        """
+        Adds a command to the table.
+
+        Args:
+            name (str): The first word of the command line.
+            handler (Callable[..., Any]): Called as handler(context, args).
+            args (Optional[Type[BaseModel]]): Schema of the command's arguments; fields are filled positionally in declaration order or by --name.
+            role (Optional[str]): Role required to run the command. Admins may run every command.
+            logging (CommandLogging): How invocations are persisted to CLILog.
+            description (str): One-line help text.
+
+        Returns:
+            Command: The registered command.
+        """
+        if name in self._commands:
+            raise ValueError(f"Command '{name}' is already registered")
+        command = Command(name, handler, args, role, logging, description)
+        self._commands[name] = command
+        return command
+
+    def command(
+        self,
+        name: str,
+        args: Optional[Type[BaseModel]] = None,
+        role: Optional[str] = None,
+        logging: CommandLogging = CommandLogging.record,
+        description: str = "",
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """
+        Decorator form of register().
+
+        Example:
+            @registry.command("hello", description="Print a greeting.")
+            def hello(context, args):
+                return "Hello World"
+        """
+
+        def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(name, handler, args, role, logging, description)
+            return handler
+
+        return decorator
+
+    def get(self, name: str) -> Optional[Command]:
+        return self._commands.get(name)
+
+    def commands(self) -> List[Command]:
+        return list(self._commands.values())
+
+    def resolve(self, line: str) -> Invocation:
+        """
+        Splits a command line into its name and arguments and validates them against the command's schema. Does not check the caller's role, which execute() does.
+
+        A line naming no registered command, or giving arguments to a command that takes none, is unrecognized; arguments that do not match a command's schema are reported as invalid, with the reason.
+        """
+        try:
+            tokens = _split(line)
+        except ValueError as e:
+            return Invocation(line, None, None, f"Invalid command: {e}")
+        if not tokens:
+            return Invocation("", None, None, UNRECOGNIZED_MESSAGE)
+        name, rest = tokens[0], tokens[1:]
+        command = self._commands.get(name)
+        if command is None or (command.args_model is None and rest):
+            # A command without arguments only matches on its own, so "hello extra" is
+            # still answered "Command not recognized", as before the registry.
+            return Invocation(name, None, None, UNRECOGNIZED_MESSAGE)
+        try:
+            return Invocation(name, command, command.parse(rest), None)
+        except ValueError as e:
+            return Invocation(
+                name, command, None, f"Invalid arguments for '{name}': {e}"
+            )
+
+    async def execute(self, invocation: Invocation, context: CommandContext) -> str:
+        """
+        Runs a resolved invocation for the caller and returns the message for the CLI. Errors (unknown command, bad arguments, missing role, handler exceptions) are reported as messages rather than raised.
+        """
+        started = time.perf_counter()
+        command = invocation.command
+        label = command.name if command is not None else _UNKNOWN_LABEL
+        if command is None:
+            self.unknown += 1
+            outcome, message = "unknown", invocation.error or UNRECOGNIZED_MESSAGE
+        elif invocation.error is not None:
+            self.invalid += 1
+            outcome, message = "invalid", invocation.error
+        elif not command.allows(context.role):
+            self.denied += 1
+            outcome, message = "denied", "Permission denied."
+        else:
+            try:
+                result = command.handler(context, invocation.args)
+                message = await result if command.is_async else result
+                self.executed += 1
+                outcome = "ok"
+            except Exception:
+                logger.exception("CLI command '%s' failed", command.name)
+                self.failed += 1
+                outcome, message = "error", "Command failed."
+        project.metrics.registry.observe(
+            "operation_duration_seconds",
+            time.perf_counter() - started,
+            kind="cli_command",
+            operation=label,
+        )
+        project.metrics.registry.inc(
+            "cli_commands_total", command=label, outcome=outcome
+        )
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "commands": len(self._commands),
+            "executed": self.executed,
+            "unknown": self.unknown,
+            "invalid": self.invalid,
+            "denied": self.denied,
+            "failed": self.failed,
+        }
+
+
+def _split(line: str) -> List[str]:
+    # shlex is only needed for quoted arguments; plain command lines split much faster.
+    if '"' in line or "'" in line or "\\" in line:
+        return shlex.split(line)
+    return line.split()
+
+
+registry = CommandRegistry()
+
+
+@registry.command("hello", description="Print a greeting.")
+def _hello(context: CommandContext, args: None) -> str:
+    return "Hello World"
+
+
+class HelpArgs(BaseModel):
+    """
+    Arguments of the 'help' command.
+    """
+
+    command: Optional[str] = None
+
+
+@registry.command(
+    "help",
+    args=HelpArgs,
+    logging=CommandLogging.skip,
+    description="List the commands you can run, or describe one.",
+)
+def _help(context: CommandContext, args: HelpArgs) -> str:
+    if args.command is not None:
+        command = registry.get(args.command)
+        if command is None or not command.allows(context.role):
+            return UNRECOGNIZED_MESSAGE
+        return _describe(command)
+    return "\n".join(
+        _describe(command)
+        for command in registry.commands()
+        if command.allows(context.role)
+    )
+
+
+def _describe(command: Command) -> str:
+    fields = command.args_model.model_fields if command.args_model else {}
+    usage: Tuple[str, ...] = (command.name,) + tuple(
+        (
+            f"[--{name}]"
+            if name in command.flags
+            else f"<{name}>" if fields[name].is_required() else f"[{name}]"
+        )
+        for name in command.positional
+    )
+    return f"{' '.join(usage)}: {command.description}".rstrip(": ")
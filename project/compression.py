@@ -0,0 +1,338 @@
+import abc
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency; br is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency; zstd is not offered without it
+    zstandard = None
+
+# Content types worth compressing; everything this API returns is JSON, NDJSON, CSV or text.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+)
+
+
+class StreamCompressor(abc.ABC):
+    """
+    Incremental compressor for one chunked response. compress() may buffer input; flush() emits everything so far as a complete block the client can decode, and finish() ends the stream.
+    """
+
+    @abc.abstractmethod
+    def compress(self, data: bytes) -> bytes: ...
+
+    @abc.abstractmethod
+    def flush(self) -> bytes: ...
+
+    @abc.abstractmethod
+    def finish(self) -> bytes: ...
+
+
+class Encoder(abc.ABC):
+    """
+    One content coding (the Content-Encoding token it is negotiated as) at a fixed compression level.
+    """
+
+    name = ""
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    @abc.abstractmethod
+    def compress(self, data: bytes) -> bytes: ...
+
+    @abc.abstractmethod
+    def stream(self) -> StreamCompressor: ...
+
+
+class _ZlibStream(StreamCompressor):
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class GzipEncoder(Encoder):
+    name = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        # wbits=31 writes a gzip header and trailer around the deflate stream.
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self) -> StreamCompressor:
+        return _ZlibStream(self.level)
+
+
+class _BrotliStream(StreamCompressor):
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class BrotliEncoder(Encoder):
+    name = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self) -> StreamCompressor:
+        return _BrotliStream(self.level)
+
+
+class _ZstdStream(StreamCompressor):
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class ZstdEncoder(Encoder):
+    name = "zstd"
+
+    def __init__(self, level: int) -> None:
+        super().__init__(level)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def stream(self) -> StreamCompressor:
+        return _ZstdStream(self.level)
+
+
+def available_encoders(names: Sequence[str], levels: Dict[str, int]) -> List[Encoder]:
+    """
+    Builds encoders for the requested codings, in the given (server preference) order, skipping those whose library is not installed.
+    """
+    classes = {"gzip": GzipEncoder}
+    if brotli is not None:
+        classes["br"] = BrotliEncoder
+    if zstandard is not None:
+        classes["zstd"] = ZstdEncoder
+    return [classes[name](levels[name]) for name in names if name in classes]
+
+
+def negotiate(accept_encoding: str, encoders: Sequence[Encoder]) -> Optional[Encoder]:
+    """
+    Picks the encoder the client prefers by Accept-Encoding q-value, breaking ties by server preference (the order of encoders). Returns None if the client accepts none of them.
+
+    Example:
+        negotiate("gzip;q=0.8, br", [ZstdEncoder(3), BrotliEncoder(4), GzipEncoder(6)])
+        > BrotliEncoder
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best: Optional[Tuple[float, Encoder]] = None
+    for encoder in encoders:
+        weight = weights.get(encoder.name, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[0]):
+            best = (weight, encoder)
+    return best[1] if best else None
+
+
+class ResponseCompressor:
+    """
+    Compression settings and counters shared by every CompressionMiddleware instance: the encoders offered, in server preference order, the smallest body worth compressing, and how much streamed input to buffer between flushes.
+    """
+
+    def __init__(
+        self,
+        encoders: Sequence[Encoder],
+        minimum_size: int,
+        stream_flush_size: int,
+    ) -> None:
+        self.encoders = list(encoders)
+        self.minimum_size = minimum_size
+        self.stream_flush_size = stream_flush_size
+        self.compressed = 0
+        self.streamed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "encodings": [encoder.name for encoder in self.encoders],
+            "compressed": self.compressed,
+            "streamed": self.streamed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+        }
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses JSON, NDJSON and text responses with the best coding the client accepts (zstd, br or gzip, as installed and configured).
+
+    A response sent in one piece is compressed whole, unless it is smaller than minimum_size and not worth the CPU (e.g. /hello-world and error bodies). A chunked response (log exports, streamed batch results) is compressed as it is produced: the compressor is flushed once stream_flush_size bytes have gone in, so the client still receives data as it is generated, without a flush per line. A strong ETag is made weak on compressed responses, as the bytes differ from the identity representation.
+    """
+
+    def __init__(self, app: ASGIApp, compressor: ResponseCompressor) -> None:
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.compressor.encoders:
+            await self.app(scope, receive, send)
+            return
+        encoder = negotiate(
+            Headers(scope=scope).get("accept-encoding", ""), self.compressor.encoders
+        )
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressedResponder(self.compressor, encoder, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressedResponder:
+    def __init__(
+        self, compressor: ResponseCompressor, encoder: Encoder, send: Send
+    ) -> None:
+        self.compressor = compressor
+        self.encoder = encoder
+        self._send = send
+        self.start: Optional[Message] = None
+        self.stream: Optional[StreamCompressor] = None
+        self.passthrough = False
+        self.buffered: List[bytes] = []
+        self.pending = 0
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is not None:
+            await self._send_chunk(body, more_body)
+            return
+        headers = MutableHeaders(raw=self.start["headers"])
+        if not self._compressible(headers, body, more_body):
+            self.passthrough = True
+            self.compressor.skipped += 1
+            await self._send(self.start)
+            await self._send(message)
+            return
+        headers["Content-Encoding"] = self.encoder.name
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if not more_body:
+            compressed = self.encoder.compress(body)
+            headers["Content-Length"] = str(len(compressed))
+            self.compressor.compressed += 1
+            self.compressor.bytes_in += len(body)
+            self.compressor.bytes_out += len(compressed)
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        self.stream = self.encoder.stream()
+        self.compressor.streamed += 1
+        await self._send(self.start)
+        await self._send_chunk(body, more_body)
+
+    def _compressible(
+        self, headers: MutableHeaders, body: bytes, more_body: bool
+    ) -> bool:
+        status = self.start["status"]
+        if status < 200 or status in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        if "no-transform" in headers.get("cache-control", ""):
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get("content-length")
+        if length is not None and length.isdigit():
+            return int(length) >= self.compressor.minimum_size
+        return more_body or len(body) >= self.compressor.minimum_size
+
+    async def _send_chunk(self, body: bytes, more_body: bool) -> None:
+        # Compressor output is held back until the next flush, so no tiny frames are sent.
+        self.buffered.append(self.stream.compress(body))
+        self.pending += len(body)
+        self.compressor.bytes_in += len(body)
+        if not more_body:
+            self.buffered.append(self.stream.finish())
+        elif self.pending >= self.compressor.stream_flush_size:
+            self.buffered.append(self.stream.flush())
+        else:
+            return
+        output = b"".join(self.buffered)
+        self.buffered = []
+        self.pending = 0
+        self.compressor.bytes_out += len(output)
+        await self._send(
+            {"type": "http.response.body", "body": output, "more_body": more_body}
+        )
+
+
+response_compressor = ResponseCompressor(
+    encoders=available_encoders(
+        [
+            name.strip()
+            for name in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+            if name.strip()
+        ],
+        levels={
+            "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+            "br": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+            "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+        },
+    ),
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    stream_flush_size=int(os.getenv("COMPRESSION_STREAM_FLUSH_BYTES", "16384")),
+)
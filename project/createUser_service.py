@@ -1,9 +1,18 @@
 from enum import Enum
 
 import prisma
-import prisma.models
+import project.db
+import project.password_hashing
 from pydantic import BaseModel
 
+# One statement whether or not the email is taken: a duplicate inserts nothing and returns no row,
+# rather than failing with a unique violation.
+_INSERT_USER_SQL = """
+INSERT INTO "User" ("email", "password", "role") VALUES ($1, $2, $3::"Role")
+ON CONFLICT ("email") DO NOTHING
+RETURNING "id"
+"""
+
 
 class CreateUserResponse(BaseModel):
     """
@@ -30,11 +39,20 @@ async def createUser(username: str, password: str, role: Role) -> CreateUserResp
     Returns:
         CreateUserResponse: This model represents the response payload after creating a new user. It includes the user ID of the newly created user.
 
+    Raises:
+        project.db.WriteConflictError: A user with this username already exists.
+        project.password_hashing.PasswordTooLongError: The password is longer than bcrypt allows.
+
     Example:
         createUser("john.doe@example.com", "securepassword123", Role.Admin)
         > CreateUserResponse(userId=1)
     """
-    new_user = await prisma.models.User.prisma().create(
-        data={"email": username, "password": password, "role": role.value}
+    hashed_password = await project.password_hashing.hash_password(password)
+    row = await prisma.get_client().query_first(
+        _INSERT_USER_SQL, username, hashed_password, role.value
     )
-    return CreateUserResponse(userId=new_user.id)
+    if row is None:
+        raise project.db.WriteConflictError(f"User {username} already exists.")
+    user_id = int(row["id"])
+    project.db.replica_router.mark_written(project.db.user_key(user_id))
+    return CreateUserResponse(userId=user_id)
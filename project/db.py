@@ -0,0 +1,326 @@
+import asyncio
+import contextlib
+import datetime
+import functools
+import heapq
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import prisma
+import prisma.errors
+import project.metrics
+import project.resilience
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class InstrumentedPrisma(Prisma):
+    """
+    Prisma client that records the duration of every query in the metrics registry and runs it through the circuit breaker, within the current request's deadline. Every model action and raw query funnels through _execute, including those made inside transactions, which are copies of this class.
+    """
+
+    # None for clients that handle failures themselves (the read replica); they still honour deadlines.
+    breaker: Optional[project.resilience.CircuitBreaker] = (
+        project.resilience.circuit_breaker
+    )
+
+    async def _execute(
+        self,
+        *,
+        method: Any,
+        arguments: dict[str, Any],
+        model: Any = None,
+        root_selection: list[str] | None = None,
+    ) -> Any:
+        operation = f"{model.__name__}.{method}" if model is not None else method
+        query = functools.partial(
+            super()._execute,
+            method=method,
+            arguments=arguments,
+            model=model,
+            root_selection=root_selection,
+        )
+        with project.metrics.registry.timer(
+            "operation_duration_seconds", kind="db", operation=operation
+        ):
+            if self.breaker is None:
+                return await project.resilience.with_deadline(query)
+            return await self.breaker.call(query)
+
+
+_TRY_ADVISORY_LOCK_SQL = 'SELECT pg_try_advisory_xact_lock(hashtext($1)) AS "locked"'
+
+
+@contextlib.asynccontextmanager
+async def try_advisory_lock(name: str, hold_seconds: float) -> AsyncIterator[bool]:
+    """
+    Tries, without waiting, to take the Postgres advisory lock called name, which is shared by every worker and instance using the database. Yields whether it was taken; it is held until the block exits, or for at most hold_seconds.
+
+    The lock is transaction-scoped and taken in a transaction that does nothing else, which keeps it on one pooled connection (a session-level lock could be released on a different connection than the one holding it). The transaction writes nothing, so it holds back neither vacuum nor other writers.
+
+    Example:
+        async with try_advisory_lock("maintenance", 300) as locked:
+            if locked:
+                ...  # no other worker is in this block
+    """
+    transaction = prisma.get_client().tx(
+        timeout=datetime.timedelta(seconds=hold_seconds)
+    )
+    client = await transaction.start()
+    try:
+        rows = await client.query_raw(_TRY_ADVISORY_LOCK_SQL, name)
+        yield bool(rows[0]["locked"])
+    finally:
+        try:
+            await transaction.rollback()
+        except prisma.errors.TransactionError:
+            logger.warning(
+                "Advisory lock %r was released after %.0fs, before its holder finished",
+                name,
+                hold_seconds,
+            )
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def session_key(session_id: int) -> str:
+    return f"session:{session_id}"
+
+
+class WriteConflictError(Exception):
+    """
+    Raised when a conditional write does not apply because it conflicts with existing data, e.g. an email that is already taken or a stale version number. Routes answer it with 409.
+    """
+
+
+class ReplicaRouter:
+    """
+    Routes read-only queries to a read replica and everything else to the primary (the auto-registered client).
+
+    Replicas lag behind the primary, so after a write the affected user or session is pinned to the primary for a short read-your-writes window. The window is tracked per process; reads that find nothing on the replica can also be retried on the primary, which covers a login handled by another worker. If the replica is unreachable or a query on it fails, the read is retried on the primary and the replica is skipped until retry_interval has passed.
+    """
+
+    def __init__(
+        self,
+        replica_url: Optional[str],
+        read_your_writes_seconds: float,
+        retry_interval: float,
+        max_pinned_keys: int,
+    ) -> None:
+        self.replica_url = replica_url
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.retry_interval = retry_interval
+        self.max_pinned_keys = max_pinned_keys
+        self._client: Optional[Prisma] = None
+        self._pinned: "OrderedDict[str, float]" = OrderedDict()
+        self._unavailable_until = 0.0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.missing_retries = 0
+        self.fallbacks = 0
+
+    async def start(self) -> None:
+        if not self.replica_url or self._client is not None:
+            return
+        client = InstrumentedPrisma(datasource={"url": self.replica_url})
+        client.breaker = None
+        try:
+            await client.connect()
+        except Exception:
+            logger.exception(
+                "Could not connect to the read replica; reading from the primary"
+            )
+            return
+        self._client = client
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.disconnect()
+            self._client = None
+
+    def mark_written(self, *keys: str) -> None:
+        """
+        Pins the given user/session keys to the primary for the read-your-writes window, and stops later reads of them from joining lookups that were already in flight before the write.
+        """
+        single_flight.forget(*keys)
+        if self._client is None or self.read_your_writes_seconds <= 0:
+            return
+        deadline = time.monotonic() + self.read_your_writes_seconds
+        for key in keys:
+            self._pinned[key] = deadline
+            self._pinned.move_to_end(key)
+        while len(self._pinned) > self.max_pinned_keys:
+            self._pinned.popitem(last=False)
+
+    def replica_for(self, *keys: str) -> Optional[Prisma]:
+        """
+        Returns the replica client if a read touching these keys may use it, or None for the primary.
+        """
+        if self._client is None:
+            return None
+        now = time.monotonic()
+        if now < self._unavailable_until:
+            return None
+        for key in keys:
+            deadline = self._pinned.get(key)
+            if deadline is None:
+                continue
+            if deadline > now:
+                self.pinned_reads += 1
+                return None
+            del self._pinned[key]
+        return self._client
+
+    async def read(
+        self,
+        query: Callable[[Optional[Prisma]], Awaitable[T]],
+        *keys: str,
+        retry_missing: bool = False,
+    ) -> T:
+        """
+        Runs a read-only query on the replica when allowed, otherwise on the primary.
+
+        Args:
+            query (Callable[[Optional[Prisma]], Awaitable[T]]): Runs the query against the given client, e.g. `lambda client: User.prisma(client).find_unique(...)`. None selects the primary.
+            keys (str): user_key/session_key values the query depends on, checked against the read-your-writes window.
+            retry_missing (bool): Re-run the query on the primary when the replica returns None, for lookups of rows that may have just been created.
+
+        Returns:
+            T: The query result.
+        """
+        client = self.replica_for(*keys)
+        if client is None:
+            self.primary_reads += 1
+            return await query(None)
+        try:
+            result = await query(client)
+        except Exception:
+            self.fallbacks += 1
+            self._unavailable_until = time.monotonic() + self.retry_interval
+            logger.exception("Read replica query failed; retrying on the primary")
+            self.primary_reads += 1
+            return await query(None)
+        self.replica_reads += 1
+        if result is None and retry_missing:
+            self.missing_retries += 1
+            self.primary_reads += 1
+            return await query(None)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replica_configured": self.replica_url is not None,
+            "replica_connected": self._client is not None,
+            "replica_available": self._client is not None
+            and time.monotonic() >= self._unavailable_until,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "missing_retries": self.missing_retries,
+            "fallbacks": self.fallbacks,
+            "pinned_keys": len(self._pinned),
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical lookups: while a query for a key is in flight, later callers for the same key await its result instead of issuing their own. Nothing is cached once the query completes. Callers share the result object, so it must not be mutated.
+
+    The shared query runs in its own task, so a caller that is cancelled (e.g. its client disconnected) does not cancel it for the others.
+    """
+
+    def __init__(self, enabled: bool, max_tracked_keys: int) -> None:
+        self.enabled = enabled
+        self.max_tracked_keys = max_tracked_keys
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._coalesced_by_key: "OrderedDict[str, int]" = OrderedDict()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs fn(), or joins the in-flight run for key.
+
+        Args:
+            key (str): Identifies the lookup, e.g. session_key(id). Parameters that change the result must be part of it.
+            fn (Callable[[], Awaitable[T]]): Performs the lookup.
+
+        Returns:
+            T: The result of the shared run.
+        """
+        self.calls += 1
+        if not self.enabled:
+            self.executions += 1
+            return await fn()
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._record_coalesced(key)
+        return await asyncio.shield(task)
+
+    def forget(self, *keys: str) -> None:
+        """
+        Detaches in-flight lookups for these keys, and for keys extending them with a '|' suffix, so that new callers start a fresh query. Callers already waiting still get the old result.
+        """
+        if not self._inflight:
+            return
+        for key in keys:
+            prefix = key + "|"
+            for inflight in [
+                k for k in self._inflight if k == key or k.startswith(prefix)
+            ]:
+                del self._inflight[inflight]
+
+    def stats(self) -> Dict[str, Any]:
+        top = heapq.nlargest(10, self._coalesced_by_key.items(), key=lambda kv: kv[1])
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "top_coalesced_keys": dict(top),
+        }
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled.
+            task.exception()
+
+    def _record_coalesced(self, key: str) -> None:
+        self.coalesced += 1
+        project.metrics.registry.inc(
+            "single_flight_coalesced_total", kind=key.split(":", 1)[0]
+        )
+        self._coalesced_by_key[key] = self._coalesced_by_key.pop(key, 0) + 1
+        if len(self._coalesced_by_key) > self.max_tracked_keys:
+            self._coalesced_by_key.popitem(last=False)
+
+
+single_flight = SingleFlight(
+    enabled=os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1",
+    max_tracked_keys=int(os.getenv("SINGLE_FLIGHT_TRACKED_KEYS", "1000")),
+)
+
+replica_router = ReplicaRouter(
+    replica_url=os.getenv("DATABASE_REPLICA_URL") or None,
+    read_your_writes_seconds=float(os.getenv("READ_YOUR_WRITES_SECONDS", "5")),
+    retry_interval=float(os.getenv("REPLICA_RETRY_SECONDS", "30")),
+    max_pinned_keys=int(os.getenv("REPLICA_MAX_PINNED_KEYS", "100000")),
+)
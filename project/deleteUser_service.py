@@ -1,7 +1,28 @@
+import datetime
+import os
+from typing import Optional
+
 import prisma
 import prisma.models
+import project.auth_tokens
+import project.db
+import project.maintenance
+import project.session_cache
 from pydantic import BaseModel
 
+# Accounts with more log rows than this are tombstoned and purged in the background.
+DELETE_USER_BACKGROUND_THRESHOLD = int(
+    os.getenv("DELETE_USER_BACKGROUND_THRESHOLD", "50000")
+)
+
+# Counts at most $2 rows per table, so sizing up a huge account stays cheap.
+_BOUNDED_LOG_COUNT_SQL = """
+SELECT
+    (SELECT count(*) FROM (SELECT 1 FROM "CLILog" WHERE "userId" = $1 LIMIT $2) c)
+    + (SELECT count(*) FROM (SELECT 1 FROM "APILog" WHERE "userId" = $1 LIMIT $2) a)
+    AS "rows"
+"""
+
 
 class DeleteUserResponse(BaseModel):
     """
@@ -10,16 +31,36 @@ class DeleteUserResponse(BaseModel):
 
     message: str
     deleted: bool
+    pending: bool = False
+
+
+class UserDeletionStatusResponse(BaseModel):
+    """
+    Reports how far a user's deletion has progressed: 'active' (not deleted), 'pending' (tombstoned, rows still being purged) or 'deleted'.
+    """
+
+    userId: int
+    status: str
+    deletedAt: Optional[datetime.datetime] = None
 
 
-async def deleteUser(userId: int) -> DeleteUserResponse:
+async def deleteUser(
+    userId: int, background: Optional[bool] = None
+) -> DeleteUserResponse:
     """
     Deletes a specific user from the system using their UserID. This operation is usually
     restricted to user requests for account deletion or performed by an admin for managing
     user accounts.
 
+    Small accounts are removed with a single DELETE that cascades to sessions and logs.
+    Accounts above DELETE_USER_BACKGROUND_THRESHOLD log rows, or any account when
+    background is True, are tombstoned instead: their sessions are removed and they can no
+    longer log in immediately, while their logs are purged in bounded batches afterwards.
+
     Args:
         userId (int): The unique identifier of the user to be deleted.
+        background (Optional[bool]): Force (True) or forbid (False) background purging.
+                                     None chooses based on the account's size.
 
     Returns:
         DeleteUserResponse: Response model indicating the result of the delete operation.
@@ -28,17 +69,70 @@ async def deleteUser(userId: int) -> DeleteUserResponse:
 
     Example:
         deleteUser(1)
-        > DeleteUserResponse(message="prisma.models.User deleted successfully", deleted=True)
+        > DeleteUserResponse(message="prisma.models.User deleted successfully", deleted=True, pending=False)
     """
-    user = await prisma.models.User.prisma().find_unique(where={"id": userId})
-    if user is None:
+    if background is None:
+        result = await prisma.get_client().query_first(
+            _BOUNDED_LOG_COUNT_SQL, userId, DELETE_USER_BACKGROUND_THRESHOLD + 1
+        )
+        background = int(result["rows"]) > DELETE_USER_BACKGROUND_THRESHOLD
+    await _revoke_sessions(userId)
+    if background:
+        tombstoned = await prisma.models.User.prisma().update_many(
+            where={"id": userId, "deletedAt": None},
+            data={"deletedAt": datetime.datetime.now(datetime.timezone.utc)},
+        )
+        if tombstoned == 0:
+            return _not_found(userId)
+        await prisma.models.Session.prisma().delete_many(where={"userId": userId})
+        project.session_cache.session_cache.invalidate_user(userId)
+        project.db.replica_router.mark_written(project.db.user_key(userId))
+        project.maintenance.maintenance_task.schedule_user_purge(userId)
         return DeleteUserResponse(
-            message=f"prisma.models.User with ID {userId} not found.", deleted=False
+            message="prisma.models.User deletion scheduled.",
+            deleted=False,
+            pending=True,
         )
-    await prisma.models.Session.prisma().delete_many(where={"userId": userId})
-    await prisma.models.APILog.prisma().delete_many(where={"userId": userId})
-    await prisma.models.CLILog.prisma().delete_many(where={"userId": userId})
-    await prisma.models.User.prisma().delete(where={"id": userId})
+    deleted = await prisma.models.User.prisma().delete_many(where={"id": userId})
+    project.session_cache.session_cache.invalidate_user(userId)
+    project.db.replica_router.mark_written(project.db.user_key(userId))
+    if deleted == 0:
+        return _not_found(userId)
     return DeleteUserResponse(
         message="prisma.models.User deleted successfully", deleted=True
     )
+
+
+async def getUserDeletionStatus(userId: int) -> UserDeletionStatusResponse:
+    """
+    Reports the deletion status of a user, so clients of a background deletion can poll until it completes.
+
+    Args:
+        userId (int): The unique identifier of the user.
+
+    Returns:
+        UserDeletionStatusResponse: 'active', 'pending' or 'deleted'.
+    """
+    user = await prisma.models.User.prisma().find_unique(where={"id": userId})
+    if user is None:
+        return UserDeletionStatusResponse(userId=userId, status="deleted")
+    if user.deletedAt is None:
+        return UserDeletionStatusResponse(userId=userId, status="active")
+    return UserDeletionStatusResponse(
+        userId=userId, status="pending", deletedAt=user.deletedAt
+    )
+
+
+async def _revoke_sessions(userId: int) -> None:
+    # Other workers deny the user's tokens once they sync this, instead of serving them
+    # from their session caches (or, for signed tokens, their claims) until they expire.
+    sessions = await prisma.models.Session.prisma().find_many(where={"userId": userId})
+    await project.auth_tokens.revoke_sessions(
+        (session.id, session.expiresAt) for session in sessions
+    )
+
+
+def _not_found(userId: int) -> DeleteUserResponse:
+    return DeleteUserResponse(
+        message=f"prisma.models.User with ID {userId} not found.", deleted=False
+    )
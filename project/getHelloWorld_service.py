@@ -1,3 +1,5 @@
+import hashlib
+
 from pydantic import BaseModel
 
 
@@ -28,3 +30,12 @@ def getHelloWorld(request: HelloWorldRequest) -> HelloWorldResponse:
         HelloWorldResponse: Response model for the '/hello-world' endpoint, providing a basic string message as output.
     """
     return HelloWorldResponse(message="Hello World")
+
+
+# The response never changes, so it is encoded once at import time and served as-is by the fast path.
+HELLO_WORLD_RESPONSE_BODY: bytes = (
+    getHelloWorld(HelloWorldRequest()).model_dump_json().encode("utf-8")
+)
+HELLO_WORLD_ETAG: str = (
+    '"' + hashlib.sha256(HELLO_WORLD_RESPONSE_BODY).hexdigest()[:32] + '"'
+)
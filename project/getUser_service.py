@@ -1,11 +1,19 @@
-from datetime import datetime
-from typing import List, Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
 
 import prisma
 import prisma.enums
 import prisma.models
+import project.db
+import pydantic_core
 from pydantic import BaseModel
 
+try:
+    import orjson
+except ImportError:  # declared dependency; pydantic-core encodes where it has no wheel
+    orjson = None
+
 
 class Session(BaseModel):
     """
@@ -19,32 +27,203 @@ class Session(BaseModel):
 
 class UserDetailsResponse(BaseModel):
     """
-    Provides detailed information about a user including roles, email, and session details
+    Provides detailed information about a user including roles, email, and session details. Fields left out of the requested projection are omitted. nextSessionCursor is set when more sessions follow the returned page.
     """
 
     id: int
-    email: str
-    role: prisma.enums.Role
-    sessions: List[Session]
+    email: Optional[str] = None
+    role: Optional[prisma.enums.Role] = None
+    sessions: Optional[List[Session]] = None
+    nextSessionCursor: Optional[int] = None
+    sessionCount: Optional[int] = None
+    version: Optional[int] = None
+
+
+USER_FIELDS = ("email", "role", "sessions", "sessionCount", "version")
+
+DEFAULT_USER_FIELDS = ("email", "role", "sessions")
 
 
-async def getUser(userId: int) -> UserDetailsResponse:
+async def getUser(
+    userId: int,
+    fields: Sequence[str] = DEFAULT_USER_FIELDS,
+    session_limit: int = 50,
+    session_cursor: Optional[int] = None,
+    active_only: bool = False,
+) -> UserDetailsResponse:
     """
     Retrieves a specific user's details by their unique identifier (UserID). The endpoint fetches user information and provides it in a secured manner. This is generally used by users to access their own information or by admins for auditing purposes.
 
+    Sessions are returned newest first, one bounded page at a time, so the cost of a call does not grow with the user's session history.
+
     Args:
     userId (int): Unique identifier for the user. Used to fetch specific user details.
+    fields (Sequence[str]): Which of USER_FIELDS to return; the id is always included. Sessions and the session count are only queried when requested.
+    session_limit (int): Maximum sessions returned per page.
+    session_cursor (Optional[int]): nextSessionCursor from the previous page; only sessions older than it are returned.
+    active_only (bool): Only list and count sessions that have not expired.
 
     Returns:
     UserDetailsResponse: Provides detailed information about a user including roles, email, and session details.
     """
-    user = await prisma.models.User.prisma().find_unique(
-        where={"id": userId}, include={"sessions": True}
+    content = await _find_user_details(
+        userId, fields, session_limit, session_cursor, active_only
+    )
+    return UserDetailsResponse(**content)
+
+
+async def getUserJson(
+    userId: int,
+    fields: Sequence[str] = DEFAULT_USER_FIELDS,
+    session_limit: int = 50,
+    session_cursor: Optional[int] = None,
+    active_only: bool = False,
+) -> bytes:
+    """
+    Same as getUser, but returns the response already encoded as JSON, byte-for-byte what the validated path produces.
+    """
+    return encode_json(
+        await _find_user_details(
+            userId, fields, session_limit, session_cursor, active_only
+        )
+    )
+
+
+def user_details_content(
+    user: prisma.models.User,
+    fields: Sequence[str],
+    session_limit: int,
+    session_count: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Copies a User row, and at most session_limit of the sessions loaded with it, into a plain dict shaped like UserDetailsResponse with only the requested fields. Loading session_limit + 1 sessions tells whether another page follows.
+    """
+    content: Dict[str, Any] = {"id": user.id}
+    if "email" in fields:
+        content["email"] = user.email
+    if "role" in fields:
+        content["role"] = user.role
+    if "sessions" in fields:
+        sessions = user.sessions or []
+        content["sessions"] = [
+            {
+                "id": session.id,
+                "createdAt": session.createdAt,
+                "expiresAt": session.expiresAt,
+            }
+            for session in sessions[:session_limit]
+        ]
+        content["nextSessionCursor"] = (
+            sessions[session_limit - 1].id if len(sessions) > session_limit else None
+        )
+    if "sessionCount" in fields:
+        content["sessionCount"] = session_count
+    if "version" in fields:
+        content["version"] = user.version
+    return content
+
+
+def active_sessions_filter(active_only: bool) -> Dict[str, Any]:
+    """
+    Session where-clause restricting sessions to unexpired ones when active_only is set, otherwise empty.
+    """
+    if not active_only:
+        return {}
+    return {
+        "OR": [
+            {"expiresAt": None},
+            {"expiresAt": {"gt": datetime.now(timezone.utc)}},
+        ]
+    }
+
+
+def sessions_include(
+    session_limit: int, session_cursor: Optional[int], active_only: bool
+) -> Dict[str, Any]:
+    """
+    Prisma include loading one page of a user's sessions, newest first: session_limit + 1 of them, for user_details_content to tell whether another page follows.
+    """
+    page = active_sessions_filter(active_only)
+    if session_cursor is not None:
+        page["id"] = {"lt": session_cursor}
+    return {
+        "sessions": {
+            "where": page,
+            "order_by": {"id": "desc"},
+            "take": session_limit + 1,
+        }
+    }
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    Encodes already-validated content without building response models. Uses orjson when it is installed and pydantic-core's encoder otherwise; both match pydantic's output for the types used here.
+    """
+    if orjson is not None:
+        # OPT_UTC_Z writes UTC offsets as "Z", matching pydantic's datetime encoding.
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return pydantic_core.to_json(content)
+
+
+async def _find_user_details(
+    userId: int,
+    fields: Sequence[str],
+    session_limit: int,
+    session_cursor: Optional[int],
+    active_only: bool,
+) -> Dict[str, Any]:
+    # Concurrent identical requests share one set of queries and the resulting dict.
+    key = "|".join(
+        [
+            project.db.user_key(userId),
+            ",".join(sorted(fields)),
+            str(session_limit),
+            str(session_cursor),
+            str(active_only),
+        ]
+    )
+    return await project.db.single_flight.do(
+        key,
+        lambda: _query_user_details(
+            userId, fields, session_limit, session_cursor, active_only
+        ),
     )
-    if user is None:
+
+
+async def _query_user_details(
+    userId: int,
+    fields: Sequence[str],
+    session_limit: int,
+    session_cursor: Optional[int],
+    active_only: bool,
+) -> Dict[str, Any]:
+    active = active_sessions_filter(active_only)
+    include = None
+    if "sessions" in fields:
+        include = sessions_include(session_limit, session_cursor, active_only)
+    router = project.db.replica_router
+    key = project.db.user_key(userId)
+    queries = [
+        router.read(
+            lambda client: prisma.models.User.prisma(client).find_unique(
+                where={"id": userId}, include=include
+            ),
+            key,
+            retry_missing=True,
+        )
+    ]
+    if "sessionCount" in fields:
+        queries.append(
+            router.read(
+                lambda client: prisma.models.Session.prisma(client).count(
+                    where={"userId": userId, **active}
+                ),
+                key,
+            )
+        )
+    user, *count = await asyncio.gather(*queries)
+    if user is None or user.deletedAt is not None:
         raise Exception("User not found")
-    sessions_details = [Session(**session.dict()) for session in user.sessions]
-    user_details_response = UserDetailsResponse(
-        id=user.id, email=user.email, role=user.role, sessions=sessions_details
+    return user_details_content(
+        user, fields, session_limit, count[0] if count else None
     )
-    return user_details_response
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import project.auth_tokens
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+
+# Methods whose requests may carry an Idempotency-Key; GET and HEAD are safe to retry anyway.
+IDEMPOTENT_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse:
+    """
+    A completed response kept for replay, and the fingerprint (hash of caller, method, path, query and body) of the request that produced it.
+    """
+
+    __slots__ = ("fingerprint", "status", "headers", "body", "expires_at")
+
+    def __init__(
+        self,
+        fingerprint: str,
+        status: int,
+        headers: List[Tuple[bytes, bytes]],
+        body: bytes,
+        expires_at: float,
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+
+class IdempotencyCache:
+    """
+    Bounded in-memory cache of responses by caller and Idempotency-Key, so a client can retry a write whose response it did not receive and get the original response instead of applying the write twice.
+
+    Entries expire after ttl seconds and are evicted least recently used once the stored responses exceed max_bytes. Responses larger than max_response_bytes, and 5xx responses (which a client should be able to retry for real), are not stored. A retry that arrives while the original request is still running waits for its response.
+
+    The cache is per process: with several workers, a retry only finds the original response if it reaches the same worker. The writes themselves are conditional (duplicate creates and stale updates answer 409), so a retry that misses the cache still cannot apply twice.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        ttl: float,
+        max_bytes: int,
+        max_response_bytes: int,
+    ) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_response_bytes = max_response_bytes
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.bytes = 0
+        self.stored = 0
+        self.replayed = 0
+        self.waited = 0
+        self.mismatched = 0
+        self.uncacheable = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def inflight(self, key: str) -> Optional[asyncio.Future]:
+        return self._inflight.get(key)
+
+    def begin(self, key: str) -> None:
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def finish(self, key: str, response: Optional[StoredResponse]) -> None:
+        """
+        Ends the in-flight request for key, storing its response (None if it is not to be kept) and handing it to any retries waiting on it.
+        """
+        future = self._inflight.pop(key, None)
+        if response is not None:
+            if response.size > self.max_response_bytes:
+                self.uncacheable += 1
+                response = None
+            else:
+                self._remove(key)
+                self._entries[key] = response
+                self.bytes += response.size
+                self.stored += 1
+                while self.bytes > self.max_bytes and self._entries:
+                    self._remove(next(iter(self._entries)))
+                    self.evicted += 1
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "inflight": len(self._inflight),
+            "stored": self.stored,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "mismatched": self.mismatched,
+            "uncacheable": self.uncacheable,
+            "evicted": self.evicted,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+
+def caller_scope(scope: Scope) -> str:
+    """
+    Identifies who sent a request, so that Idempotency-Keys only match retries from the same caller: a digest of the auth token for authenticated calls, otherwise the client IP.
+    """
+    query_string = scope.get("query_string", b"")
+    if b"token" in query_string:
+        query = parse_qs(query_string.decode("latin-1"))
+        for param in project.auth_tokens.TOKEN_QUERY_PARAMS:
+            if param in query:
+                token = query[param][0].encode()
+                return f"token:{hashlib.sha256(token).hexdigest()}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def _fingerprint_start(scope: Scope, caller: str) -> Any:
+    digest = hashlib.sha256()
+    digest.update(caller.encode())
+    digest.update(b"\n")
+    digest.update(scope["method"].encode())
+    digest.update(b" ")
+    digest.update(scope["path"].encode())
+    digest.update(b"?")
+    digest.update(scope.get("query_string", b""))
+    digest.update(b"\n")
+    return digest
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that makes writes sent with an Idempotency-Key header safe to retry: the first request with a key runs normally and its response is stored; later requests with the same key get that response back, marked with an Idempotent-Replayed header, without running again. Reusing a key for a different request (method, path, query or body) is answered with 422.
+
+    Keys are scoped to the caller (see caller_scope): the same key sent with another auth token, or from another address without one, is a different key, so one client can neither replay nor block another's responses.
+
+    The request body is hashed as the route reads it, so uploads are not buffered.
+    """
+
+    def __init__(self, app: ASGIApp, cache: IdempotencyCache) -> None:
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self.cache.enabled
+            or scope["method"] not in IDEMPOTENT_METHODS
+        ):
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"error": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters."},
+                status_code=400,
+            )
+            await response(scope, receive, send)
+            return
+        caller = caller_scope(scope)
+        key = f"{caller}|{key}"
+        while True:
+            entry = self.cache.get(key)
+            if entry is None:
+                future = self.cache.inflight(key)
+                if future is None:
+                    await self._run(key, caller, scope, receive, send)
+                    return
+                self.cache.waited += 1
+                entry = await asyncio.shield(future)
+                if entry is None:
+                    # The original failed or was not stored; run this one for real.
+                    continue
+            await self._replay(entry, caller, scope, receive, send)
+            return
+
+    async def _run(
+        self, key: str, caller: str, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        self.cache.begin(key)
+        digest = _fingerprint_start(scope, caller)
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        storable = True
+        body_read = False
+
+        async def hashing_receive() -> Message:
+            nonlocal body_read
+            message = await receive()
+            if message["type"] == "http.request":
+                digest.update(message.get("body", b""))
+                body_read = not message.get("more_body", False)
+            return message
+
+        async def recording_send(message: Message) -> None:
+            nonlocal start, size, storable
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and storable:
+                body = message.get("body", b"")
+                size += len(body)
+                if size > self.cache.max_response_bytes:
+                    storable = False
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, hashing_receive, recording_send)
+            while not body_read:
+                # Routes taking only query parameters leave the body unread; it still
+                # belongs to the fingerprint a retry is compared against.
+                if (await hashing_receive())["type"] != "http.request":
+                    storable = False
+                    break
+            if start is not None and start["status"] < 500:
+                if storable:
+                    response = StoredResponse(
+                        fingerprint=digest.hexdigest(),
+                        status=start["status"],
+                        headers=list(start["headers"]),
+                        body=b"".join(chunks),
+                        expires_at=time.monotonic() + self.cache.ttl,
+                    )
+                else:
+                    self.cache.uncacheable += 1
+        finally:
+            self.cache.finish(key, response)
+
+    async def _replay(
+        self,
+        entry: StoredResponse,
+        caller: str,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        digest = _fingerprint_start(scope, caller)
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            digest.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        if digest.hexdigest() != entry.fingerprint:
+            self.cache.mismatched += 1
+            response = JSONResponse(
+                {"error": "Idempotency-Key was already used for a different request."},
+                status_code=422,
+            )
+            await response(scope, receive, send)
+            return
+        self.cache.replayed += 1
+        await send(
+            {
+                "type": "http.response.start",
+                "status": entry.status,
+                "headers": entry.headers + [(b"idempotent-replayed", b"true")],
+            }
+        )
+        await send({"type": "http.response.body", "body": entry.body})
+
+
+idempotency_cache = IdempotencyCache(
+    enabled=os.getenv("IDEMPOTENCY_ENABLED", "1") == "1",
+    ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+    max_bytes=int(os.getenv("IDEMPOTENCY_CACHE_BYTES", str(32 * 1024 * 1024))),
+    max_response_bytes=int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", "262144")),
+)
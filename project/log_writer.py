@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import prisma
+import prisma.models
+import project.resilience
+
+logger = logging.getLogger(__name__)
+
+LogRecord = Tuple[str, Dict[str, Any]]
+
+
+class LogWriter:
+    """
+    Write-behind queue for CLILog and APILog rows. Records are buffered in memory and flushed with create_many once a batch fills up or the flush interval elapses, so audit writes stay off the request path.
+
+    A batch rejected for its data (e.g. a row whose user was deleted meanwhile) is retried row by row, so only the bad rows are lost. A batch that fails because the database is unreachable, timed out or has no free pool connection (see project.resilience.is_database_answer), or because the circuit breaker is open, is retried whole, with exponential backoff from retry_initial up to retry_max seconds, while new records wait in the queue. During shutdown a batch is dropped once it has been retried for retry_max seconds, so stopping does not wait indefinitely on a database that is down.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        retry_initial: float,
+        retry_max: float,
+    ) -> None:
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._queue: Optional["asyncio.Queue[LogRecord]"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.retries = 0
+        self.backpressure_waits = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the flush loop once every queued record has been written.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        await self._task
+        self._task = None
+
+    async def enqueue_cli_log(self, userId: int, command: str, executedAt: Any) -> None:
+        await self._enqueue(
+            "CLILog", {"userId": userId, "command": command, "executedAt": executedAt}
+        )
+
+    async def enqueue_api_log(
+        self, userId: int, requestType: str, requestTime: Any
+    ) -> None:
+        await self._enqueue(
+            "APILog",
+            {"userId": userId, "requestType": requestType, "requestTime": requestTime},
+        )
+
+    def offer_api_log(
+        self, userId: int, requestType: str, requestTime: Any, max_queued: int
+    ) -> bool:
+        """
+        Queues an APILog record without waiting. The record is dropped (and counted) when the writer is not running or already holds max_queued records, so callers on the request path never block on audit writes.
+
+        Returns:
+            bool: Whether the record was queued.
+        """
+        if (
+            not self.running
+            or self._closing
+            or self._queue.qsize() >= max_queued
+            or self._queue.full()
+        ):
+            self.dropped += 1
+            return False
+        self._queue.put_nowait(
+            (
+                "APILog",
+                {
+                    "userId": userId,
+                    "requestType": requestType,
+                    "requestTime": requestTime,
+                },
+            )
+        )
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "retries": self.retries,
+            "backpressure_waits": self.backpressure_waits,
+            "dropped": self.dropped,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "total_flush_seconds": self.total_flush_seconds,
+        }
+
+    async def _enqueue(self, model: str, data: Dict[str, Any]) -> None:
+        if not self.running or self._closing:
+            # Outside the server lifespan (scripts, shutdown) fall back to a direct write.
+            await _actions(model).create(data=data)
+            self.written += 1
+            return
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put((model, data))
+        self.enqueued += 1
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _next_batch(self) -> List[LogRecord]:
+        loop = asyncio.get_running_loop()
+        try:
+            first = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[LogRecord]) -> None:
+        by_model: Dict[str, List[Dict[str, Any]]] = {}
+        for model, data in batch:
+            by_model.setdefault(model, []).append(data)
+        started = time.perf_counter()
+        for model, rows in by_model.items():
+            await self._write(model, rows)
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
+
+    async def _write(self, model: str, rows: List[Dict[str, Any]]) -> None:
+        delay = self.retry_initial
+        waited = 0.0
+        while True:
+            try:
+                await self._write_batch(model, rows)
+                return
+            except Exception as e:
+                if self._closing and waited >= self.retry_max:
+                    self.failed += len(rows)
+                    logger.exception(
+                        "Dropping %d %s records at shutdown", len(rows), model
+                    )
+                    return
+                if isinstance(e, project.resilience.DatabaseUnavailableError):
+                    delay = max(delay, e.retry_after)
+                self.retries += 1
+                logger.warning(
+                    "Failed to flush %d %s records (%s); retrying in %.1fs",
+                    len(rows),
+                    model,
+                    e,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                waited += delay
+                delay = min(delay * 2, self.retry_max)
+
+    async def _write_batch(self, model: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Writes rows with one create_many, falling back to one create per row only when the database rejected the batch for its data. Rows are removed from the list as they are dealt with, so when the database cannot be reached it holds exactly those still to be written.
+        """
+        try:
+            await _actions(model).create_many(data=rows)
+        except Exception as e:
+            if not project.resilience.is_database_answer(e):
+                raise
+            logger.exception(
+                "Failed to flush %d %s records; writing them one by one",
+                len(rows),
+                model,
+            )
+        else:
+            self.written += len(rows)
+            rows.clear()
+            return
+        while rows:
+            try:
+                await _actions(model).create(data=rows[0])
+                self.written += 1
+            except Exception as e:
+                if not project.resilience.is_database_answer(e):
+                    raise
+                self.failed += 1
+            rows.pop(0)
+
+
+def _actions(model: str):
+    return getattr(prisma.models, model).prisma()
+
+
+log_writer = LogWriter(
+    max_queue_size=int(os.getenv("LOG_WRITER_MAX_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_WRITER_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("LOG_WRITER_FLUSH_INTERVAL_SECONDS", "0.5")),
+    retry_initial=float(os.getenv("LOG_WRITER_RETRY_INITIAL_SECONDS", "0.5")),
+    retry_max=float(os.getenv("LOG_WRITER_RETRY_MAX_SECONDS", "30")),
+)
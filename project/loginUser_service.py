@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
 
-import bcrypt
 import prisma
 import prisma.models
+import project.auth_tokens
+import project.db
+import project.password_hashing
 from pydantic import BaseModel
 
 
@@ -27,11 +29,23 @@ async def loginUser(username: str, password: str) -> LoginResponse:
 
     """
     user = await prisma.models.User.prisma().find_unique(where={"email": username})
-    if user and bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+    if (
+        user
+        and user.deletedAt is None
+        and await project.password_hashing.verify_password(password, user.password)
+    ):
         new_session = await prisma.models.Session.prisma().create(
             data={"userId": user.id, "expiresAt": datetime.now() + timedelta(days=1)}
         )
-        auth_token = f"token-{new_session.id}"
+        project.db.replica_router.mark_written(
+            project.db.user_key(user.id), project.db.session_key(new_session.id)
+        )
+        if project.auth_tokens.signed_tokens_enabled():
+            auth_token = project.auth_tokens.issue_signed_token(
+                user.id, user.role, new_session.id, new_session.expiresAt
+            )
+        else:
+            auth_token = f"token-{new_session.id}"
         return LoginResponse(auth_token=auth_token)
     else:
         raise Exception("Invalid username or password")
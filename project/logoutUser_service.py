@@ -1,5 +1,9 @@
 import prisma
 import prisma.models
+import project.auth_tokens
+import project.db
+import project.resilience
+import project.session_cache
 from pydantic import BaseModel
 
 
@@ -22,18 +26,25 @@ async def logoutUser(session_token: str) -> LogoutResponseModel:
     Returns:
         LogoutResponseModel: This model returns the status of the logout operation to inform the client whether the session was successfully closed.
     """
+    session_id = project.auth_tokens.session_id_from_token(session_token)
+    if session_id is None:
+        return LogoutResponseModel(logout_success=False, message="Session not found")
     try:
-        session = await prisma.models.Session.prisma().find_unique(
-            where={"id": session_token}
-        )
+        session = await prisma.models.Session.prisma().delete(where={"id": session_id})
         if session is None:
             return LogoutResponseModel(
                 logout_success=False, message="Session not found"
             )
-        await prisma.models.Session.prisma().delete(where={"id": session_token})
+        project.db.replica_router.mark_written(project.db.session_key(session_id))
+        project.session_cache.session_cache.invalidate(session_id)
+        # Other workers may still hold the session in their cache, and signed tokens are
+        # never looked up at all; both are denied there once this revocation is synced.
+        await project.auth_tokens.revoke_sessions([(session_id, session.expiresAt)])
         return LogoutResponseModel(
             logout_success=True, message="Successfully logged out."
         )
+    except project.resilience.DatabaseUnavailableError:
+        raise
     except Exception as e:
         return LogoutResponseModel(
             logout_success=False, message=f"Logout failed: {str(e)}"
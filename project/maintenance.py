@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import prisma
+import prisma.models
+import project.db
+import project.partitions
+
+logger = logging.getLogger(__name__)
+
+# Each statement deletes at most $1 rows, picked through an index-friendly subquery, so no
+# single transaction holds row locks for long.
+_EXPIRED_SESSIONS_SQL = """
+DELETE FROM "Session" WHERE "id" IN (
+    SELECT "id" FROM "Session"
+    WHERE "expiresAt" < (now() AT TIME ZONE 'UTC')
+    LIMIT $1
+)
+"""
+
+_EXPIRED_REVOCATIONS_SQL = """
+DELETE FROM "RevokedSession" WHERE "sessionId" IN (
+    SELECT "sessionId" FROM "RevokedSession"
+    WHERE "expiresAt" < (now() AT TIME ZONE 'UTC')
+    LIMIT $1
+)
+"""
+
+_OLD_CLI_LOGS_SQL = """
+DELETE FROM "CLILog" WHERE "id" IN (
+    SELECT "id" FROM "CLILog"
+    WHERE "executedAt" < (now() AT TIME ZONE 'UTC') - make_interval(days => $2)
+    LIMIT $1
+)
+"""
+
+_OLD_API_LOGS_SQL = """
+DELETE FROM "APILog" WHERE "id" IN (
+    SELECT "id" FROM "APILog"
+    WHERE "requestTime" < (now() AT TIME ZONE 'UTC') - make_interval(days => $2)
+    LIMIT $1
+)
+"""
+
+_USER_CLI_LOGS_SQL = """
+DELETE FROM "CLILog" WHERE "id" IN (
+    SELECT "id" FROM "CLILog" WHERE "userId" = $2 LIMIT $1
+)
+"""
+
+_USER_API_LOGS_SQL = """
+DELETE FROM "APILog" WHERE "id" IN (
+    SELECT "id" FROM "APILog" WHERE "userId" = $2 LIMIT $1
+)
+"""
+
+
+class MaintenanceTask:
+    """
+    Background task that deletes expired sessions and revocations, CLILog/APILog rows older than their retention period (unless the table is partitioned, see project.partitions), and the remaining rows of tombstoned users. Deletes run in bounded batches with a pause between them, and each run has a batch cap, so maintenance never competes with request traffic for long.
+
+    Every worker runs the background loop, but each run takes a database advisory lock first, so only one worker (across all instances) purges at a time and the others skip that run.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int,
+        batch_pause: float,
+        max_batches_per_run: int,
+        cli_log_retention_days: int,
+        api_log_retention_days: int,
+    ) -> None:
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_batches_per_run = max_batches_per_run
+        self.cli_log_retention_days = cli_log_retention_days
+        self.api_log_retention_days = api_log_retention_days
+        self._task: Optional[asyncio.Task] = None
+        self._purges: Dict[int, asyncio.Task] = {}
+        self.runs = 0
+        self.skipped_runs = 0
+        self.failures = 0
+        self.last_run: Dict[str, Any] = {}
+        self.total_reclaimed: Dict[str, int] = {}
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        Performs one maintenance pass and returns the number of rows reclaimed per table and the time taken.
+        """
+        started = time.perf_counter()
+        reclaimed = {
+            "Session": await self._purge(_EXPIRED_SESSIONS_SQL),
+            "RevokedSession": await self._purge(_EXPIRED_REVOCATIONS_SQL),
+        }
+        # Partitioned log tables are trimmed by dropping whole partitions instead; another
+        # worker may be the one managing them.
+        partitions = project.partitions.partition_manager
+        await partitions.refresh()
+        if self.cli_log_retention_days > 0 and not partitions.manages("CLILog"):
+            reclaimed["CLILog"] = await self._purge(
+                _OLD_CLI_LOGS_SQL, self.cli_log_retention_days
+            )
+        if self.api_log_retention_days > 0 and not partitions.manages("APILog"):
+            reclaimed["APILog"] = await self._purge(
+                _OLD_API_LOGS_SQL, self.api_log_retention_days
+            )
+        tombstoned = await prisma.models.User.prisma().find_many(
+            where={"deletedAt": {"not": None}}
+        )
+        for user in tombstoned:
+            if user.id not in self._purges:
+                purged = await self.purge_user(user.id)
+                for table, count in purged.items():
+                    reclaimed[table] = reclaimed.get(table, 0) + count
+        for table, count in reclaimed.items():
+            self.total_reclaimed[table] = self.total_reclaimed.get(table, 0) + count
+        self.runs += 1
+        self.last_run = {
+            "reclaimed": reclaimed,
+            "seconds": time.perf_counter() - started,
+        }
+        logger.info(
+            "Maintenance reclaimed %s in %.3fs", reclaimed, self.last_run["seconds"]
+        )
+        return self.last_run
+
+    async def purge_user(self, user_id: int) -> Dict[str, int]:
+        """
+        Deletes a tombstoned user's logs in bounded batches, then the user row itself, whose deletion cascades to anything left. Unfinished purges are resumed by later maintenance runs.
+
+        Args:
+            user_id (int): The tombstoned user to purge.
+
+        Returns:
+            Dict[str, int]: Rows deleted per table.
+        """
+        purged = {"CLILog": 0, "APILog": 0, "User": 0}
+        for table, sql in (
+            ("CLILog", _USER_CLI_LOGS_SQL),
+            ("APILog", _USER_API_LOGS_SQL),
+        ):
+            while True:
+                deleted = await self._purge(sql, user_id)
+                purged[table] += deleted
+                if deleted < self.batch_size * self.max_batches_per_run:
+                    break
+        purged["User"] = await prisma.models.User.prisma().delete_many(
+            where={"id": user_id, "deletedAt": {"not": None}}
+        )
+        return purged
+
+    def schedule_user_purge(self, user_id: int) -> None:
+        """
+        Starts purging a tombstoned user in the background right away instead of waiting for the next maintenance run.
+        """
+        if user_id in self._purges:
+            return
+        task = asyncio.create_task(self.purge_user(user_id))
+        self._purges[user_id] = task
+        task.add_done_callback(lambda t: self._finish_purge(user_id, t))
+
+    def _finish_purge(self, user_id: int, task: asyncio.Task) -> None:
+        self._purges.pop(user_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+            logger.error("Purge of user %d failed", user_id, exc_info=task.exception())
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._purges.values()):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "pending_user_purges": len(self._purges),
+            "failures": self.failures,
+            "last_run": self.last_run,
+            "total_reclaimed": self.total_reclaimed,
+        }
+
+    async def _purge(self, sql: str, *args: Any) -> int:
+        client = prisma.get_client()
+        total = 0
+        for _ in range(self.max_batches_per_run):
+            deleted = await client.execute_raw(sql, self.batch_size, *args)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with project.db.try_advisory_lock(
+                    "maintenance", self.interval
+                ) as locked:
+                    if locked:
+                        await self.run_once()
+                    else:
+                        self.skipped_runs += 1
+            except Exception:
+                self.failures += 1
+                logger.exception("Maintenance run failed")
+
+
+maintenance_task = MaintenanceTask(
+    interval=float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300")),
+    batch_size=int(os.getenv("MAINTENANCE_BATCH_SIZE", "1000")),
+    batch_pause=float(os.getenv("MAINTENANCE_BATCH_PAUSE_SECONDS", "0.1")),
+    max_batches_per_run=int(os.getenv("MAINTENANCE_MAX_BATCHES_PER_RUN", "100")),
+    cli_log_retention_days=int(os.getenv("CLILOG_RETENTION_DAYS", "0")),
+    api_log_retention_days=int(os.getenv("APILOG_RETENTION_DAYS", "0")),
+)
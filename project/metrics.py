@@ -0,0 +1,246 @@
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics store rendered in the Prometheus text exposition format. Recording a sample is a dict lookup plus a few integer updates, so it is cheap enough to run on every request.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Registers a callback that reports point-in-time gauge samples (name, labels, value) whenever metrics are rendered.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le_key = key + (("le", repr(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(le_key)} {cumulative}")
+                inf_key = key + (("le", "+Inf"),)
+                lines.append(
+                    f"{name}_bucket{_format_labels(inf_key)} {histogram.count}"
+                )
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        gauges: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = tuple(sorted(labels.items()))
+                gauges.setdefault(name, []).append(
+                    f"{name}{_format_labels(key)} {float(value)}"
+                )
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+def stats_collector(
+    prefix: str, stats: Callable[[], Dict[str, object]]
+) -> Callable[[], Iterable[Sample]]:
+    """
+    Adapts a component's stats() dict into gauge samples named {prefix}_{key}. Non-numeric values are skipped.
+    """
+
+    def collect() -> Iterable[Sample]:
+        for key, value in stats().items():
+            if isinstance(value, (int, float)):
+                yield f"{prefix}_{key}", {}, value
+
+    return collect
+
+
+_endpoint_seconds: ContextVar[Optional[List[float]]] = ContextVar(
+    "_endpoint_seconds", default=None
+)
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that splits each request's handling time into the endpoint function itself (the service call) and the FastAPI work around it: parameter validation plus response validation and serialization.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if call is None:
+            return
+
+        async def timed_call(**values):
+            started = time.perf_counter()
+            try:
+                return await call(**values)
+            finally:
+                holder = _endpoint_seconds.get()
+                if holder is not None:
+                    holder.append(time.perf_counter() - started)
+
+        # FastAPI decides how to invoke the endpoint from the original function, so only async
+        # endpoints (every route in this app) are wrapped.
+        if asyncio.iscoroutinefunction(call):
+            self.dependant.call = timed_call
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request):
+            holder: List[float] = []
+            token = _endpoint_seconds.set(holder)
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                total = time.perf_counter() - started
+                _endpoint_seconds.reset(token)
+                endpoint = sum(holder)
+                registry.observe(
+                    "operation_duration_seconds",
+                    endpoint,
+                    kind="endpoint",
+                    operation=route,
+                )
+                registry.observe(
+                    "operation_duration_seconds",
+                    max(total - endpoint, 0.0),
+                    kind="validation_serialization",
+                    operation=route,
+                )
+
+        return timed_handler
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency and status per route template, so /users/1 and /users/2 share one series.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            method = scope["method"]
+            registry.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                method=method,
+                route=path,
+            )
+            registry.inc(
+                "http_requests_total", method=method, route=path, status=str(status)
+            )
@@ -0,0 +1,398 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import prisma
+import project.db
+
+logger = logging.getLogger(__name__)
+
+_IS_PARTITIONED_SQL = """
+SELECT count(*) AS partitioned FROM pg_partitioned_table pt
+JOIN pg_class c ON c.oid = pt.partrelid
+WHERE c.relname = $1 AND pg_table_is_visible(c.oid)
+"""
+
+_PARTITIONS_SQL = """
+SELECT child.relname AS name,
+       pg_get_expr(child.relpartbound, child.oid) AS bound,
+       greatest(child.reltuples, 0)::bigint AS estimated_rows
+FROM pg_inherits i
+JOIN pg_class parent ON parent.oid = i.inhparent
+JOIN pg_class child ON child.oid = i.inhrelid
+WHERE parent.relname = $1 AND pg_table_is_visible(parent.oid)
+"""
+
+_BOUND_RE = re.compile(r"FROM \((MINVALUE|'[^']*')\) TO \((MAXVALUE|'[^']*')\)")
+
+INTERVALS = ("day", "week", "month")
+
+# The column each log table is partitioned on (see migrations/partition_log_tables.sql).
+TIME_COLUMNS = {"CLILog": "executedAt", "APILog": "requestTime"}
+
+# Creates a partition, first moving any rows the default partition holds for its range into it:
+# Postgres refuses to create a partition whose range overlaps rows already in the default one.
+_CREATE_PARTITION_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM "{default}" WHERE "{column}" >= '{lower}' AND "{column}" < '{upper}') THEN
+        ALTER TABLE "{table}" DETACH PARTITION "{default}";
+        CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES FROM ('{lower}') TO ('{upper}');
+        WITH moved AS (
+            DELETE FROM "{default}" WHERE "{column}" >= '{lower}' AND "{column}" < '{upper}' RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved;
+        ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT;
+    ELSE
+        CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES FROM ('{lower}') TO ('{upper}');
+    END IF;
+END $$
+"""
+
+
+class Partition(NamedTuple):
+    """
+    One range partition of a log table. A bound of None stands for MINVALUE (lower) or MAXVALUE (upper); the default partition has neither and is_default set.
+    """
+
+    name: str
+    lower: Optional[datetime.datetime]
+    upper: Optional[datetime.datetime]
+    is_default: bool
+    estimated_rows: int
+
+
+def parse_bound(bound: str) -> Tuple[Optional[datetime.datetime], ...]:
+    """
+    Parses a pg_get_expr() partition bound such as "FOR VALUES FROM ('2024-05-01 00:00:00') TO ('2024-05-02 00:00:00')".
+
+    Returns:
+        Tuple[Optional[datetime.datetime], ...]: (lower, upper), with None for MINVALUE/MAXVALUE; an empty tuple for the default partition.
+    """
+    match = _BOUND_RE.search(bound)
+    if match is None:
+        return ()
+    return tuple(
+        (
+            None
+            if value.endswith("VALUE")
+            else datetime.datetime.fromisoformat(value[1:-1])
+        )
+        for value in match.groups()
+    )
+
+
+def period_start(moment: datetime.datetime, interval: str) -> datetime.datetime:
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: datetime.datetime, interval: str) -> datetime.datetime:
+    if interval == "week":
+        return start + datetime.timedelta(days=7)
+    if interval == "month":
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+class PartitionManager:
+    """
+    Keeps the time-partitioned CLILog and APILog tables (see migrations/partition_log_tables.sql) ready for writes and within retention.
+
+    Each run creates the partition for the current period and `premake` periods ahead, so inserts are always routed to a real partition rather than the default one, and removes partitions that lie entirely before the table's retention cutoff. Removing a partition is a catalog operation (DROP TABLE, or DETACH PARTITION to keep the data for archiving) whose cost does not depend on how many rows it holds, unlike the batched DELETEs the maintenance task uses for unpartitioned tables. Tables that have not been partitioned are left alone.
+
+    Rows outside every partition land in the default partition. When a new partition covers some of them, they are moved into it as it is created (the default partition is detached for the move, briefly blocking writes to the table), and default rows older than the retention cutoff are deleted on each run.
+
+    Partition bounds are UTC timestamps, matching how Prisma stores DateTime columns.
+
+    Every worker runs the background loop, but each run takes a database advisory lock first, so the DDL runs in one worker at a time; the others only refresh which tables are partitioned.
+    """
+
+    def __init__(
+        self,
+        tables: Dict[str, int],
+        interval: str,
+        premake: int,
+        retention_action: str,
+        check_interval: float,
+    ) -> None:
+        if interval not in INTERVALS:
+            raise ValueError(f"Partition interval must be one of {INTERVALS}")
+        if retention_action not in ("drop", "detach"):
+            raise ValueError("Partition retention action must be 'drop' or 'detach'")
+        self.tables = tables
+        self.interval = interval
+        self.premake = premake
+        self.retention_action = retention_action
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+        self._partitions: Dict[str, List[Partition]] = {}
+        self.runs = 0
+        self.skipped_runs = 0
+        self.failures = 0
+        self.created = 0
+        self.retired = 0
+        self.default_rows_deleted = 0
+        self.last_run: Dict[str, Any] = {}
+
+    def manages(self, table: str) -> bool:
+        """
+        Whether the table was found to be partitioned, in which case retention is handled here instead of by row deletes.
+        """
+        return table in self._partitions
+
+    async def refresh(self) -> None:
+        """
+        Re-reads which log tables are partitioned, and their partitions, without changing anything.
+        """
+        client = prisma.get_client()
+        for table in self.tables:
+            rows = await client.query_raw(_IS_PARTITIONED_SQL, table)
+            if rows and int(rows[0]["partitioned"]):
+                await self._load(client, table)
+            else:
+                self._partitions.pop(table, None)
+
+    async def run_once(self, now: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+        """
+        Creates missing upcoming partitions and retires expired ones for every partitioned log table.
+
+        Args:
+            now (Optional[datetime.datetime]): The current UTC time, as a naive datetime; defaults to the clock.
+
+        Returns:
+            Dict[str, Any]: Partitions created and retired per table, and the time taken.
+        """
+        started = time.perf_counter()
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        client = prisma.get_client()
+        created: Dict[str, List[str]] = {}
+        retired: Dict[str, List[str]] = {}
+        for table, retention_days in self.tables.items():
+            rows = await client.query_raw(_IS_PARTITIONED_SQL, table)
+            if not rows or not int(rows[0]["partitioned"]):
+                self._partitions.pop(table, None)
+                continue
+            partitions = await self._load(client, table)
+            created[table] = await self._create_upcoming(client, table, partitions, now)
+            retired[table] = await self._retire_expired(
+                client, table, partitions, now, retention_days
+            )
+            if created[table] or retired[table]:
+                await self._load(client, table)
+        self.runs += 1
+        self.last_run = {
+            "created": created,
+            "retired": retired,
+            "seconds": time.perf_counter() - started,
+        }
+        if any(created.values()) or any(retired.values()):
+            logger.info("Partitions created %s, retired %s", created, retired)
+        return self.last_run
+
+    async def start(self) -> None:
+        if self._task is None and self.check_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "failures": self.failures,
+            "created": self.created,
+            "retired": self.retired,
+            "default_rows_deleted": self.default_rows_deleted,
+            "last_run": self.last_run,
+            "tables": {
+                table: {
+                    partition.name: {
+                        "from": (
+                            partition.lower.isoformat() if partition.lower else None
+                        ),
+                        "to": partition.upper.isoformat() if partition.upper else None,
+                        "estimated_rows": partition.estimated_rows,
+                    }
+                    for partition in partitions
+                }
+                for table, partitions in self._partitions.items()
+            },
+        }
+
+    async def _load(self, client: Any, table: str) -> List[Partition]:
+        partitions = []
+        for row in await client.query_raw(_PARTITIONS_SQL, table):
+            bounds = parse_bound(row["bound"])
+            partitions.append(
+                Partition(
+                    name=row["name"],
+                    lower=bounds[0] if bounds else None,
+                    upper=bounds[1] if bounds else None,
+                    is_default=not bounds,
+                    estimated_rows=int(row["estimated_rows"]),
+                )
+            )
+        partitions.sort(key=lambda p: (p.is_default, p.lower or datetime.datetime.min))
+        self._partitions[table] = partitions
+        return partitions
+
+    async def _create_upcoming(
+        self,
+        client: Any,
+        table: str,
+        partitions: List[Partition],
+        now: datetime.datetime,
+    ) -> List[str]:
+        ranges = [
+            (p.lower or datetime.datetime.min, p.upper or datetime.datetime.max)
+            for p in partitions
+            if not p.is_default
+        ]
+        default = next((p.name for p in partitions if p.is_default), None)
+        created = []
+        start = period_start(now, self.interval)
+        for _ in range(self.premake + 1):
+            end = next_period(start, self.interval)
+            free = _uncovered(start, end, ranges)
+            if free is not None:
+                name = f"{table}_p{start:%Y%m%d}"
+                lower = f"{free[0]:%Y-%m-%d %H:%M:%S}"
+                upper = f"{free[1]:%Y-%m-%d %H:%M:%S}"
+                if default is None:
+                    await client.execute_raw(
+                        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+                    )
+                else:
+                    await client.execute_raw(
+                        _CREATE_PARTITION_SQL.format(
+                            table=table,
+                            name=name,
+                            default=default,
+                            column=TIME_COLUMNS[table],
+                            lower=lower,
+                            upper=upper,
+                        )
+                    )
+                ranges.append(free)
+                created.append(name)
+                self.created += 1
+            start = end
+        return created
+
+    async def _retire_expired(
+        self,
+        client: Any,
+        table: str,
+        partitions: List[Partition],
+        now: datetime.datetime,
+        retention_days: int,
+    ) -> List[str]:
+        if retention_days <= 0:
+            return []
+        cutoff = now - datetime.timedelta(days=retention_days)
+        retired = []
+        for partition in partitions:
+            if partition.is_default:
+                # The default partition is never retired, but its expired rows are.
+                deleted = await client.execute_raw(
+                    f'DELETE FROM "{partition.name}" '
+                    f"WHERE \"{TIME_COLUMNS[table]}\" < '{cutoff:%Y-%m-%d %H:%M:%S}'"
+                )
+                self.default_rows_deleted += deleted
+                continue
+            if partition.upper is None:
+                continue
+            if partition.upper > cutoff:
+                continue
+            if self.retention_action == "detach":
+                await client.execute_raw(
+                    f'ALTER TABLE "{table}" DETACH PARTITION "{partition.name}"'
+                )
+            else:
+                await client.execute_raw(f'DROP TABLE IF EXISTS "{partition.name}"')
+            retired.append(partition.name)
+            self.retired += 1
+        return retired
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with project.db.try_advisory_lock(
+                    "log_partitions", self.check_interval
+                ) as locked:
+                    if locked:
+                        await self.run_once()
+                    else:
+                        self.skipped_runs += 1
+                        await self.refresh()
+            except Exception:
+                self.failures += 1
+                logger.exception("Partition maintenance failed")
+            await asyncio.sleep(self.check_interval)
+
+
+def _uncovered(
+    start: datetime.datetime,
+    end: datetime.datetime,
+    ranges: List[Tuple[datetime.datetime, datetime.datetime]],
+) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Returns the part of [start, end) not covered by existing partitions, assuming existing ranges only clip it at either end (e.g. the legacy partition ending mid-period), or None if nothing is left.
+    """
+    for lower, upper in ranges:
+        if lower >= end or upper <= start:
+            continue
+        if lower <= start:
+            start = upper
+        else:
+            end = lower
+        if start >= end:
+            return None
+    return start, end
+
+
+partition_manager = PartitionManager(
+    tables={
+        "CLILog": int(os.getenv("CLILOG_RETENTION_DAYS", "0")),
+        "APILog": int(os.getenv("APILOG_RETENTION_DAYS", "0")),
+    },
+    interval=os.getenv("LOG_PARTITION_INTERVAL", "day"),
+    premake=int(os.getenv("LOG_PARTITION_PREMAKE", "3")),
+    retention_action=os.getenv("LOG_PARTITION_RETENTION_ACTION", "drop"),
+    check_interval=float(os.getenv("LOG_PARTITION_CHECK_SECONDS", "3600")),
+)
+
+
+async def _main() -> None:
+    client = prisma.Prisma(auto_register=True)
+    await client.connect()
+    try:
+        print(json.dumps(await partition_manager.run_once(), indent=2))
+        print(json.dumps(partition_manager.stats()["tables"], indent=2))
+    finally:
+        await client.disconnect()
+
+
+if __name__ == "__main__":
+    # One-off run against DATABASE_URL: python -m project.partitions
+    asyncio.run(_main())
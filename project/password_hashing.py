@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import bcrypt
+import project.metrics
+
+T = TypeVar("T")
+
+# bcrypt only uses the first 72 bytes of a password; bcrypt 5 rejects longer ones outright.
+MAX_PASSWORD_BYTES = 72
+
+
+class PasswordTooLongError(ValueError):
+    """
+    Raised when a password to be hashed is longer than MAX_PASSWORD_BYTES in UTF-8. Routes answer it with 400.
+    """
+
+
+def check_password_length(password: str) -> None:
+    """
+    Raises PasswordTooLongError if bcrypt cannot hash the password.
+    """
+    if len(password.encode("utf-8")) > MAX_PASSWORD_BYTES:
+        raise PasswordTooLongError(
+            f"Password must be at most {MAX_PASSWORD_BYTES} bytes."
+        )
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so hashing never blocks the event loop. bcrypt releases the GIL while it works, so threads give real parallelism. A semaphore caps how many operations are admitted to the pool at once; callers beyond that wait, and the time they spend waiting is recorded.
+    """
+
+    def __init__(self, workers: int, max_concurrency: int, rounds: int) -> None:
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.rounds = rounds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.operations = 0
+        self.waiting = 0
+        self.total_queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def hash_password(self, password: str) -> str:
+        check_password_length(password)
+        hashed = await self._submit(
+            "hashpw",
+            bcrypt.hashpw,
+            password.encode("utf-8"),
+            bcrypt.gensalt(self.rounds),
+        )
+        return hashed.decode("utf-8")
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        try:
+            return await self._submit(
+                "checkpw",
+                bcrypt.checkpw,
+                # Hashes made before bcrypt 5 silently used only the first 72 bytes.
+                password.encode("utf-8")[:MAX_PASSWORD_BYTES],
+                hashed.encode("utf-8"),
+            )
+        except ValueError:
+            # Not a bcrypt hash (e.g. a legacy plaintext row); never a match.
+            return False
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "operations": self.operations,
+            "waiting": self.waiting,
+            "total_queue_wait_seconds": self.total_queue_wait_seconds,
+            "max_queue_wait_seconds": self.max_queue_wait_seconds,
+            "total_run_seconds": self.total_run_seconds,
+        }
+
+    async def _submit(self, operation: str, fn: Callable[..., T], *args: Any) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt"
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            started = time.perf_counter()
+            wait = started - queued
+            self.total_queue_wait_seconds += wait
+            self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, wait)
+            project.metrics.registry.observe(
+                "operation_duration_seconds",
+                wait,
+                kind="bcrypt_queue_wait",
+                operation=operation,
+            )
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, fn, *args)
+            elapsed = time.perf_counter() - started
+            self.total_run_seconds += elapsed
+            project.metrics.registry.observe(
+                "operation_duration_seconds",
+                elapsed,
+                kind="bcrypt",
+                operation=operation,
+            )
+            self.operations += 1
+            return result
+        finally:
+            self._semaphore.release()
+
+
+_cpu_count = os.cpu_count() or 1
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(_cpu_count))),
+    max_concurrency=int(
+        os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", str(2 * _cpu_count))
+    ),
+    rounds=int(os.getenv("PASSWORD_HASH_ROUNDS", "12")),
+)
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hashes a password with bcrypt on the shared worker pool.
+
+    Args:
+        password (str): The plaintext password.
+
+    Returns:
+        str: The bcrypt hash, suitable for storing in User.password.
+
+    Raises:
+        PasswordTooLongError: The password is longer than MAX_PASSWORD_BYTES.
+    """
+    return await password_hasher.hash_password(password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """
+    Checks a password against a stored bcrypt hash on the shared worker pool.
+
+    Args:
+        password (str): The plaintext password supplied by the user.
+        hashed (str): The stored User.password value.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    return await password_hasher.verify_password(password, hashed)
@@ -0,0 +1,78 @@
+import datetime
+import time
+from typing import List
+
+import prisma
+import prisma.models
+import project.auth_tokens
+import project.cli_commands
+import project.log_writer
+from project.processHelloWorldCommand_service import HelloWorldCommandResponse
+from pydantic import BaseModel
+
+
+class HelloWorldCommandBatchResponse(BaseModel):
+    """
+    Model for the response of a batch of CLI commands. Results are returned in the same order as the submitted commands.
+    """
+
+    results: List[HelloWorldCommandResponse]
+
+
+async def processHelloWorldCommandBatch(
+    token: str, commands: List[str]
+) -> HelloWorldCommandBatchResponse:
+    """
+    Processes many CLI commands in one request. The token is validated once, commands whose logging policy is 'record' are logged to CLILog with a single bulk insert ('defer' ones go to the write-behind log writer, 'skip' ones are not logged), and one result per command is returned in submission order.
+
+    Args:
+        token (str): Access token for user validation.
+        commands (List[str]): The CLI commands issued by the user, in order.
+
+    Returns:
+        HelloWorldCommandBatchResponse: One HelloWorldCommandResponse per command, in the order submitted.
+
+    Example:
+        response = await processHelloWorldCommandBatch('token-123', ['hello', 'bogus'])
+        print(response)
+        > HelloWorldCommandBatchResponse(results=[HelloWorldCommandResponse(message='Hello World'), HelloWorldCommandResponse(message='Command not recognized')])
+    """
+    session = await project.auth_tokens.resolve_token(token)
+    if not session or (session.expiresAt and session.expiresAt < time.time()):
+        invalid = HelloWorldCommandResponse(message="Invalid or expired token.")
+        return HelloWorldCommandBatchResponse(results=[invalid] * len(commands))
+    registry = project.cli_commands.registry
+    invocations = [registry.resolve(command) for command in commands]
+    executed_at = datetime.datetime.now(datetime.timezone.utc)
+    recorded = [
+        command
+        for command, invocation in zip(commands, invocations)
+        if invocation.logging is project.cli_commands.CommandLogging.record
+    ]
+    if recorded:
+        await prisma.models.CLILog.prisma().create_many(
+            data=[
+                {
+                    "userId": session.userId,
+                    "command": command,
+                    "executedAt": executed_at,
+                }
+                for command in recorded
+            ]
+        )
+    for command, invocation in zip(commands, invocations):
+        if invocation.logging is project.cli_commands.CommandLogging.defer:
+            await project.log_writer.log_writer.enqueue_cli_log(
+                userId=session.userId, command=command, executedAt=executed_at
+            )
+    context = project.cli_commands.CommandContext(
+        userId=session.userId, role=session.role
+    )
+    return HelloWorldCommandBatchResponse(
+        results=[
+            HelloWorldCommandResponse(
+                message=await registry.execute(invocation, context)
+            )
+            for invocation in invocations
+        ]
+    )
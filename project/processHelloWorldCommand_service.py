@@ -1,7 +1,9 @@
 import datetime
+import time
 
-import prisma
-import prisma.models
+import project.auth_tokens
+import project.cli_commands
+import project.log_writer
 from pydantic import BaseModel
 
 
@@ -19,6 +21,8 @@ async def processHelloWorldCommand(
     """
     This endpoint processes the 'Hello World' command from the CLI. Upon validation of the user's token, it checks the command input. If the command is recognized, it responds with a 'Hello World' message in a JSON format. This allows the user to interact with the CLI in issuing specific commands and receiving appropriate feedback.
 
+    Commands are dispatched through project.cli_commands.registry, which also decides whether the invocation is logged to CLILog.
+
     Args:
         token (str): Access token for user validation.
         command (str): The CLI command issued by the user.
@@ -33,20 +37,19 @@ async def processHelloWorldCommand(
         print(response)
         > HelloWorldCommandResponse(message='Hello World')
     """
-    session = await prisma.models.Session.prisma().find_unique(where={"id": int(token)})
-    if not session or (
-        session.expiresAt and session.expiresAt < datetime.datetime.now()
-    ):
+    session = await project.auth_tokens.resolve_token(token)
+    if not session or (session.expiresAt and session.expiresAt < time.time()):
         return HelloWorldCommandResponse(message="Invalid or expired token.")
-    await prisma.models.CLILog.prisma().create(
-        data={
-            "userId": session.userId,
-            "command": command,
-            "executedAt": datetime.datetime.now(),
-        }
+    registry = project.cli_commands.registry
+    invocation = registry.resolve(command)
+    if invocation.logging is not project.cli_commands.CommandLogging.skip:
+        await project.log_writer.log_writer.enqueue_cli_log(
+            userId=session.userId,
+            command=command,
+            executedAt=datetime.datetime.now(datetime.timezone.utc),
+        )
+    message = await registry.execute(
+        invocation,
+        project.cli_commands.CommandContext(userId=session.userId, role=session.role),
     )
-    if command == "hello":
-        message = "Hello World"
-    else:
-        message = "Command not recognized"
     return HelloWorldCommandResponse(message=message)
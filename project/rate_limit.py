@@ -0,0 +1,209 @@
+import abc
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+from urllib.parse import parse_qs
+
+import project.auth_tokens
+import project.metrics
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+_TOO_MANY_REQUESTS_BODY = b'{"error":"Too many requests."}'
+
+
+class RateLimit(NamedTuple):
+    """
+    Token bucket parameters: up to `burst` requests at once, refilled at `rate` requests per second.
+    """
+
+    rate: float
+    burst: float
+
+
+def parse_rate_limits(spec: str) -> Dict[str, RateLimit]:
+    """
+    Parses a comma-separated list of 'METHOD /path=count/seconds' rules. Paths may contain {param} placeholders, as in route definitions.
+
+    Example:
+        parse_rate_limits("POST /login=10/60")
+        > {'POST /login': RateLimit(rate=0.1666..., burst=10.0)}
+    """
+    limits = {}
+    for rule in spec.split(","):
+        if not rule.strip():
+            continue
+        route, _, limit = rule.rpartition("=")
+        count, _, seconds = limit.partition("/")
+        limits[" ".join(route.split())] = RateLimit(
+            rate=float(count) / float(seconds or 1), burst=float(count)
+        )
+    return limits
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Storage for token buckets. The local backend keeps them in process memory; a shared store (e.g. Redis) can implement the same method so that limits hold across workers and hosts.
+    """
+
+    @abc.abstractmethod
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """
+        Takes one token from the bucket for key.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds until a token is available.
+        """
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets stored as (tokens, updated_at) tuples in an LRU map. Buckets refill lazily when touched, so there is no timer per key, and the least recently used buckets are dropped once max_keys is reached. Dropping an idle bucket is harmless: it would have refilled to a full burst anyway.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.evictions = 0
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = limit.burst
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            tokens = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            self._buckets.move_to_end(key)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / limit.rate
+
+    def stats(self) -> Dict[str, int]:
+        return {"buckets": len(self._buckets), "evictions": self.evictions}
+
+
+class RateLimiter:
+    """
+    Applies per-route token bucket limits. Requests carrying an auth token are keyed by the user it belongs to, when that is known without a database query: from a signed token's claims or from the session cache. Everything else is keyed by client IP.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, RateLimit]) -> None:
+        self.backend = backend
+        self._rules: List[Tuple[str, Pattern, str, RateLimit]] = []
+        for route, limit in limits.items():
+            method, _, path = route.partition(" ")
+            self._rules.append((method.upper(), compile_path(path)[0], route, limit))
+        self.allowed = 0
+        self.rejected = 0
+
+    def match(self, method: str, path: str) -> Optional[Tuple[str, RateLimit]]:
+        for rule_method, regex, route, limit in self._rules:
+            if rule_method == method and regex.match(path):
+                return route, limit
+        return None
+
+    def client_key(self, scope: Scope) -> str:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        for param in project.auth_tokens.TOKEN_QUERY_PARAMS:
+            if param in query:
+                try:
+                    user_id = project.auth_tokens.peek_user_id(query[param][0])
+                except Exception:
+                    # Runs before the route; an unreadable token is limited by IP instead.
+                    logger.exception("Could not identify the caller for rate limiting")
+                    user_id = None
+                if user_id is not None:
+                    return f"user:{user_id}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, scope: Scope) -> Optional[Tuple[str, float]]:
+        """
+        Charges the request against its route's limit.
+
+        Returns:
+            Optional[Tuple[str, float]]: None if the request may proceed, otherwise the limited route and the seconds to wait before retrying.
+        """
+        matched = self.match(scope["method"], scope["path"])
+        if matched is None:
+            return None
+        route, limit = matched
+        retry_after = await self.backend.take(
+            f"{route}|{self.client_key(scope)}", limit
+        )
+        if retry_after <= 0:
+            self.allowed += 1
+            return None
+        self.rejected += 1
+        return route, retry_after
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            **self.backend.stats(),
+        }
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that answers 429 with a Retry-After header before routing, so rejected requests never reach request validation, the database or bcrypt.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            rejected = await self.limiter.check(scope)
+            if rejected is not None:
+                route, retry_after = rejected
+                project.metrics.registry.inc("rate_limited_total", route=route)
+                await _send_429(send, retry_after)
+                return
+        await self.app(scope, receive, send)
+
+
+async def _send_429(send: Send, retry_after: float) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (
+                    b"content-length",
+                    str(len(_TOO_MANY_REQUESTS_BODY)).encode("latin-1"),
+                ),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": _TOO_MANY_REQUESTS_BODY})
+
+
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "POST /login=10/60,"
+    "POST /api/cli/helloworld=20/1,"
+    "POST /api/cli/helloworld/batch=5/1",
+)
+
+rate_limiter = RateLimiter(
+    LocalRateLimitBackend(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))),
+    parse_rate_limits(RATE_LIMITS),
+)
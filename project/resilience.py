@@ -0,0 +1,387 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import parse_qsl, urlsplit
+
+import prisma.errors
+import project.metrics
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Header a caller can send to ask for a shorter deadline than the server's, in seconds.
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("_deadline", default=None)
+
+
+class DatabaseUnavailableError(Exception):
+    """
+    Raised instead of (or while) running a database query that cannot complete in time. Routes answer it with 503 and a Retry-After of retry_after seconds.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(DatabaseUnavailableError):
+    pass
+
+
+class CircuitOpenError(DatabaseUnavailableError):
+    pass
+
+
+class DatabaseOverloadedError(DatabaseUnavailableError):
+    pass
+
+
+# Errors Prisma maps from engine codes that mean the database answered the query.
+_ANSWERED_ERRORS = (
+    prisma.errors.UniqueViolationError,
+    prisma.errors.ForeignKeyViolationError,
+    prisma.errors.RecordNotFoundError,
+    prisma.errors.MissingRequiredValueError,
+    prisma.errors.InputError,
+)
+
+# Engine codes raised as a plain DataError when the query got no answer: P1xxx are
+# connection errors (P1001 unreachable, P1008 timed out), P2024 a pool checkout timeout.
+_UNANSWERED_CODE_PREFIX = "P1"
+_UNANSWERED_CODES = frozenset({"P2024"})
+
+
+def is_database_answer(error: BaseException) -> bool:
+    """
+    Whether a failed query was answered by the database, i.e. rejected for its data (a constraint violation, a missing record, invalid input) rather than failed because the database could not be reached or did not answer in time.
+
+    Prisma raises a plain DataError for every engine code it does not map to a subclass, connection errors and pool timeouts included, so those are told apart by their error code.
+    """
+    if isinstance(error, _ANSWERED_ERRORS):
+        return True
+    if not isinstance(error, prisma.errors.DataError):
+        return False
+    code = str(error.code or "")
+    return not (code.startswith(_UNANSWERED_CODE_PREFIX) or code in _UNANSWERED_CODES)
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Seconds left before the current request's deadline, or None outside a request or for routes without one.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def with_deadline(fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs fn() within the current request's deadline, raising DeadlineExceededError if it is (or has already been) exceeded.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return await fn()
+    if remaining <= 0:
+        raise DeadlineExceededError("Request deadline exceeded.")
+    try:
+        return await asyncio.wait_for(fn(), remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError("Request deadline exceeded.") from None
+
+
+class CircuitBreaker:
+    """
+    Guards database queries so that a slow or failing Postgres produces fast 503s instead of a pile-up of waiting requests.
+
+    Closed: queries run, and the outcome of the last window_size is tracked. Once at least min_calls are tracked and the share of failures reaches failure_rate, or the share of calls slower than slow_call_seconds reaches slow_call_rate, the breaker opens.
+    Open: queries fail immediately with CircuitOpenError for open_seconds.
+    Half-open: up to half_open_calls trial queries run; if they all succeed the breaker closes, and any failure opens it again.
+
+    Independently of the state, at most max_inflight queries (0 for no limit) may be waiting on the database at once, so excess load is shed with DatabaseOverloadedError before it queues up for a pool connection. Errors that mean the database answered (constraint violations, missing records; see is_database_answer) count as successes, while connection errors and pool timeouts count as failures even though Prisma raises them as a plain DataError.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        window_size: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        half_open_calls: int,
+        max_inflight: int,
+    ) -> None:
+        self.enabled = enabled
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.max_inflight = max_inflight
+        self.state = "closed"
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._window_failures = 0
+        self._window_slow = 0
+        self._open_until = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.inflight = 0
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.deadline_exceeded = 0
+        self.rejected = 0
+        self.shed = 0
+        self.trips = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs a query through the breaker and within the current request's deadline.
+
+        Args:
+            fn (Callable[[], Awaitable[T]]): Starts the query.
+
+        Returns:
+            T: The query result.
+
+        Raises:
+            CircuitOpenError: The breaker is open, or half-open with all trial slots taken.
+            DatabaseOverloadedError: max_inflight queries are already waiting.
+            DeadlineExceededError: The request deadline passed before or during the query.
+        """
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            # Spent before reaching the database (e.g. hashing a password); not a database failure.
+            self.deadline_exceeded += 1
+            raise DeadlineExceededError("Request deadline exceeded.")
+        probe = self._admit()
+        self.inflight += 1
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            result = await with_deadline(fn)
+        except DeadlineExceededError:
+            self.deadline_exceeded += 1
+            self._record(probe, failed=True, elapsed=time.monotonic() - started)
+            raise
+        except asyncio.CancelledError:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        except Exception as e:
+            self._record(
+                probe,
+                failed=not is_database_answer(e),
+                elapsed=time.monotonic() - started,
+            )
+            raise
+        finally:
+            self.inflight -= 1
+        self._record(probe, failed=False, elapsed=time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        window = len(self._window)
+        return {
+            "state": self.state,
+            "open": int(self.state != "closed"),
+            "inflight": self.inflight,
+            "window_failure_rate": self._window_failures / window if window else 0.0,
+            "window_slow_rate": self._window_slow / window if window else 0.0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "deadline_exceeded": self.deadline_exceeded,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "trips": self.trips,
+        }
+
+    def _admit(self) -> bool:
+        probe = False
+        if self.enabled and self.state != "closed":
+            now = time.monotonic()
+            if self.state == "open" and now >= self._open_until:
+                self.state = "half_open"
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == "open":
+                self.rejected += 1
+                raise CircuitOpenError(
+                    "Database unavailable.", retry_after=self._open_until - now
+                )
+            if self._probes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError("Database unavailable.", retry_after=1)
+            self._probes += 1
+            probe = True
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            if probe:
+                self._probes -= 1
+            self.shed += 1
+            raise DatabaseOverloadedError("Database overloaded.", retry_after=1)
+        return probe
+
+    def _record(self, probe: bool, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= self.slow_call_seconds
+        self.failures += failed
+        self.slow_calls += slow
+        if not self.enabled:
+            return
+        if probe:
+            # Probes admitted before a re-trip may finish after the next half-open began.
+            self._probes = max(0, self._probes - 1)
+            if self.state != "half_open":
+                return
+            if failed or slow:
+                self._trip()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self.state = "closed"
+                logger.info("Database circuit breaker closed")
+            return
+        if self.state != "closed":
+            return
+        if len(self._window) == self._window.maxlen:
+            old_failed, old_slow = self._window[0]
+            self._window_failures -= old_failed
+            self._window_slow -= old_slow
+        self._window.append((failed, slow))
+        self._window_failures += failed
+        self._window_slow += slow
+        window = len(self._window)
+        if window >= self.min_calls and (
+            self._window_failures >= self.failure_rate * window
+            or self._window_slow >= self.slow_call_rate * window
+        ):
+            self._trip()
+
+    def _trip(self) -> None:
+        self.state = "open"
+        self._open_until = time.monotonic() + self.open_seconds
+        self._window.clear()
+        self._window_failures = 0
+        self._window_slow = 0
+        self.trips += 1
+        project.metrics.registry.inc("circuit_breaker_trips_total")
+        logger.warning("Database circuit breaker opened for %.1fs", self.open_seconds)
+
+
+def parse_deadlines(spec: str) -> Dict[str, float]:
+    """
+    Parses a comma-separated list of 'METHOD /path=seconds' rules; 0 seconds means no deadline.
+
+    Example:
+        parse_deadlines("GET /users/{userId}/logs/{kind}/export=0")
+        > {'GET /users/{userId}/logs/{kind}/export': 0.0}
+    """
+    deadlines = {}
+    for rule in spec.split(","):
+        if not rule.strip():
+            continue
+        route, _, seconds = rule.rpartition("=")
+        deadlines[" ".join(route.split())] = float(seconds)
+    return deadlines
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that gives each request a deadline for its database queries: default_seconds, a per-route override, or a shorter X-Request-Timeout sent by the caller. Queries still running at the deadline are abandoned with DeadlineExceededError, so a slow database cannot hold requests (and their memory) indefinitely.
+    """
+
+    def __init__(
+        self, app: ASGIApp, default_seconds: float, overrides: Dict[str, float]
+    ) -> None:
+        self.app = app
+        self.default_seconds = default_seconds
+        self._rules: List[Tuple[str, Pattern, float]] = []
+        for route, seconds in overrides.items():
+            method, _, path = route.partition(" ")
+            self._rules.append((method.upper(), compile_path(path)[0], seconds))
+
+    def seconds_for(self, scope: Scope) -> float:
+        seconds = self.default_seconds
+        for method, regex, route_seconds in self._rules:
+            if method == scope["method"] and regex.match(scope["path"]):
+                seconds = route_seconds
+                break
+        for name, value in scope["headers"]:
+            if name == REQUEST_TIMEOUT_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0 and (seconds <= 0 or requested < seconds):
+                    seconds = requested
+                break
+        return seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.seconds_for(scope)
+        token = _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+def retry_after_header(error: DatabaseUnavailableError) -> str:
+    return str(max(1, math.ceil(error.retry_after)))
+
+
+REQUEST_DEADLINES = os.getenv(
+    "REQUEST_DEADLINES",
+    "POST /users/bulk=0,"
+    "POST /users/bulk/upload=0,"
+    "GET /users/{userId}/logs/{kind}/export=0",
+)
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+
+
+def _default_max_inflight() -> int:
+    # Twice the Prisma pool size (set per worker by python -m project), so that at most one
+    # query per connection waits for the pool; unlimited when the pool size is not configured.
+    query = dict(parse_qsl(urlsplit(os.getenv("DATABASE_URL", "")).query))
+    limit = query.get("connection_limit", "")
+    return 2 * int(limit) if limit.isdigit() else 0
+
+
+circuit_breaker = CircuitBreaker(
+    enabled=os.getenv("DB_BREAKER_ENABLED", "1") == "1",
+    window_size=int(os.getenv("DB_BREAKER_WINDOW", "100")),
+    min_calls=int(os.getenv("DB_BREAKER_MIN_CALLS", "20")),
+    failure_rate=float(os.getenv("DB_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("DB_BREAKER_SLOW_CALL_SECONDS", "2")),
+    slow_call_rate=float(os.getenv("DB_BREAKER_SLOW_CALL_RATE", "0.8")),
+    open_seconds=float(os.getenv("DB_BREAKER_OPEN_SECONDS", "5")),
+    half_open_calls=int(os.getenv("DB_BREAKER_HALF_OPEN_CALLS", "3")),
+    max_inflight=int(
+        os.getenv("DB_MAX_INFLIGHT_QUERIES", "") or _default_max_inflight()
+    ),
+)
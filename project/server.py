@@ -1,33 +1,107 @@
+import datetime
 import logging
+import os
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import List, Optional
 
 import prisma
 import prisma.enums
+import project.api_audit
+import project.auth_tokens
+import project.bulkCreateUsers_service
+import project.bulkGetUsers_service
+import project.cli_commands
+import project.compression
 import project.createUser_service
+import project.db
 import project.deleteUser_service
+import project.exportAuditLogs_service
 import project.getHelloWorld_service
 import project.getUser_service
+import project.idempotency
+import project.log_writer
 import project.loginUser_service
 import project.logoutUser_service
+import project.maintenance
+import project.metrics
+import project.partitions
+import project.password_hashing
 import project.processHelloWorldCommand_service
+import project.processHelloWorldCommandBatch_service
+import project.rate_limit
+import project.resilience
+import project.session_cache
+import project.startup
 import project.updateUser_service
 import project.validateAuthToken_service
-from fastapi import FastAPI
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import Response
-from prisma import Prisma
+from fastapi import Body, FastAPI, Query, Request
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 
 logger = logging.getLogger(__name__)
 
-db_client = Prisma(auto_register=True)
+
+db_client = project.db.InstrumentedPrisma(auto_register=True)
+
+AUDIT_EXPORT_PAGE_SIZE = int(os.getenv("AUDIT_EXPORT_PAGE_SIZE", "1000"))
+
+CLI_BATCH_MAX_COMMANDS = int(os.getenv("CLI_BATCH_MAX_COMMANDS", "10000"))
+
+BULK_USER_CHUNK_SIZE = int(os.getenv("BULK_USER_CHUNK_SIZE", "500"))
+
+BULK_USER_MAX_ROWS = int(os.getenv("BULK_USER_MAX_ROWS", "50000"))
+
+HELLO_WORLD_FAST_PATH = os.getenv("HELLO_WORLD_FAST_PATH", "1") == "1"
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "0") == "1"
+
+GET_USER_SESSION_LIMIT = int(os.getenv("GET_USER_SESSION_LIMIT", "50"))
+
+GET_USER_MAX_SESSION_LIMIT = int(os.getenv("GET_USER_MAX_SESSION_LIMIT", "1000"))
+
+# Routes that do not touch the database and are served while a background startup is connecting.
+STARTUP_EXEMPT_PREFIXES = (
+    "/hello-world",
+    "/health/",
+    "/metrics",
+    "/internal/",
+    "/docs",
+    "/openapi.json",
+)
+
+_HELLO_WORLD_HEADERS = {
+    "ETag": project.getHelloWorld_service.HELLO_WORLD_ETAG,
+    "Cache-Control": "public, max-age=86400",
+}
+
+
+async def _connect() -> None:
+    if not db_client.is_connected():
+        await db_client.connect()
+    await project.db.replica_router.start()
+    await project.log_writer.log_writer.start()
+    await project.auth_tokens.revocation_list.start()
+    await project.partitions.partition_manager.start()
+    await project.maintenance.maintenance_task.start()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await db_client.connect()
+    await project.startup.startup.start(_connect)
     yield
-    await db_client.disconnect()
+    await project.startup.startup.stop()
+    await project.maintenance.maintenance_task.stop()
+    await project.partitions.partition_manager.stop()
+    await project.auth_tokens.revocation_list.stop()
+    await project.log_writer.log_writer.stop()
+    project.password_hashing.password_hasher.shutdown()
+    await project.db.replica_router.stop()
+    if db_client.is_connected():
+        await db_client.disconnect()
 
 
 app = FastAPI(
@@ -35,29 +109,111 @@ app = FastAPI(
     lifespan=lifespan,
     description="create a single hello world app",
 )
+app.router.route_class = project.metrics.TimedRoute
+app.add_middleware(
+    project.idempotency.IdempotencyMiddleware,
+    cache=project.idempotency.idempotency_cache,
+)
+app.add_middleware(
+    project.resilience.DeadlineMiddleware,
+    default_seconds=project.resilience.REQUEST_DEADLINE_SECONDS,
+    overrides=project.resilience.parse_deadlines(project.resilience.REQUEST_DEADLINES),
+)
+app.add_middleware(
+    project.api_audit.ApiAuditMiddleware, auditor=project.api_audit.api_auditor
+)
+app.add_middleware(
+    project.startup.ReadinessGate,
+    startup=project.startup.startup,
+    exempt_prefixes=STARTUP_EXEMPT_PREFIXES,
+)
+app.add_middleware(
+    project.rate_limit.RateLimitMiddleware,
+    limiter=project.rate_limit.rate_limiter,
+)
+app.add_middleware(
+    project.compression.CompressionMiddleware,
+    compressor=project.compression.response_compressor,
+)
+app.add_middleware(project.metrics.MetricsMiddleware)
+
+for _prefix, _stats in (
+    ("session_cache", project.session_cache.session_cache.stats),
+    ("log_writer", project.log_writer.log_writer.stats),
+    ("api_audit", project.api_audit.api_auditor.stats),
+    ("password_hashing", project.password_hashing.password_hasher.stats),
+    ("token_revocation", project.auth_tokens.revocation_list.stats),
+    ("maintenance", project.maintenance.maintenance_task.stats),
+    ("partitions", project.partitions.partition_manager.stats),
+    ("rate_limit", project.rate_limit.rate_limiter.stats),
+    ("compression", project.compression.response_compressor.stats),
+    ("idempotency", project.idempotency.idempotency_cache.stats),
+    ("replica", project.db.replica_router.stats),
+    ("single_flight", project.db.single_flight.stats),
+    ("db_breaker", project.resilience.circuit_breaker.stats),
+    ("cli_commands", project.cli_commands.registry.stats),
+    ("startup", project.startup.startup.stats),
+):
+    project.metrics.registry.register_collector(
+        project.metrics.stats_collector(_prefix, _stats)
+    )
+
+
+def _error_response(e: Exception) -> JSONResponse:
+    """
+    Maps an exception raised by a service to the route's error response: 503 with Retry-After when the database is unavailable (circuit open, overloaded or past the request deadline), 409 when a conditional write conflicts with existing data, 400 for a password bcrypt cannot hash, 500 otherwise.
+    """
+    if isinstance(e, project.db.WriteConflictError):
+        return JSONResponse(content={"error": str(e)}, status_code=409)
+    if isinstance(e, project.password_hashing.PasswordTooLongError):
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    if isinstance(e, project.resilience.DatabaseUnavailableError):
+        return JSONResponse(
+            content={"error": str(e)},
+            status_code=503,
+            headers={"Retry-After": project.resilience.retry_after_header(e)},
+        )
+    logger.exception("Error processing request")
+    return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
 
 
 @app.get(
     "/hello-world", response_model=project.getHelloWorld_service.HelloWorldResponse
 )
 async def api_get_getHelloWorld(
-    request: project.getHelloWorld_service.HelloWorldRequest,
+    request: Request,
 ) -> project.getHelloWorld_service.HelloWorldResponse | Response:
     """
     This route handles GET requests at the '/hello-world' path. When accessed, it returns a 'Hello World' message. The route is straightforward and does not require any parameters or sophisticated logic. It cateres to public users and does not interface with other APIs or internal modules. Expected response is a simple text message saying 'Hello World'.
     """
-    try:
-        res = project.getHelloWorld_service.getHelloWorld(request)
-        return res
-    except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
+    if HELLO_WORLD_FAST_PATH:
+        if _etag_matches(
+            request.headers.get("if-none-match"),
+            project.getHelloWorld_service.HELLO_WORLD_ETAG,
+        ):
+            return Response(status_code=304, headers=_HELLO_WORLD_HEADERS)
         return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
+            content=project.getHelloWorld_service.HELLO_WORLD_RESPONSE_BODY,
             media_type="application/json",
+            headers=_HELLO_WORLD_HEADERS,
+        )
+    try:
+        res = project.getHelloWorld_service.getHelloWorld(
+            project.getHelloWorld_service.HelloWorldRequest()
         )
+        return res
+    except Exception as e:
+        return _error_response(e)
 
 
 @app.post("/logout", response_model=project.logoutUser_service.LogoutResponseModel)
@@ -71,37 +227,40 @@ async def api_post_logoutUser(
         res = await project.logoutUser_service.logoutUser(session_token)
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
 
 
 @app.delete(
     "/users/{userId}", response_model=project.deleteUser_service.DeleteUserResponse
 )
 async def api_delete_deleteUser(
-    userId: int,
+    userId: int, background: Optional[bool] = None
 ) -> project.deleteUser_service.DeleteUserResponse | Response:
     """
-    Deletes a specific user from the system using their UserID. This operation is usually restricted to user requests for account deletion or performed by an admin for managing user accounts.
+    Deletes a specific user from the system using their UserID. This operation is usually restricted to user requests for account deletion or performed by an admin for managing user accounts. Large accounts (or any account with background=true) are tombstoned and purged in the background; poll GET /users/{userId}/deletion for progress.
     """
     try:
-        res = await project.deleteUser_service.deleteUser(userId)
+        res = await project.deleteUser_service.deleteUser(userId, background)
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
+
+
+@app.get(
+    "/users/{userId}/deletion",
+    response_model=project.deleteUser_service.UserDeletionStatusResponse,
+)
+async def api_get_getUserDeletionStatus(
+    userId: int,
+) -> project.deleteUser_service.UserDeletionStatusResponse | Response:
+    """
+    Reports whether a user is active, pending background deletion, or deleted.
+    """
+    try:
+        res = await project.deleteUser_service.getUserDeletionStatus(userId)
+        return res
+    except Exception as e:
+        return _error_response(e)
 
 
 @app.post("/users", response_model=project.createUser_service.CreateUserResponse)
@@ -109,20 +268,106 @@ async def api_post_createUser(
     username: str, password: str, role: prisma.enums.Role
 ) -> project.createUser_service.CreateUserResponse | Response:
     """
-    This route allows for the creation of a new user. It collects user data such as username and password, creates a new user record, and returns the user ID. The response will include a newly created user identifier (UserID). This action is typically utilized by administrators.
+    This route allows for the creation of a new user. It collects user data such as username and password, creates a new user record, and returns the user ID. The response will include a newly created user identifier (UserID). This action is typically utilized by administrators. Answers 409 if the username is taken; send an Idempotency-Key header to retry safely.
     """
     try:
         res = await project.createUser_service.createUser(username, password, role)
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
+        return _error_response(e)
+
+
+@app.post(
+    "/users/bulk",
+    response_model=project.bulkCreateUsers_service.BulkCreateUsersResponse,
+)
+async def api_post_bulkCreateUsers(
+    users: List[dict] = Body(...),
+) -> project.bulkCreateUsers_service.BulkCreateUsersResponse | Response:
+    """
+    Creates many users from a JSON array of {username, password, role} objects. Passwords are hashed in parallel and rows are inserted in chunks; the response reports created, duplicate or invalid for every row.
+    """
+    if len(users) > BULK_USER_MAX_ROWS:
+        return JSONResponse(
+            content={"error": f"Request exceeds {BULK_USER_MAX_ROWS} users."},
+            status_code=413,
+        )
+    try:
+        res = await project.bulkCreateUsers_service.bulkCreateUsers(
+            users, BULK_USER_CHUNK_SIZE
         )
+        return res
+    except Exception as e:
+        return _error_response(e)
+
+
+@app.post(
+    "/users/bulk/upload",
+    response_model=project.bulkCreateUsers_service.BulkCreateUsersResponse,
+)
+async def api_post_bulkUploadUsers(
+    request: Request,
+) -> project.bulkCreateUsers_service.BulkCreateUsersResponse | Response:
+    """
+    Creates users from an uploaded CSV (text/csv, with a username,password,role header) or NDJSON (application/x-ndjson) request body. The body is parsed as it streams in, so chunks are hashed and inserted before the upload has finished.
+
+    Uploads are cut off with 413 past BULK_USER_MAX_ROWS rows, and a body that is not UTF-8 answers 400; in both cases the rows of chunks already inserted stay created, and the response says how many.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        rows = project.bulkCreateUsers_service.parse_csv(request.stream())
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        rows = project.bulkCreateUsers_service.parse_ndjson(request.stream())
+    else:
+        return JSONResponse(
+            content={"error": "Upload must be text/csv or application/x-ndjson."},
+            status_code=415,
+        )
+    try:
+        res = await project.bulkCreateUsers_service.bulkCreateUsers(
+            rows, BULK_USER_CHUNK_SIZE, BULK_USER_MAX_ROWS
+        )
+        return res
+    except project.bulkCreateUsers_service.BulkUploadError as e:
+        return JSONResponse(
+            content={"error": str(e), "created": e.created},
+            status_code=(
+                413
+                if isinstance(e, project.bulkCreateUsers_service.TooManyRowsError)
+                else 400
+            ),
+        )
+    except Exception as e:
+        return _error_response(e)
+
+
+@app.post(
+    "/users/lookup",
+    response_model=project.bulkGetUsers_service.BulkUsersResponse,
+    response_model_exclude_unset=True,
+)
+async def api_post_bulkGetUsers(
+    userIds: List[int] = Body(...),
+    session_limit: int = Query(
+        GET_USER_SESSION_LIMIT, ge=1, le=GET_USER_MAX_SESSION_LIMIT
+    ),
+    active_only: bool = False,
+) -> project.bulkGetUsers_service.BulkUsersResponse | Response:
+    """
+    Retrieves the details of many users, given as a JSON array of ids, with a single query. Ids that do not exist are listed under missing. Each user's sessions are limited to the newest session_limit, as on GET /users/{userId}, which pages through the rest from nextSessionCursor.
+    """
+    if len(userIds) > BULK_USER_MAX_ROWS:
+        return JSONResponse(
+            content={"error": f"Request exceeds {BULK_USER_MAX_ROWS} ids."},
+            status_code=413,
+        )
+    try:
+        res = await project.bulkGetUsers_service.bulkGetUsers(
+            userIds, session_limit, active_only
+        )
+        return res
+    except Exception as e:
+        return _error_response(e)
 
 
 @app.post(
@@ -141,35 +386,85 @@ async def api_post_processHelloWorldCommand(
         )
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
+        return _error_response(e)
+
+
+@app.post(
+    "/api/cli/helloworld/batch",
+    response_model=project.processHelloWorldCommandBatch_service.HelloWorldCommandBatchResponse,
+)
+async def api_post_processHelloWorldCommandBatch(
+    token: str, commands: List[str] = Body(...), stream: bool = False
+) -> (
+    project.processHelloWorldCommandBatch_service.HelloWorldCommandBatchResponse
+    | Response
+):
+    """
+    Processes a JSON array of CLI commands with a single token check and a single CLILog insert. Results come back in submission order, either as one JSON document or, with stream=true, as NDJSON with one result per line.
+    """
+    if len(commands) > CLI_BATCH_MAX_COMMANDS:
+        return JSONResponse(
+            content={
+                "error": f"Batch exceeds {CLI_BATCH_MAX_COMMANDS} commands per request."
+            },
+            status_code=413,
+        )
+    try:
+        res = await project.processHelloWorldCommandBatch_service.processHelloWorldCommandBatch(
+            token, commands
         )
+        if stream:
+            return StreamingResponse(
+                (result.model_dump_json() + "\n" for result in res.results),
+                media_type="application/x-ndjson",
+            )
+        return res
+    except Exception as e:
+        return _error_response(e)
 
 
-@app.get("/users/{userId}", response_model=project.getUser_service.UserDetailsResponse)
+@app.get(
+    "/users/{userId}",
+    response_model=project.getUser_service.UserDetailsResponse,
+    response_model_exclude_unset=True,
+)
 async def api_get_getUser(
     userId: int,
+    fields: Optional[str] = None,
+    session_limit: int = Query(
+        GET_USER_SESSION_LIMIT, ge=1, le=GET_USER_MAX_SESSION_LIMIT
+    ),
+    session_cursor: Optional[int] = None,
+    active_only: bool = False,
 ) -> project.getUser_service.UserDetailsResponse | Response:
     """
     Retrieves a specific user's details by their unique identifier (UserID). The endpoint fetches user information and provides it in a secured manner. This is generally used by users to access their own information or by admins for auditing purposes.
+
+    fields is a comma-separated projection over email, role, sessions, sessionCount and version (default: email,role,sessions). Sessions come newest first in pages of session_limit; pass the returned nextSessionCursor as session_cursor to fetch the next page. active_only restricts sessions and the count to unexpired ones.
     """
+    selected = project.getUser_service.DEFAULT_USER_FIELDS
+    if fields is not None:
+        selected = tuple(field.strip() for field in fields.split(",") if field.strip())
+        unknown = set(selected) - set(project.getUser_service.USER_FIELDS)
+        if unknown:
+            return JSONResponse(
+                content={"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                status_code=400,
+            )
     try:
-        res = await project.getUser_service.getUser(userId)
+        if FAST_SERIALIZATION:
+            return Response(
+                content=await project.getUser_service.getUserJson(
+                    userId, selected, session_limit, session_cursor, active_only
+                ),
+                media_type="application/json",
+            )
+        res = await project.getUser_service.getUser(
+            userId, selected, session_limit, session_cursor, active_only
+        )
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
 
 
 @app.post(
@@ -186,14 +481,33 @@ async def api_post_validateAuthToken(
         res = await project.validateAuthToken_service.validateAuthToken(token)
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
+
+
+@app.get("/users/{userId}/logs/{kind}/export")
+async def api_get_exportAuditLogs(
+    userId: int,
+    kind: project.exportAuditLogs_service.AuditLogKind,
+    format: project.exportAuditLogs_service.AuditLogFormat = project.exportAuditLogs_service.AuditLogFormat.ndjson,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+) -> Response:
+    """
+    Streams a user's APILog ('api') or CLILog ('cli') entries in time order as NDJSON or CSV, optionally restricted to [start, end). Rows are read with keyset pagination and sent as a chunked response, so exports of any size use bounded memory.
+    """
+    media_type = {
+        project.exportAuditLogs_service.AuditLogFormat.ndjson: "application/x-ndjson",
+        project.exportAuditLogs_service.AuditLogFormat.csv: "text/csv",
+    }[format]
+    return StreamingResponse(
+        project.exportAuditLogs_service.exportAuditLogs(
+            kind, userId, start, end, format, page_size=AUDIT_EXPORT_PAGE_SIZE
+        ),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{kind.value}-logs-{userId}.{format.value}"'
+        },
+    )
 
 
 @app.post("/login", response_model=project.loginUser_service.LoginResponse)
@@ -207,34 +521,168 @@ async def api_post_loginUser(
         res = await project.loginUser_service.loginUser(username, password)
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
 
 
 @app.put(
     "/users/{userId}", response_model=project.updateUser_service.UpdateUserResponse
 )
 async def api_put_updateUser(
-    userId: int, email: Optional[str], password: Optional[str]
+    userId: int,
+    email: Optional[str],
+    password: Optional[str],
+    version: Optional[int] = None,
 ) -> project.updateUser_service.UpdateUserResponse | Response:
     """
     Updates an existing user's data. It can handle changes to user details like password or email based on the provided UserID. The endpoint ensures that the request for update comes from the corresponding user or an administrator.
+
+    Pass the version read from GET /users/{userId}?fields=version to update only if nobody has changed the user since; a stale version, or an email taken by another user, answers 409.
     """
     try:
-        res = await project.updateUser_service.updateUser(userId, email, password)
+        res = await project.updateUser_service.updateUser(
+            userId, email, password, version
+        )
         return res
     except Exception as e:
-        logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return _error_response(e)
+
+
+@app.get("/health/live")
+async def api_get_liveness() -> dict:
+    """
+    Liveness probe: the process is up and its event loop is responsive. Does not depend on the database.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def api_get_readiness() -> JSONResponse:
+    """
+    Readiness probe: 200 once the database connection and background components are up, 503 while startup is still connecting (with the last connection error, if any).
+    """
+    stats = project.startup.startup.stats()
+    return JSONResponse(
+        content={"status": "ready" if stats["ready"] else "starting", **stats},
+        status_code=200 if stats["ready"] else 503,
+    )
+
+
+@app.get("/internal/session-cache")
+async def api_get_sessionCacheStats() -> dict:
+    """
+    Reports hit, miss and eviction counters for the in-process session cache used by token validation.
+    """
+    return project.session_cache.session_cache.stats()
+
+
+@app.get("/internal/log-writer")
+async def api_get_logWriterStats() -> dict:
+    """
+    Reports queue depth, throughput and flush latency for the write-behind CLILog/APILog pipeline.
+    """
+    return project.log_writer.log_writer.stats()
+
+
+@app.get("/internal/api-audit")
+async def api_get_apiAuditStats() -> dict:
+    """
+    Reports how many authenticated API calls were recorded to APILog, skipped by sampling, or dropped because the log queue was at its cap.
+    """
+    return project.api_audit.api_auditor.stats()
+
+
+@app.get("/internal/idempotency")
+async def api_get_idempotencyStats() -> dict:
+    """
+    Reports how many Idempotency-Key responses are stored and how often retries were answered from them.
+    """
+    return project.idempotency.idempotency_cache.stats()
+
+
+@app.get("/internal/compression")
+async def api_get_compressionStats() -> dict:
+    """
+    Reports the response encodings offered and how many bytes compression has saved.
+    """
+    return project.compression.response_compressor.stats()
+
+
+@app.get("/internal/password-hashing")
+async def api_get_passwordHashingStats() -> dict:
+    """
+    Reports operation counts and queue-wait times for the bcrypt worker pool.
+    """
+    return project.password_hashing.password_hasher.stats()
+
+
+@app.get("/internal/maintenance")
+async def api_get_maintenanceStats() -> dict:
+    """
+    Reports rows reclaimed and run time for the expired-session and log-retention maintenance task.
+    """
+    return project.maintenance.maintenance_task.stats()
+
+
+@app.get("/internal/partitions")
+async def api_get_partitionStats() -> dict:
+    """
+    Lists the partitions of the CLILog and APILog tables with their time ranges and estimated row counts, and the partitions created and retired by the last run.
+    """
+    return project.partitions.partition_manager.stats()
+
+
+@app.get("/internal/rate-limiter")
+async def api_get_rateLimiterStats() -> dict:
+    """
+    Reports allowed and rejected requests and the number of live token buckets.
+    """
+    return project.rate_limit.rate_limiter.stats()
+
+
+@app.get("/internal/replica")
+async def api_get_replicaStats() -> dict:
+    """
+    Reports whether the read replica is in use and how many reads it served, were pinned to the primary or fell back to it.
+    """
+    return project.db.replica_router.stats()
+
+
+@app.get("/internal/single-flight")
+async def api_get_singleFlightStats() -> dict:
+    """
+    Reports how many session and user lookups were coalesced into an in-flight query, overall and for the keys coalesced most often.
+    """
+    return project.db.single_flight.stats()
+
+
+@app.get("/internal/circuit-breaker")
+async def api_get_circuitBreakerStats() -> dict:
+    """
+    Reports the database circuit breaker's state, the failure and slow-call rates it is tracking, and how many queries were rejected, shed or cut off by a request deadline.
+    """
+    return project.resilience.circuit_breaker.stats()
+
+
+@app.get("/internal/cli-commands")
+async def api_get_cliCommandStats() -> dict:
+    """
+    Lists the registered CLI commands with their required role and logging policy, and reports executions by outcome.
+    """
+    return {
+        **project.cli_commands.registry.stats(),
+        "registered": {
+            command.name: {"role": command.role, "logging": command.logging.value}
+            for command in project.cli_commands.registry.commands()
+        },
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def api_get_metrics() -> PlainTextResponse:
+    """
+    Exposes request latency and status histograms per route, per-operation timings (database, bcrypt, endpoint, validation and serialization) and component gauges in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        project.metrics.registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
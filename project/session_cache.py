@@ -0,0 +1,169 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+import prisma
+import prisma.models
+import project.db
+
+
+class CachedSession(NamedTuple):
+    """
+    The subset of a Session row (joined with its user) needed to authorize a request. expiresAt is stored as epoch seconds so it can be compared without timezone handling.
+    """
+
+    userId: int
+    role: str
+    expiresAt: Optional[float]
+
+
+class SessionCache:
+    """
+    Bounded LRU cache of session id -> CachedSession. Entries are evicted when the cache is full, when their TTL elapses, or when the session itself expires, whichever comes first.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[CachedSession, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, session_id: int) -> Optional[CachedSession]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        session, cached_until = entry
+        if cached_until <= time.time():
+            self._remove(session_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return session
+
+    def peek(self, session_id: int) -> Optional[CachedSession]:
+        """
+        Returns a cached, still-valid session without counting a hit or miss or refreshing its LRU position.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def put(self, session_id: int, session: CachedSession) -> None:
+        if self.max_size <= 0:
+            return
+        cached_until = time.time() + self.ttl_seconds
+        if session.expiresAt is not None:
+            cached_until = min(cached_until, session.expiresAt)
+        if session_id in self._entries:
+            self._remove(session_id)
+        self._entries[session_id] = (session, cached_until)
+        self._by_user.setdefault(session.userId, set()).add(session_id)
+        while len(self._entries) > self.max_size:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def invalidate(self, session_id: int) -> None:
+        if session_id in self._entries:
+            self._remove(session_id)
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Drops every cached session belonging to a user. Call this whenever the user is deleted or their role changes.
+        """
+        for session_id in list(self._by_user.get(user_id, ())):
+            self.invalidate(session_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, session_id: int) -> None:
+        session, _ = self._entries.pop(session_id)
+        user_sessions = self._by_user.get(session.userId)
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self._by_user[session.userId]
+
+
+session_cache = SessionCache(
+    max_size=int(os.getenv("SESSION_CACHE_MAX_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("SESSION_CACHE_TTL_SECONDS", "60")),
+)
+
+
+def parse_session_token(token: str) -> Optional[int]:
+    """
+    Extracts the session id from an auth token. Accepts both the 'token-{id}' form issued by loginUser and a bare numeric id.
+
+    Args:
+        token (str): The auth token provided by the client.
+
+    Returns:
+        Optional[int]: The session id, or None if the token is malformed.
+    """
+    if token.startswith("token-"):
+        token = token[len("token-") :]
+    try:
+        return int(token)
+    except ValueError:
+        return None
+
+
+async def get_session(session_id: int) -> Optional[CachedSession]:
+    """
+    Looks up a session by id, serving repeat lookups from the in-process cache and only querying the database on a miss. Concurrent misses for the same session share one query.
+
+    Args:
+        session_id (int): The session id to look up.
+
+    Returns:
+        Optional[CachedSession]: The session with its owner's role, or None if no such session exists.
+    """
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        return cached
+    key = project.db.session_key(session_id)
+    return await project.db.single_flight.do(key, lambda: _load_session(session_id))
+
+
+async def _load_session(session_id: int) -> Optional[CachedSession]:
+    session = await project.db.replica_router.read(
+        lambda client: prisma.models.Session.prisma(client).find_unique(
+            where={"id": session_id}, include={"user": True}
+        ),
+        project.db.session_key(session_id),
+        retry_missing=True,
+    )
+    if session is None or session.user is None:
+        return None
+    cached = CachedSession(
+        userId=session.userId,
+        role=session.user.role,
+        expiresAt=session.expiresAt.timestamp() if session.expiresAt else None,
+    )
+    session_cache.put(session_id, cached)
+    return cached
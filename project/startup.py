@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+_NOT_READY_BODY = b'{"error":"Service is starting."}'
+
+
+class Startup:
+    """
+    Tracks bringing up the database connection and the components that depend on it.
+
+    In "blocking" mode the server does not accept requests until everything is connected, which is the classic lifespan behaviour. In "background" mode the server starts serving at once and connects in a background task, retrying until it succeeds, so routes that do not touch the database answer during a cold start while the Prisma query engine is still being spawned.
+    """
+
+    def __init__(self, mode: str, ready_timeout: float, retry_interval: float) -> None:
+        self.mode = mode
+        self.ready_timeout = ready_timeout
+        self.retry_interval = retry_interval
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self.attempts = 0
+        self.connect_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.gated_requests = 0
+        self.rejected_requests = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    async def start(self, connect: Callable[[], Awaitable[None]]) -> None:
+        """
+        Runs connect() now (blocking mode) or in a background task that retries every retry_interval until it succeeds (background mode). connect() must be safe to call again after a partial failure.
+        """
+        self._started_at = time.monotonic()
+        if self.mode == "background":
+            self._task = asyncio.create_task(self._connect_until_ready(connect))
+        else:
+            await self._attempt(connect)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait_ready(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "connect_seconds": self.connect_seconds,
+            "last_error": self.last_error,
+            "gated_requests": self.gated_requests,
+            "rejected_requests": self.rejected_requests,
+        }
+
+    async def _attempt(self, connect: Callable[[], Awaitable[None]]) -> None:
+        self.attempts += 1
+        try:
+            await connect()
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.last_error = None
+        self.connect_seconds = time.monotonic() - self._started_at
+        self._ready.set()
+        logger.info("Ready after %.3fs", self.connect_seconds)
+
+    async def _connect_until_ready(
+        self, connect: Callable[[], Awaitable[None]]
+    ) -> None:
+        while True:
+            try:
+                await self._attempt(connect)
+                return
+            except Exception:
+                logger.exception(
+                    "Startup attempt %d failed; retrying in %.1fs",
+                    self.attempts,
+                    self.retry_interval,
+                )
+            await asyncio.sleep(self.retry_interval)
+
+
+class ReadinessGate:
+    """
+    ASGI middleware that holds requests for database-backed routes until startup is ready, for up to the startup's ready_timeout, then answers 503 with Retry-After. Paths starting with one of the exempt prefixes pass straight through.
+    """
+
+    def __init__(
+        self, app: ASGIApp, startup: Startup, exempt_prefixes: Tuple[str, ...]
+    ) -> None:
+        self.app = app
+        self.startup = startup
+        self.exempt_prefixes = exempt_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and not self.startup.ready
+            and not scope["path"].startswith(self.exempt_prefixes)
+        ):
+            self.startup.gated_requests += 1
+            if not await self.startup.wait_ready(self.startup.ready_timeout):
+                self.startup.rejected_requests += 1
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 503,
+                        "headers": [
+                            (b"content-type", b"application/json"),
+                            (b"content-length", str(len(_NOT_READY_BODY)).encode()),
+                            (b"retry-after", b"1"),
+                        ],
+                    }
+                )
+                await send({"type": "http.response.body", "body": _NOT_READY_BODY})
+                return
+        await self.app(scope, receive, send)
+
+
+startup = Startup(
+    mode=os.getenv("STARTUP_MODE", "blocking"),
+    ready_timeout=float(os.getenv("STARTUP_READY_TIMEOUT_SECONDS", "10")),
+    retry_interval=float(os.getenv("STARTUP_RETRY_SECONDS", "2")),
+)
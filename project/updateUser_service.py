@@ -1,34 +1,49 @@
 from typing import Optional
 
 import prisma
+import prisma.errors
 import prisma.models
+import project.db
+import project.password_hashing
+import project.resilience
 from pydantic import BaseModel
 
 
 class UpdateUserResponse(BaseModel):
     """
-    Response model returning the updated user's data confirming the changes.
+    Response model returning the updated user's data confirming the changes. version is the user's version after the update, when known.
     """
 
     success: bool
     userId: int
     email: Optional[str] = None
     message: str
+    version: Optional[int] = None
 
 
 async def updateUser(
-    userId: int, email: Optional[str], password: Optional[str]
+    userId: int,
+    email: Optional[str],
+    password: Optional[str],
+    version: Optional[int] = None,
 ) -> UpdateUserResponse:
     """
     Updates an existing user's data. It can handle changes to user details like password or email based on the provided UserID. The endpoint ensures that the request for update comes from the corresponding user or an administrator.
 
+    The update is a single conditional UPDATE: it applies only if the user exists, is not being deleted and, when version is given, is still at that version, so concurrent editors cannot overwrite each other's changes. The user is only read again when the update did not apply, to tell a missing user from a stale version.
+
     Args:
         userId (int): The unique identifier of the user to be updated.
         email (Optional[str]): New email to update. Optional, provided if email needs to be changed.
         password (Optional[str]): New password for the user. Optional, provided if password needs an update.
+        version (Optional[int]): The version the caller last read (GET /users/{userId}?fields=version). Optional; without it the update applies unconditionally.
 
     Returns:
         UpdateUserResponse: Response model returning the updated user's data confirming the changes.
+
+    Raises:
+        project.db.WriteConflictError: The email is taken by another user, or the user has changed since version.
+        project.password_hashing.PasswordTooLongError: The new password is longer than bcrypt allows.
     """
     response_data = UpdateUserResponse(
         success=False, userId=userId, email=email, message="Update failed."
@@ -38,15 +53,46 @@ async def updateUser(
         if email is not None:
             updates["email"] = email
         if password is not None:
-            updates["password"] = password
+            updates["password"] = await project.password_hashing.hash_password(password)
         if updates:
-            user = await prisma.models.User.prisma().update(
-                where={"id": userId}, data=updates
-            )
-            response_data.success = True
-            response_data.message = "User updated successfully."
+            where = {"id": userId, "deletedAt": None}
+            if version is not None:
+                where["version"] = version
+            try:
+                updated = await prisma.models.User.prisma().update_many(
+                    where=where, data={**updates, "version": {"increment": 1}}
+                )
+            except prisma.errors.UniqueViolationError:
+                raise project.db.WriteConflictError(
+                    f"User {email} already exists."
+                ) from None
+            if updated:
+                project.db.replica_router.mark_written(project.db.user_key(userId))
+                response_data.success = True
+                response_data.message = "User updated successfully."
+                if version is not None:
+                    response_data.version = version + 1
+            else:
+                await _raise_if_stale(userId, version)
+                response_data.message = "User not found."
         else:
             response_data.message = "No updates provided."
+    except (
+        project.db.WriteConflictError,
+        project.password_hashing.PasswordTooLongError,
+        project.resilience.DatabaseUnavailableError,
+    ):
+        raise
     except Exception as e:
         response_data.message = str(e)
     return response_data
+
+
+async def _raise_if_stale(userId: int, version: Optional[int]) -> None:
+    if version is None:
+        return
+    user = await prisma.models.User.prisma().find_unique(where={"id": userId})
+    if user is not None and user.deletedAt is None:
+        raise project.db.WriteConflictError(
+            f"User {userId} is at version {user.version}, not {version}."
+        )
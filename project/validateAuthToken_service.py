@@ -1,8 +1,7 @@
-import datetime
+import time
 from typing import List
 
-import prisma
-import prisma.models
+import project.auth_tokens
 from pydantic import BaseModel
 
 
@@ -29,21 +28,13 @@ async def validateAuthToken(token: str) -> AuthTokenValidationResponse:
     AuthTokenValidationResponse: This model returns the result of the authentication token validation,
     indicating whether the operation was successful or not and what roles are permitted for subsequent requests.
     """
-    try:
-        session_id = int(token)
-    except ValueError:
+    if not project.auth_tokens.is_token_well_formed(token):
         return AuthTokenValidationResponse(
             success=False, message="Invalid token format.", allowed_roles=[]
         )
-    session = await prisma.models.Session.prisma().find_first(
-        where={"id": session_id}, include={"user": True}
-    )
-    if (
-        session
-        and session.expiresAt
-        and (session.expiresAt > datetime.datetime.utcnow())
-    ):
-        allowed_roles = [session.user.role] if session.user.role else []
+    session = await project.auth_tokens.resolve_token(token)
+    if session and session.expiresAt and (session.expiresAt > time.time()):
+        allowed_roles = [session.role] if session.role else []
         return AuthTokenValidationResponse(
             success=True,
             message="Token validated successfully.",
@@ -0,0 +1,27 @@
+import asyncio
+
+import httpx
+import project.server
+import project.startup
+import pytest
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """
+    Calls the API app in-process, as if startup had connected to the database. Services that would query it are monkeypatched by each test.
+    """
+    ready = asyncio.Event()
+    ready.set()
+    monkeypatch.setattr(project.startup.startup, "_ready", ready)
+
+    async def request(method: str, path: str, **kwargs) -> httpx.Response:
+        transport = httpx.ASGITransport(
+            app=project.server.app, client=("10.0.0.1", 5000)
+        )
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await client.request(method, path, **kwargs)
+
+    return lambda method, path, **kwargs: asyncio.run(request(method, path, **kwargs))
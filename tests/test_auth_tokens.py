@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+
+import project.auth_tokens
+import project.rate_limit
+import pytest
+
+FORGED_TOKEN = (
+    "st1.eyJ1aWQiOjEsInJvbGUiOiJBZG1pbiIsInNpZCI6MSwiZXhwIjo5OTk5OTk5OTk5fQ.c2ln"
+)
+
+
+def issue_token(monkeypatch) -> str:
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", "signed")
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_SECRET", "secret")
+    return project.auth_tokens.issue_signed_token(
+        user_id=7,
+        role="User",
+        session_id=3,
+        expires_at=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(hours=1),
+    )
+
+
+@pytest.mark.parametrize("mode", ["signed", "session"])
+@pytest.mark.parametrize("token", [FORGED_TOKEN, "st1.", "st1.a.b.c"])
+def test_signed_token_without_secret_is_invalid(monkeypatch, mode, token):
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", mode)
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_SECRET", "")
+    assert project.auth_tokens.decode_signed_token(token) is None
+    assert project.auth_tokens.session_id_from_token(token) is None
+    assert project.auth_tokens.peek_user_id(token) is None
+    assert asyncio.run(project.auth_tokens.resolve_token(token)) is None
+
+
+def test_rate_limit_falls_back_to_the_client_address(monkeypatch):
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", "signed")
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_SECRET", "")
+    scope = {
+        "type": "http",
+        "query_string": f"token={FORGED_TOKEN}".encode(),
+        "client": ("10.0.0.1", 5000),
+    }
+    assert project.rate_limit.rate_limiter.client_key(scope) == "ip:10.0.0.1"
+
+
+def test_token_issued_with_a_secret_stops_verifying_without_it(monkeypatch):
+    token = issue_token(monkeypatch)
+    assert project.auth_tokens.peek_user_id(token) == 7
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_SECRET", "")
+    assert project.auth_tokens.peek_user_id(token) is None
+    assert asyncio.run(project.auth_tokens.resolve_token(token)) is None
+
+
+def test_signed_token_is_rejected_when_signed_mode_is_off(monkeypatch):
+    token = issue_token(monkeypatch)
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", "session")
+    assert not project.auth_tokens.is_token_well_formed(token)
+    assert project.auth_tokens.decode_signed_token(token) is None
+
+
+def test_tampered_signed_token_is_invalid(monkeypatch):
+    token = issue_token(monkeypatch)
+    payload, signature = token[len("st1.") :].split(".")
+    assert (
+        project.auth_tokens.decode_signed_token(f"st1.{payload}x.{signature}") is None
+    )
+    assert (
+        project.auth_tokens.decode_signed_token(f"st1.{payload}.{signature}x") is None
+    )
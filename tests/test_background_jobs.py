@@ -0,0 +1,149 @@
+import asyncio
+import contextlib
+
+import prisma
+import prisma.errors
+import project.db
+import project.maintenance
+import project.partitions
+import pytest
+
+
+class FakeTransaction:
+    def __init__(self, client: "FakeClient") -> None:
+        self.client = client
+
+    async def start(self) -> "FakeClient":
+        self.client.started += 1
+        return self.client
+
+    async def rollback(self) -> None:
+        self.client.rolled_back += 1
+        if self.client.expired:
+            raise prisma.errors.TransactionExpiredError("Transaction already closed")
+
+
+class FakeClient:
+    def __init__(self, locked: bool) -> None:
+        self.locked = locked
+        self.expired = False
+        self.started = 0
+        self.rolled_back = 0
+        self.queries = []
+
+    def tx(self, timeout) -> FakeTransaction:
+        self.timeout = timeout
+        return FakeTransaction(self)
+
+    async def query_raw(self, sql, *args):
+        self.queries.append((sql, args))
+        return [{"locked": self.locked}]
+
+
+@pytest.fixture
+def client(monkeypatch) -> FakeClient:
+    fake = FakeClient(locked=True)
+    monkeypatch.setattr(prisma, "get_client", lambda: fake)
+    return fake
+
+
+def test_advisory_lock_is_released_with_its_transaction(client):
+    async def scenario():
+        async with project.db.try_advisory_lock("maintenance", 300) as locked:
+            assert locked
+            assert client.rolled_back == 0
+        with pytest.raises(RuntimeError):
+            async with project.db.try_advisory_lock("maintenance", 300):
+                raise RuntimeError("job failed")
+
+    asyncio.run(scenario())
+    assert client.queries[0][1] == ("maintenance",)
+    assert client.timeout.total_seconds() == 300
+    assert client.started == client.rolled_back == 2
+
+
+def test_advisory_lock_held_by_another_worker_is_not_taken(client):
+    client.locked = False
+
+    async def scenario():
+        async with project.db.try_advisory_lock("maintenance", 300) as locked:
+            assert not locked
+
+    asyncio.run(scenario())
+    assert client.rolled_back == 1
+
+
+def test_advisory_lock_outliving_its_transaction_does_not_fail_the_job(client):
+    client.expired = True
+
+    async def scenario():
+        async with project.db.try_advisory_lock("maintenance", 1) as locked:
+            return locked
+
+    assert asyncio.run(scenario())
+
+
+def fake_lock(holders):
+    @contextlib.asynccontextmanager
+    async def try_advisory_lock(name, hold_seconds):
+        yield holders.pop(0)
+
+    return try_advisory_lock
+
+
+async def run_loop(task, runs: int) -> None:
+    loop = asyncio.create_task(task._run())
+    while task.runs + task.skipped_runs < runs:
+        await asyncio.sleep(0.001)
+    loop.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await loop
+
+
+def test_maintenance_runs_only_while_holding_the_lock(monkeypatch):
+    task = project.maintenance.MaintenanceTask(
+        interval=0.001,
+        batch_size=10,
+        batch_pause=0,
+        max_batches_per_run=1,
+        cli_log_retention_days=0,
+        api_log_retention_days=0,
+    )
+    ran = []
+
+    async def run_once():
+        ran.append(True)
+        task.runs += 1
+
+    monkeypatch.setattr(task, "run_once", run_once)
+    monkeypatch.setattr(
+        project.db, "try_advisory_lock", fake_lock([False, True, False, False])
+    )
+    asyncio.run(run_loop(task, 4))
+    assert len(ran) == 1
+    assert task.stats()["skipped_runs"] == 3
+
+
+def test_partition_ddl_runs_only_while_holding_the_lock(monkeypatch):
+    manager = project.partitions.PartitionManager(
+        tables={"CLILog": 0},
+        interval="day",
+        premake=1,
+        retention_action="drop",
+        check_interval=0.001,
+    )
+    calls = []
+
+    async def run_once():
+        calls.append("run_once")
+        manager.runs += 1
+
+    async def refresh():
+        calls.append("refresh")
+
+    monkeypatch.setattr(manager, "run_once", run_once)
+    monkeypatch.setattr(manager, "refresh", refresh)
+    monkeypatch.setattr(project.db, "try_advisory_lock", fake_lock([True, False]))
+    asyncio.run(run_loop(manager, 2))
+    assert calls == ["run_once", "refresh"]
+    assert manager.stats()["skipped_runs"] == 1
@@ -0,0 +1,159 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import prisma
+import prisma.models
+import project.password_hashing
+import project.server
+import pytest
+from project.bulkCreateUsers_service import bulkCreateUsers, parse_csv
+
+
+class FakeUsers:
+    """
+    Stands in for the User table: the find_many lookup and the raw multi-row INSERT ... ON CONFLICT DO NOTHING, which returns only the rows it inserted.
+    """
+
+    def __init__(self, existing: List[str]) -> None:
+        self.emails: Dict[str, int] = {email: i for i, email in enumerate(existing, 1)}
+        self.inserts: List[List[str]] = []
+        self.hashed: List[str] = []
+
+    async def find_many(self, where: Dict[str, Any]) -> List[Any]:
+        return [
+            SimpleNamespace(email=email)
+            for email in where["email"]["in"]
+            if email in self.emails
+        ]
+
+    async def query_raw(self, sql: str, *args: str) -> List[Dict[str, Any]]:
+        rows = [args[i : i + 3] for i in range(0, len(args), 3)]
+        self.inserts.append([email for email, _, _ in rows])
+        inserted = []
+        for email, password, role in rows:
+            if email not in self.emails:
+                self.emails[email] = len(self.emails) + 1
+                inserted.append({"id": self.emails[email], "email": email})
+        return inserted
+
+    async def hash_password(self, password: str) -> str:
+        self.hashed.append(password)
+        return f"hashed:{password}"
+
+
+@pytest.fixture
+def users(monkeypatch) -> FakeUsers:
+    fake = FakeUsers(existing=["taken@example.com"])
+    monkeypatch.setattr(prisma.models.User, "prisma", lambda: fake)
+    monkeypatch.setattr(prisma, "get_client", lambda: fake)
+    monkeypatch.setattr(project.password_hashing, "hash_password", fake.hash_password)
+    return fake
+
+
+def user(username: str, password: str = "pw", role: str = "User") -> Dict[str, str]:
+    return {"username": username, "password": password, "role": role}
+
+
+def test_duplicates_within_the_upload_and_existing_users(users):
+    rows = [
+        user("a@example.com", "pw-a"),
+        user("taken@example.com", "pw-taken"),
+        user("a@example.com", "pw-a2"),
+        user("b@example.com", "pw-b"),
+        {"username": "c@example.com", "password": "pw"},
+        # Repeats a username from the first chunk.
+        user("b@example.com", "pw-b2"),
+    ]
+    res = asyncio.run(bulkCreateUsers(rows, chunk_size=3))
+    assert [(r.index, r.username, r.status) for r in res.results] == [
+        (0, "a@example.com", "created"),
+        (1, "taken@example.com", "duplicate"),
+        (2, "a@example.com", "duplicate"),
+        (3, "b@example.com", "created"),
+        (4, "c@example.com", "invalid"),
+        (5, "b@example.com", "duplicate"),
+    ]
+    assert res.created == 2
+    # Neither existing nor repeated usernames cost a bcrypt hash or an INSERT row.
+    assert users.hashed == ["pw-a", "pw-b"]
+    assert users.inserts == [["a@example.com"], ["b@example.com"]]
+
+
+def test_username_taken_concurrently_is_a_duplicate(users, monkeypatch):
+    # The lookup misses it, but by the INSERT another request has created it.
+    async def find_nothing(where):
+        return []
+
+    monkeypatch.setattr(users, "find_many", find_nothing)
+    res = asyncio.run(bulkCreateUsers([user("taken@example.com"), user("new@x.io")]))
+    assert [r.status for r in res.results] == ["duplicate", "created"]
+    assert res.created == 1
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_csv_records_spanning_lines_are_invalid_rows(users):
+    body = (
+        b"username,password,role\r\n"
+        b'a@example.com,"pw",User\r\n'
+        b'b@example.com,"first line\r\nsecond line\r\nthird",User\r\n'
+        b'c@example.com,"say ""hi""",Admin\r\n'
+    )
+    rows = parse_csv(stream(body[:40], body[40:90], body[90:]))
+    res = asyncio.run(bulkCreateUsers(rows))
+    assert [r.status for r in res.results] == ["created", "invalid", "created"]
+    assert users.hashed == ["pw", 'say "hi"']
+
+
+@pytest.fixture
+def upload(api, users, monkeypatch):
+    monkeypatch.setattr(project.server, "BULK_USER_CHUNK_SIZE", 2)
+    monkeypatch.setattr(project.server, "BULK_USER_MAX_ROWS", 3)
+
+    def post(body: bytes, content_type: str = "application/x-ndjson"):
+        return api(
+            "POST",
+            "/users/bulk/upload",
+            content=body,
+            headers={"content-type": content_type},
+        )
+
+    return post
+
+
+def ndjson(*rows: Dict[str, str]) -> bytes:
+    return b"".join(json.dumps(row).encode() + b"\n" for row in rows)
+
+
+def test_upload_past_max_rows_is_cut_off_with_413(upload, users):
+    response = upload(ndjson(*(user(f"u{i}@example.com") for i in range(5))))
+    assert response.status_code == 413
+    assert response.json() == {"error": "Request exceeds 3 users.", "created": 2}
+    # The first chunk was inserted; the row past the limit was never processed.
+    assert users.inserts == [["u0@example.com", "u1@example.com"]]
+
+
+def test_upload_of_max_rows_is_accepted(upload):
+    response = upload(ndjson(*(user(f"u{i}@example.com") for i in range(3))))
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+
+
+def test_upload_that_is_not_utf8_is_rejected_with_400(upload, users):
+    body = ndjson(user("a@example.com"), user("b@example.com"))
+    body += b'{"username": "\xff@example.com", "password": "pw", "role": "User"}\n'
+    response = upload(body)
+    assert response.status_code == 400
+    assert response.json() == {
+        "error": "Upload is not valid UTF-8 (after row 2).",
+        "created": 2,
+    }
+
+
+def test_upload_with_another_content_type_is_rejected(upload):
+    assert upload(b"[]", content_type="application/json").status_code == 415
@@ -0,0 +1,126 @@
+import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import prisma.enums
+import prisma.models
+import pytest
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2026, 1, 1, tzinfo=UTC)
+
+
+class FakeUsers:
+    """
+    Stands in for the User table, loading each user's sessions as a Prisma include does: filtered by id, newest first, limited to take.
+    """
+
+    def __init__(self) -> None:
+        self.users: Dict[int, Any] = {}
+        self.sessions: List[Any] = []
+        self.session_loads: List[int] = []
+
+    def add_user(self, user_id: int, sessions: int, deleted: bool = False) -> None:
+        self.users[user_id] = SimpleNamespace(
+            id=user_id,
+            email=f"user{user_id}@example.com",
+            role=prisma.enums.Role.User,
+            version=1,
+            deletedAt=START if deleted else None,
+        )
+        for _ in range(sessions):
+            session_id = len(self.sessions) + 1
+            self.sessions.append(
+                SimpleNamespace(
+                    id=session_id,
+                    userId=user_id,
+                    createdAt=START + datetime.timedelta(minutes=session_id),
+                    expiresAt=None,
+                )
+            )
+
+    def _load(self, user: Any, include: Optional[Dict[str, Any]]) -> Any:
+        if not include:
+            return SimpleNamespace(**vars(user), sessions=None)
+        spec = include["sessions"]
+        assert spec["order_by"] == {"id": "desc"}
+        before = spec["where"].get("id", {}).get("lt")
+        sessions = sorted(
+            (
+                s
+                for s in self.sessions
+                if s.userId == user.id and (before is None or s.id < before)
+            ),
+            key=lambda s: s.id,
+            reverse=True,
+        )[: spec["take"]]
+        self.session_loads.append(len(sessions))
+        return SimpleNamespace(**vars(user), sessions=sessions)
+
+    async def find_many(self, where, include=None):
+        return [
+            self._load(self.users[user_id], include)
+            for user_id in where["id"]["in"]
+            if user_id in self.users and self.users[user_id].deletedAt is None
+        ]
+
+    async def find_unique(self, where, include=None):
+        user = self.users.get(where["id"])
+        return self._load(user, include) if user is not None else None
+
+
+@pytest.fixture
+def users(monkeypatch) -> FakeUsers:
+    fake = FakeUsers()
+    monkeypatch.setattr(prisma.models.User, "prisma", lambda client=None: fake)
+    return fake
+
+
+def session_ids(user: Dict[str, Any]) -> List[int]:
+    return [session["id"] for session in user["sessions"]]
+
+
+def test_lookup_pages_continue_through_get_user(api, users):
+    users.add_user(1, sessions=5)
+    users.add_user(2, sessions=1)
+    users.add_user(3, sessions=2, deleted=True)
+    response = api("POST", "/users/lookup?session_limit=2", json=[2, 1, 99, 3, 1])
+    assert response.status_code == 200
+    body = response.json()
+    assert [user["id"] for user in body["users"]] == [2, 1]
+    assert body["missing"] == [99, 3]
+    single, paged = body["users"]
+    assert session_ids(single) == [6] and single["nextSessionCursor"] is None
+    assert session_ids(paged) == [5, 4]
+    # Only session_limit + 1 sessions are loaded per user, however many they have.
+    assert max(users.session_loads) == 3
+
+    pages = [session_ids(paged)]
+    cursor = paged["nextSessionCursor"]
+    while cursor is not None:
+        response = api(
+            "GET",
+            "/users/1",
+            params={"session_limit": 2, "session_cursor": cursor},
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert page["email"] == "user1@example.com"
+        pages.append(session_ids(page))
+        cursor = page.get("nextSessionCursor")
+    assert pages == [[5, 4], [3, 2], [1]]
+
+
+def test_lookup_sessions_are_shaped_as_on_get_user(api, users):
+    users.add_user(1, sessions=1)
+    looked_up = api("POST", "/users/lookup", json=[1]).json()["users"][0]
+    assert looked_up == api("GET", "/users/1").json()
+    assert looked_up["sessions"] == [
+        {"id": 1, "createdAt": "2026-01-01T00:01:00Z", "expiresAt": None}
+    ]
+
+
+@pytest.mark.parametrize("session_limit", [0, 1001])
+def test_lookup_session_limit_is_bounded(api, users, session_limit):
+    response = api("POST", f"/users/lookup?session_limit={session_limit}", json=[1])
+    assert response.status_code == 422
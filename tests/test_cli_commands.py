@@ -0,0 +1,241 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import prisma.enums
+import prisma.models
+import project.auth_tokens
+import project.cli_commands
+import project.log_writer
+import pytest
+from project.cli_commands import (
+    UNRECOGNIZED_MESSAGE,
+    CommandContext,
+    CommandLogging,
+    CommandRegistry,
+)
+from project.processHelloWorldCommand_service import processHelloWorldCommand
+from project.processHelloWorldCommandBatch_service import (
+    processHelloWorldCommandBatch,
+)
+from project.session_cache import CachedSession
+from pydantic import BaseModel
+
+USER = CommandContext(userId=7, role=prisma.enums.Role.User)
+ADMIN = CommandContext(userId=1, role=prisma.enums.Role.Admin)
+
+
+class GreetArgs(BaseModel):
+    name: str
+    times: int = 1
+    shout: bool = False
+
+
+def make_registry() -> CommandRegistry:
+    registry = CommandRegistry()
+
+    @registry.command("greet", args=GreetArgs, description="Greet someone.")
+    def greet(context, args):
+        greeting = " ".join([f"Hello {args.name}"] * args.times)
+        return greeting.upper() if args.shout else greeting
+
+    @registry.command("whoami")
+    async def whoami(context, args):
+        return f"user {context.userId}"
+
+    @registry.command("purge", role=prisma.enums.Role.Admin)
+    def purge(context, args):
+        return "purged"
+
+    @registry.command("crash")
+    def crash(context, args):
+        raise RuntimeError("boom")
+
+    return registry
+
+
+def run(registry: CommandRegistry, line: str, context: CommandContext = USER) -> str:
+    return asyncio.run(registry.execute(registry.resolve(line), context))
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("greet Ada", "Hello Ada"),
+        ("greet Ada 2", "Hello Ada Hello Ada"),
+        ("greet --times=2 Ada", "Hello Ada Hello Ada"),
+        ("greet --times 2 --name Ada --shout", "HELLO ADA HELLO ADA"),
+        ("greet 'Ada Lovelace'", "Hello Ada Lovelace"),
+        ("whoami", "user 7"),
+    ],
+)
+def test_arguments_are_parsed_positionally_and_by_name(line, expected):
+    assert run(make_registry(), line) == expected
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("greet", "Invalid arguments for 'greet': name: Field required"),
+        ("greet Ada lots", "Invalid arguments for 'greet': times: "),
+        (
+            "greet Ada 1 true x",
+            "Invalid arguments for 'greet': unexpected argument 'x'",
+        ),
+        ("greet --loud Ada", "Invalid arguments for 'greet': unknown option '--loud'"),
+        ("greet --name", "Invalid arguments for 'greet': option '--name' needs a"),
+        ("greet 'Ada", "Invalid command: No closing quotation"),
+    ],
+)
+def test_arguments_that_do_not_match_the_schema_are_invalid(line, expected):
+    registry = make_registry()
+    assert run(registry, line).startswith(expected)
+    assert registry.executed == 0
+
+
+@pytest.mark.parametrize("line", ["bogus", "", "   ", "whoami extra", "Whoami"])
+def test_unknown_lines_are_not_recognized(line):
+    registry = make_registry()
+    assert run(registry, line) == UNRECOGNIZED_MESSAGE
+    assert registry.stats()["unknown"] == 1
+
+
+def test_hello_with_arguments_is_not_recognized():
+    registry = project.cli_commands.registry
+    assert run(registry, "hello") == "Hello World"
+    assert run(registry, "hello extra") == UNRECOGNIZED_MESSAGE
+
+
+def test_commands_cannot_be_registered_twice():
+    registry = make_registry()
+    with pytest.raises(ValueError):
+        registry.register("greet", lambda context, args: "again")
+
+
+def test_roles_restrict_commands_except_for_admins():
+    registry = make_registry()
+    assert run(registry, "purge", USER) == "Permission denied."
+    assert run(registry, "purge", ADMIN) == "purged"
+    assert run(registry, "whoami", ADMIN) == "user 1"
+    assert registry.stats()["denied"] == 1
+
+
+def test_help_lists_only_the_callers_commands(monkeypatch):
+    registry = make_registry()
+    help_command = project.cli_commands.registry.get("help")
+    registry.register("help", help_command.handler, args=help_command.args_model)
+    monkeypatch.setattr(project.cli_commands, "registry", registry)
+    assert "purge" not in run(registry, "help", USER)
+    assert "purge" in run(registry, "help", ADMIN)
+    assert run(registry, "help purge", USER) == UNRECOGNIZED_MESSAGE
+    assert run(registry, "help greet", USER) == (
+        "greet <name> [times] [--shout]: Greet someone."
+    )
+
+
+def test_failing_handler_is_reported_not_raised():
+    registry = make_registry()
+    assert run(registry, "crash") == "Command failed."
+    assert registry.stats()["failed"] == 1
+
+
+class FakeLogWriter:
+    def __init__(self) -> None:
+        self.cli_logs: List[Dict[str, Any]] = []
+
+    async def enqueue_cli_log(self, **row: Any) -> None:
+        self.cli_logs.append(row)
+
+
+@pytest.fixture
+def logged(monkeypatch) -> FakeLogWriter:
+    """
+    A caller with a valid token, a registry with one command per logging policy, and the CLILog rows handed to the log writer.
+    """
+
+    async def resolve_token(token):
+        if token != "token-7":
+            return None
+        return CachedSession(userId=7, role="User", expiresAt=time.time() + 60)
+
+    registry = CommandRegistry()
+    for policy in CommandLogging:
+        registry.register(policy.value, lambda context, args: "done", logging=policy)
+    writer = FakeLogWriter()
+    monkeypatch.setattr(project.auth_tokens, "resolve_token", resolve_token)
+    monkeypatch.setattr(project.cli_commands, "registry", registry)
+    monkeypatch.setattr(project.log_writer, "log_writer", writer)
+    return writer
+
+
+@pytest.mark.parametrize(
+    "command, logged_rows",
+    [("record", 1), ("defer", 1), ("skip", 0), ("bogus", 1), ("record x", 1)],
+)
+def test_single_command_logging_policies(logged, command, logged_rows):
+    asyncio.run(processHelloWorldCommand("token-7", command))
+    assert [row["command"] for row in logged.cli_logs] == [command] * logged_rows
+    assert all(row["userId"] == 7 for row in logged.cli_logs)
+
+
+def test_invalid_token_is_rejected_without_logging(logged):
+    response = asyncio.run(processHelloWorldCommand("token-8", "record"))
+    assert response.message == "Invalid or expired token."
+    assert logged.cli_logs == []
+
+
+class FakeCLILogs:
+    def __init__(self) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+
+    async def create_many(self, data: List[Dict[str, Any]]) -> int:
+        self.batches.append(data)
+        return len(data)
+
+
+@pytest.fixture
+def cli_logs(monkeypatch, logged) -> FakeCLILogs:
+    fake = FakeCLILogs()
+    monkeypatch.setattr(prisma.models.CLILog, "prisma", lambda: fake)
+    return fake
+
+
+def test_batch_records_with_one_insert_and_defers_the_rest(logged, cli_logs):
+    commands = ["record", "defer", "skip", "bogus", "record", "defer x", "defer"]
+    response = asyncio.run(processHelloWorldCommandBatch("token-7", commands))
+    assert [result.message for result in response.results] == [
+        "done",
+        "done",
+        "done",
+        UNRECOGNIZED_MESSAGE,
+        "done",
+        UNRECOGNIZED_MESSAGE,
+        "done",
+    ]
+    # Recorded and unrecognized commands share one bulk insert, in submission order.
+    assert len(cli_logs.batches) == 1
+    assert [row["command"] for row in cli_logs.batches[0]] == [
+        "record",
+        "bogus",
+        "record",
+        "defer x",
+    ]
+    assert [row["command"] for row in logged.cli_logs] == ["defer", "defer"]
+    rows = cli_logs.batches[0] + logged.cli_logs
+    assert {row["userId"] for row in rows} == {7}
+    assert len({row["executedAt"] for row in rows}) == 1
+
+
+def test_batch_without_recorded_commands_skips_the_insert(logged, cli_logs):
+    response = asyncio.run(processHelloWorldCommandBatch("token-7", ["skip", "defer"]))
+    assert len(response.results) == 2
+    assert cli_logs.batches == []
+    assert [row["command"] for row in logged.cli_logs] == ["defer"]
+
+
+def test_batch_with_an_invalid_token_answers_every_command(logged, cli_logs):
+    response = asyncio.run(processHelloWorldCommandBatch("token-8", ["a", "b"]))
+    assert [result.message for result in response.results] == [
+        "Invalid or expired token."
+    ] * 2
+    assert cli_logs.batches == [] and logged.cli_logs == []
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import zlib
+from typing import List
+
+import pytest
+from project.compression import (
+    CompressionMiddleware,
+    Encoder,
+    GzipEncoder,
+    ResponseCompressor,
+    StreamCompressor,
+    negotiate,
+)
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+class NamedEncoder(Encoder):
+    """
+    An encoder that only has a name, for negotiation tests.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(level=0)
+        self.name = name
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def stream(self) -> StreamCompressor:
+        raise AssertionError("not streamed in these tests")
+
+
+ZSTD, BR, GZIP = NamedEncoder("zstd"), NamedEncoder("br"), NamedEncoder("gzip")
+SERVER_ORDER = [ZSTD, BR, GZIP]
+
+
+def test_encoders_must_implement_compression():
+    with pytest.raises(TypeError):
+        Encoder(level=1)
+    with pytest.raises(TypeError):
+        StreamCompressor()
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip;q=0.8, br", BR),
+        ("gzip, br, zstd", ZSTD),
+        ("GZIP; q=0.5", GZIP),
+        ("gzip;q=0, br;q=0.1", BR),
+        ("*", ZSTD),
+        ("*;q=0.5, gzip", GZIP),
+        ("zstd;q=0, *", BR),
+        ("identity;q=0, gzip", GZIP),
+        ("identity;q=0, *", ZSTD),
+        ("identity", None),
+        ("*;q=0", None),
+        ("gzip;q=oops", None),
+        ("", None),
+    ],
+)
+def test_negotiation_follows_q_values_then_server_preference(accept_encoding, expected):
+    assert negotiate(accept_encoding, SERVER_ORDER) is expected
+
+
+BIG = {"rows": [{"id": i, "name": f"user-{i}"} for i in range(200)]}
+LINES = [json.dumps({"id": i, "padding": "x" * 40}) + "\n" for i in range(100)]
+
+
+def make_app(minimum_size: int = 1024, stream_flush_size: int = 1024):
+    async def big(request):
+        return JSONResponse(BIG, headers={"ETag": '"v1"'})
+
+    async def small(request):
+        return JSONResponse({"ok": True}, headers={"ETag": '"v2"'})
+
+    async def image(request):
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    async def not_modified(request):
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+
+    async def export(request):
+        async def lines():
+            for line in LINES:
+                yield line
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    app = Starlette(
+        routes=[
+            Route("/big", big),
+            Route("/small", small),
+            Route("/image", image),
+            Route("/not-modified", not_modified),
+            Route("/export", export),
+        ]
+    )
+    compressor = ResponseCompressor(
+        [GzipEncoder(6)], minimum_size=minimum_size, stream_flush_size=stream_flush_size
+    )
+    return CompressionMiddleware(app, compressor), compressor
+
+
+def request(app, path: str, accept_encoding: str = "gzip"):
+    """
+    Calls the app directly and returns the response start message and every body message, so the individual streamed chunks stay visible.
+    """
+    messages: List[dict] = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # The client stays connected; streaming responses listen for a disconnect.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "client": ("10.0.0.1", 5000),
+        "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    start, body = messages[0], messages[1:]
+    return start, {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+def gunzip(data: bytes) -> bytes:
+    return zlib.decompress(data, 31)
+
+
+def test_large_response_is_compressed_with_a_weak_etag():
+    app, compressor = make_app()
+    start, headers, body = request(app, "/big")
+    compressed = body[0]["body"]
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == 'W/"v1"'
+    assert headers["content-length"] == str(len(compressed))
+    assert json.loads(gunzip(compressed)) == BIG
+    assert compressor.compressed == 1
+
+
+def test_small_responses_are_not_compressed():
+    app, compressor = make_app(minimum_size=1024)
+    start, headers, body = request(app, "/small")
+    assert "content-encoding" not in headers
+    assert headers["etag"] == '"v2"'
+    assert json.loads(body[0]["body"]) == {"ok": True}
+    assert compressor.skipped == 1
+
+
+@pytest.mark.parametrize("path", ["/image", "/not-modified"])
+def test_other_content_and_bodiless_responses_pass_through(path):
+    app, compressor = make_app(minimum_size=0)
+    start, headers, body = request(app, path)
+    assert "content-encoding" not in headers
+    assert compressor.skipped == 1
+
+
+def test_identity_is_sent_when_no_coding_is_accepted():
+    app, compressor = make_app()
+    start, headers, body = request(app, "/big", accept_encoding="br;q=1, gzip;q=0")
+    assert "content-encoding" not in headers
+    assert headers["etag"] == '"v1"'
+    assert json.loads(body[0]["body"]) == BIG
+
+
+def test_streamed_response_is_flushed_in_decodable_blocks():
+    app, compressor = make_app(stream_flush_size=1024)
+    start, headers, body = request(app, "/export")
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    chunks = [message["body"] for message in body]
+    total = sum(len(line) for line in LINES)
+    # One flush per stream_flush_size bytes of input, not one per line, plus the final block.
+    assert len(chunks) == total // 1024 + 1
+    assert [message.get("more_body", False) for message in body][-2:] == [True, False]
+    decoder = zlib.decompressobj(31)
+    received = b""
+    for chunk in chunks[:-1]:
+        # Each flush is decodable on arrival, before the stream is finished.
+        received += decoder.decompress(chunk)
+        assert received and received.endswith(b"\n")
+    received += decoder.decompress(chunks[-1]) + decoder.flush()
+    assert received.decode() == "".join(LINES)
+    assert compressor.streamed == 1
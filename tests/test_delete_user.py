@@ -0,0 +1,164 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import prisma
+import prisma.models
+import project.auth_tokens
+import project.deleteUser_service
+import project.maintenance
+import pytest
+from project.deleteUser_service import deleteUser, getUserDeletionStatus
+
+
+class FakeDatabase:
+    """
+    Stands in for the User and Session tables and the bounded log count. The DELETE of a user cascades to their sessions and log rows, as the schema's foreign keys do.
+    """
+
+    def __init__(self) -> None:
+        self.users: Dict[int, Any] = {}
+        self.sessions: List[Any] = []
+        self.log_rows: Dict[int, int] = {}
+        self.count_limits: List[int] = []
+
+    def add_user(self, user_id: int, sessions: int, log_rows: int) -> None:
+        self.users[user_id] = SimpleNamespace(id=user_id, deletedAt=None)
+        self.log_rows[user_id] = log_rows
+        for _ in range(sessions):
+            self.sessions.append(
+                SimpleNamespace(
+                    id=len(self.sessions) + 1, userId=user_id, expiresAt=None
+                )
+            )
+
+    async def query_first(self, sql: str, user_id: int, limit: int) -> Dict[str, int]:
+        self.count_limits.append(limit)
+        # Each of the two log tables is counted up to the limit; the fake splits evenly.
+        rows = self.log_rows.get(user_id, 0)
+        return {"rows": min(rows // 2, limit) + min(rows - rows // 2, limit)}
+
+    def user_actions(self) -> Any:
+        async def update_many(where, data):
+            user = self.users.get(where["id"])
+            if user is None or user.deletedAt is not None:
+                return 0
+            user.deletedAt = data["deletedAt"]
+            return 1
+
+        async def delete_many(where):
+            if self.users.pop(where["id"], None) is None:
+                return 0
+            self.sessions = [s for s in self.sessions if s.userId != where["id"]]
+            self.log_rows.pop(where["id"], None)
+            return 1
+
+        async def find_unique(where):
+            return self.users.get(where["id"])
+
+        return SimpleNamespace(
+            update_many=update_many, delete_many=delete_many, find_unique=find_unique
+        )
+
+    def session_actions(self) -> Any:
+        async def find_many(where):
+            return [s for s in self.sessions if s.userId == where["userId"]]
+
+        async def delete_many(where):
+            before = len(self.sessions)
+            self.sessions = [s for s in self.sessions if s.userId != where["userId"]]
+            return before - len(self.sessions)
+
+        return SimpleNamespace(find_many=find_many, delete_many=delete_many)
+
+
+@pytest.fixture
+def db(monkeypatch) -> FakeDatabase:
+    fake = FakeDatabase()
+    users, sessions = fake.user_actions(), fake.session_actions()
+    monkeypatch.setattr(prisma, "get_client", lambda: fake)
+    monkeypatch.setattr(prisma.models.User, "prisma", lambda: users)
+    monkeypatch.setattr(prisma.models.Session, "prisma", lambda: sessions)
+    monkeypatch.setattr(
+        project.deleteUser_service, "DELETE_USER_BACKGROUND_THRESHOLD", 100
+    )
+    return fake
+
+
+@pytest.fixture
+def revoked(monkeypatch) -> List[int]:
+    session_ids: List[int] = []
+
+    async def revoke_sessions(sessions):
+        session_ids.extend(session_id for session_id, expires_at in sessions)
+
+    monkeypatch.setattr(project.auth_tokens, "revoke_sessions", revoke_sessions)
+    return session_ids
+
+
+@pytest.fixture
+def purges(monkeypatch) -> List[int]:
+    scheduled: List[int] = []
+    task = SimpleNamespace(schedule_user_purge=scheduled.append)
+    monkeypatch.setattr(project.maintenance, "maintenance_task", task)
+    return scheduled
+
+
+def test_small_account_is_deleted_with_one_cascading_delete(db, revoked, purges):
+    db.add_user(1, sessions=2, log_rows=100)
+    res = asyncio.run(deleteUser(1))
+    assert (res.deleted, res.pending) == (True, False)
+    assert 1 not in db.users and db.sessions == [] and 1 not in db.log_rows
+    assert revoked == [1, 2]
+    assert purges == []
+    # The count stops one row past the threshold instead of counting every row.
+    assert db.count_limits == [101]
+    assert asyncio.run(getUserDeletionStatus(1)).status == "deleted"
+
+
+def test_large_account_is_tombstoned_and_purged_in_the_background(db, revoked, purges):
+    db.add_user(1, sessions=2, log_rows=10_000)
+    db.add_user(2, sessions=1, log_rows=0)
+    res = asyncio.run(deleteUser(1))
+    assert (res.deleted, res.pending) == (False, True)
+    assert isinstance(db.users[1].deletedAt, datetime.datetime)
+    # Sessions go at once so the user cannot log in; their logs wait for the purge.
+    assert [s.userId for s in db.sessions] == [2]
+    assert db.log_rows[1] == 10_000
+    assert revoked == [1, 2]
+    assert purges == [1]
+    status = asyncio.run(getUserDeletionStatus(1))
+    assert status.status == "pending" and status.deletedAt == db.users[1].deletedAt
+    assert asyncio.run(getUserDeletionStatus(2)).status == "active"
+
+
+@pytest.mark.parametrize(
+    "log_rows, background, pending",
+    [(0, True, True), (10_000, False, False), (101, None, True), (100, None, False)],
+)
+def test_background_is_chosen_by_size_unless_forced(
+    db, revoked, purges, log_rows, background, pending
+):
+    db.add_user(1, sessions=0, log_rows=log_rows)
+    res = asyncio.run(deleteUser(1, background))
+    assert res.pending is pending
+    assert purges == ([1] if pending else [])
+    # Forcing a choice skips sizing up the account.
+    assert db.count_limits == ([] if background is not None else [101])
+
+
+@pytest.mark.parametrize("background", [True, False, None])
+def test_missing_user_is_not_found(db, revoked, purges, background):
+    res = asyncio.run(deleteUser(5, background))
+    assert res == project.deleteUser_service.DeleteUserResponse(
+        message="prisma.models.User with ID 5 not found.", deleted=False
+    )
+    assert purges == []
+
+
+def test_deleting_a_tombstoned_user_again_is_not_found(db, revoked, purges):
+    db.add_user(1, sessions=0, log_rows=0)
+    asyncio.run(deleteUser(1, background=True))
+    assert asyncio.run(deleteUser(1, background=True)).deleted is False
+    assert purges == [1]
@@ -0,0 +1,162 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import prisma.models
+import project.server
+import pytest
+from project.exportAuditLogs_service import (
+    AuditLogFormat,
+    AuditLogKind,
+    exportAuditLogs,
+)
+
+UTC = datetime.timezone.utc
+T0 = datetime.datetime(2026, 3, 1, tzinfo=UTC)
+
+
+def matches(row: Any, where: Dict[str, Any]) -> bool:
+    for key, condition in where.items():
+        if key == "AND":
+            if not all(matches(row, part) for part in condition):
+                return False
+        elif key == "OR":
+            if not any(matches(row, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = getattr(row, key)
+            for op, bound in condition.items():
+                if not {
+                    "gt": value > bound,
+                    "gte": value >= bound,
+                    "lt": value < bound,
+                }[op]:
+                    return False
+        elif getattr(row, key) != condition:
+            return False
+    return True
+
+
+class FakeCLILogs:
+    """
+    Stands in for the CLILog table's find_many with the where, order and take the export uses.
+    """
+
+    def __init__(self) -> None:
+        self.rows: List[Any] = []
+        self.queries = 0
+
+    def add(self, user_id: int, minutes: int, command: str) -> None:
+        self.rows.append(
+            SimpleNamespace(
+                id=len(self.rows) + 1,
+                userId=user_id,
+                executedAt=T0 + datetime.timedelta(minutes=minutes),
+                command=command,
+            )
+        )
+
+    async def find_many(self, where, order, take):
+        assert order == [{"executedAt": "asc"}, {"id": "asc"}]
+        self.queries += 1
+        rows = [row for row in self.rows if matches(row, where)]
+        return sorted(rows, key=lambda row: (row.executedAt, row.id))[:take]
+
+
+@pytest.fixture
+def cli_logs(monkeypatch) -> FakeCLILogs:
+    fake = FakeCLILogs()
+    monkeypatch.setattr(prisma.models.CLILog, "prisma", lambda client=None: fake)
+    # Rows sharing a timestamp straddle page boundaries; ids are not in time order.
+    fake.add(1, 5, "late")
+    fake.add(1, 1, "a")
+    fake.add(2, 1, "other user")
+    fake.add(1, 1, "b")
+    fake.add(1, 1, "c")
+    fake.add(1, 3, "d")
+    return fake
+
+
+def export(**kwargs: Any) -> List[str]:
+    async def collect():
+        return [chunk async for chunk in exportAuditLogs(**kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_ndjson_export_streams_one_chunk_per_page(cli_logs):
+    chunks = export(
+        kind=AuditLogKind.cli,
+        userId=1,
+        start=None,
+        end=None,
+        format=AuditLogFormat.ndjson,
+        page_size=2,
+    )
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["command"] for row in rows] == ["a", "b", "c", "d", "late"]
+    assert rows[0] == {
+        "id": 2,
+        "userId": 1,
+        "time": "2026-03-01T00:01:00+00:00",
+        "command": "a",
+    }
+    # A short page ends the export without another query.
+    assert cli_logs.queries == 3
+
+
+def test_export_of_a_multiple_of_the_page_size_ends_on_an_empty_page(cli_logs):
+    chunks = export(
+        kind=AuditLogKind.cli,
+        userId=1,
+        start=None,
+        end=None,
+        format=AuditLogFormat.ndjson,
+        page_size=5,
+    )
+    assert len(chunks) == 1 and chunks[0].count("\n") == 5
+    assert cli_logs.queries == 2
+
+
+def test_export_is_restricted_to_the_time_range(cli_logs):
+    chunks = export(
+        kind=AuditLogKind.cli,
+        userId=1,
+        start=T0 + datetime.timedelta(minutes=1),
+        end=T0 + datetime.timedelta(minutes=5),
+        format=AuditLogFormat.ndjson,
+        page_size=1,
+    )
+    assert [json.loads(chunk)["command"] for chunk in chunks] == ["a", "b", "c", "d"]
+
+
+def test_csv_export_is_streamed_with_a_header(api, cli_logs, monkeypatch):
+    monkeypatch.setattr(project.server, "AUDIT_EXPORT_PAGE_SIZE", 2)
+    response = api("GET", "/users/1/logs/cli/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert (
+        response.headers["content-disposition"]
+        == 'attachment; filename="cli-logs-1.csv"'
+    )
+    assert "content-length" not in response.headers
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["command"] for row in rows] == ["a", "b", "c", "d", "late"]
+    assert rows[-1] == {
+        "id": "1",
+        "userId": "1",
+        "time": "2026-03-01T00:05:00+00:00",
+        "command": "late",
+    }
+
+
+def test_ndjson_export_of_a_user_without_logs_is_empty(api, cli_logs):
+    response = api("GET", "/users/3/logs/cli/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.content == b""
@@ -0,0 +1,93 @@
+import datetime
+from types import SimpleNamespace
+
+import prisma.enums
+import project.getUser_service
+import project.server
+import pytest
+
+UTC = datetime.timezone.utc
+
+USER = SimpleNamespace(
+    id=1,
+    email="zoë@example.com",
+    role=prisma.enums.Role.Admin,
+    version=3,
+    sessions=[
+        SimpleNamespace(
+            id=12,
+            createdAt=datetime.datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=UTC),
+            expiresAt=None,
+        ),
+        SimpleNamespace(
+            id=11,
+            createdAt=datetime.datetime(2026, 1, 1, tzinfo=UTC),
+            expiresAt=datetime.datetime(2026, 1, 8, tzinfo=UTC),
+        ),
+        SimpleNamespace(
+            id=10,
+            createdAt=datetime.datetime(2025, 12, 31, 23, 59, 59, tzinfo=UTC),
+            expiresAt=datetime.datetime(2026, 1, 7, tzinfo=UTC),
+        ),
+    ],
+)
+
+
+@pytest.fixture(params=["orjson", "pydantic-core"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(project.getUser_service, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        None,
+        "email,role,sessions,sessionCount,version",
+        "version",
+        "sessions",
+    ],
+)
+def test_fast_serialization_matches_the_validated_response(
+    api, monkeypatch, encoder, fields
+):
+    async def find_user_details(
+        userId, fields, session_limit, session_cursor, active_only
+    ):
+        return project.getUser_service.user_details_content(
+            USER, fields, session_limit, session_count=3
+        )
+
+    monkeypatch.setattr(
+        project.getUser_service, "_find_user_details", find_user_details
+    )
+    params = {"session_limit": 2}
+    if fields is not None:
+        params["fields"] = fields
+    monkeypatch.setattr(project.server, "FAST_SERIALIZATION", False)
+    validated = api("GET", "/users/1", params=params)
+    monkeypatch.setattr(project.server, "FAST_SERIALIZATION", True)
+    fast = api("GET", "/users/1", params=params)
+    assert validated.status_code == fast.status_code == 200
+    assert fast.content == validated.content
+    assert fast.headers["content-type"] == validated.headers["content-type"]
+
+
+def test_session_pages_link_through_the_cursor():
+    content = project.getUser_service.user_details_content(
+        USER, ("sessions",), session_limit=2
+    )
+    assert [session["id"] for session in content["sessions"]] == [12, 11]
+    assert content["nextSessionCursor"] == 11
+    last_page = SimpleNamespace(**{**vars(USER), "sessions": USER.sessions[2:]})
+    content = project.getUser_service.user_details_content(
+        last_page, ("sessions",), session_limit=2
+    )
+    assert [session["id"] for session in content["sessions"]] == [10]
+    assert content["nextSessionCursor"] is None
+    include = project.getUser_service.sessions_include(2, 11, active_only=False)
+    assert include["sessions"]["where"] == {"id": {"lt": 11}}
+    assert include["sessions"]["take"] == 3
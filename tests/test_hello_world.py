@@ -0,0 +1,40 @@
+import project.server
+import pytest
+from project.getHelloWorld_service import HELLO_WORLD_ETAG
+
+
+def test_fast_path_serves_the_validated_response(api, monkeypatch):
+    monkeypatch.setattr(project.server, "HELLO_WORLD_FAST_PATH", False)
+    validated = api("GET", "/hello-world")
+    monkeypatch.setattr(project.server, "HELLO_WORLD_FAST_PATH", True)
+    fast = api("GET", "/hello-world")
+    assert validated.status_code == fast.status_code == 200
+    assert fast.content == validated.content == b'{"message":"Hello World"}'
+    assert fast.headers["content-type"] == validated.headers["content-type"]
+    assert fast.headers["etag"] == HELLO_WORLD_ETAG
+    assert fast.headers["cache-control"] == "public, max-age=86400"
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [
+        HELLO_WORLD_ETAG,
+        # The weak form compressed responses carry, if a client echoes it back.
+        f"W/{HELLO_WORLD_ETAG}",
+        f'"stale", {HELLO_WORLD_ETAG}',
+        "*",
+    ],
+)
+def test_matching_etag_answers_304(api, if_none_match):
+    response = api("GET", "/hello-world", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == HELLO_WORLD_ETAG
+    assert response.headers["cache-control"] == "public, max-age=86400"
+
+
+@pytest.mark.parametrize("if_none_match", ['"stale"', "", HELLO_WORLD_ETAG[1:-1]])
+def test_other_etags_get_the_full_response(api, if_none_match):
+    response = api("GET", "/hello-world", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 200
+    assert response.json() == {"message": "Hello World"}
@@ -0,0 +1,142 @@
+import asyncio
+from typing import Optional
+
+import httpx
+import project.idempotency
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class Writes:
+    """
+    A route that counts the writes it applies, and can be held mid-request to test retries that arrive while the original is running.
+    """
+
+    def __init__(self) -> None:
+        self.applied = 0
+        self.status = 200
+        self.started = asyncio.Event()
+        self.release: Optional[asyncio.Event] = None
+
+    async def handle(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        self.applied += 1
+        self.started.set()
+        if self.release is not None:
+            await self.release.wait()
+        return JSONResponse(
+            {"write": self.applied, "name": body["name"]}, status_code=self.status
+        )
+
+
+def make_app(writes: Writes) -> project.idempotency.IdempotencyMiddleware:
+    cache = project.idempotency.IdempotencyCache(
+        enabled=True, ttl=60, max_bytes=1 << 20, max_response_bytes=1 << 16
+    )
+    return project.idempotency.IdempotencyMiddleware(
+        Starlette(routes=[Route("/users", writes.handle, methods=["POST"])]), cache
+    )
+
+
+def client(app, address: str = "10.0.0.1") -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, client=(address, 5000))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def post(
+    http: httpx.AsyncClient, name: str, key: str = "key-1", **params
+) -> httpx.Response:
+    return await http.post(
+        "/users",
+        params=params,
+        json={"name": name},
+        headers={"Idempotency-Key": key},
+    )
+
+
+def test_retry_replays_the_original_response():
+    async def scenario():
+        writes = Writes()
+        async with client(make_app(writes)) as http:
+            first = await post(http, "ada")
+            retry = await post(http, "ada")
+        assert writes.applied == 1
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json() == {"write": 1, "name": "ada"}
+        assert "idempotent-replayed" not in first.headers
+        assert retry.headers["idempotent-replayed"] == "true"
+
+    asyncio.run(scenario())
+
+
+def test_reusing_a_key_for_a_different_request_answers_422():
+    async def scenario():
+        writes = Writes()
+        app = make_app(writes)
+        async with client(app) as http:
+            await post(http, "ada")
+            other_body = await post(http, "grace")
+            other_query = await post(http, "ada", role="Admin")
+        assert other_body.status_code == 422
+        assert other_query.status_code == 422
+        assert writes.applied == 1
+        assert app.cache.mismatched == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_retry_waits_for_the_original():
+    async def scenario():
+        writes = Writes()
+        writes.release = asyncio.Event()
+        app = make_app(writes)
+        async with client(app) as http:
+            original = asyncio.create_task(post(http, "ada"))
+            await writes.started.wait()
+            retry = asyncio.create_task(post(http, "ada"))
+            while app.cache.waited == 0:
+                await asyncio.sleep(0.001)
+            assert not retry.done()
+            writes.release.set()
+            first, second = await original, await retry
+        assert writes.applied == 1
+        assert second.json() == first.json()
+        assert second.headers["idempotent-replayed"] == "true"
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_are_not_stored():
+    async def scenario():
+        writes = Writes()
+        writes.status = 503
+        async with client(make_app(writes)) as http:
+            await post(http, "ada")
+            writes.status = 200
+            retry = await post(http, "ada")
+        assert writes.applied == 2
+        assert retry.status_code == 200
+        assert "idempotent-replayed" not in retry.headers
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_scoped_to_the_caller():
+    async def scenario():
+        writes = Writes()
+        app = make_app(writes)
+        async with client(app, "10.0.0.1") as one, client(app, "10.0.0.2") as two:
+            await post(one, "ada")
+            from_other_address = await post(two, "ada")
+            await post(one, "ada", token="token-1")
+            with_other_token = await post(one, "ada", token="token-2")
+            replayed = await post(one, "ada", token="token-1")
+        assert writes.applied == 4
+        assert "idempotent-replayed" not in from_other_address.headers
+        assert "idempotent-replayed" not in with_other_token.headers
+        assert replayed.headers["idempotent-replayed"] == "true"
+        assert replayed.json() == {"write": 3, "name": "ada"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,124 @@
+import asyncio
+from typing import Any, Dict, List
+
+import prisma.errors
+import project.log_writer
+import pytest
+
+
+def engine_error(
+    code: str, error: type = prisma.errors.DataError
+) -> prisma.errors.DataError:
+    return error({"user_facing_error": {"error_code": code, "message": code}})
+
+
+class FakeActions:
+    """
+    Stands in for a model's Prisma actions. Raises the queued errors, one per call, before writing, and rejects rows of the users in bad_users the way a foreign key would.
+    """
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+        self.errors: List[Exception] = []
+        self.bad_users = set()
+        self.create_many_calls = 0
+        self.create_calls = 0
+
+    async def create_many(self, data: List[Dict[str, Any]]) -> int:
+        self.create_many_calls += 1
+        self._raise_queued()
+        if any(row["userId"] in self.bad_users for row in data):
+            raise engine_error("P2003", prisma.errors.ForeignKeyViolationError)
+        self.rows.extend(data)
+        return len(data)
+
+    async def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        self.create_calls += 1
+        self._raise_queued()
+        if data["userId"] in self.bad_users:
+            raise engine_error("P2003", prisma.errors.ForeignKeyViolationError)
+        self.rows.append(data)
+        return data
+
+    def _raise_queued(self) -> None:
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+@pytest.fixture
+def actions(monkeypatch) -> FakeActions:
+    fake = FakeActions()
+    monkeypatch.setattr(project.log_writer, "_actions", lambda model: fake)
+    return fake
+
+
+def make_writer(retry_max: float = 0.05) -> project.log_writer.LogWriter:
+    return project.log_writer.LogWriter(
+        max_queue_size=100,
+        batch_size=10,
+        flush_interval=0.01,
+        retry_initial=0.001,
+        retry_max=retry_max,
+    )
+
+
+async def write(writer: project.log_writer.LogWriter, user_ids: List[int]) -> None:
+    await writer.start()
+    for user_id in user_ids:
+        await writer.enqueue_cli_log(user_id, "hello", "2026-01-01T00:00:00Z")
+    await writer.stop()
+
+
+@pytest.mark.parametrize("code", ["P1001", "P1008", "P2024"])
+def test_unreachable_database_retries_the_whole_batch(actions, code):
+    actions.errors = [engine_error(code), engine_error(code)]
+    writer = make_writer()
+    asyncio.run(write(writer, [1, 2, 3]))
+    assert [row["userId"] for row in actions.rows] == [1, 2, 3]
+    assert actions.create_calls == 0
+    assert writer.retries == 2
+    assert writer.written == 3
+    assert writer.failed == 0
+
+
+def test_batch_rejected_for_its_data_is_written_row_by_row(actions):
+    actions.bad_users = {2}
+    writer = make_writer()
+    asyncio.run(write(writer, [1, 2, 3]))
+    assert [row["userId"] for row in actions.rows] == [1, 3]
+    assert actions.create_calls == 3
+    assert writer.written == 2
+    assert writer.failed == 1
+    assert writer.retries == 0
+
+
+def test_outage_during_row_by_row_writes_keeps_the_remaining_rows(actions):
+    # The batch is rejected for row 2, then the database drops while row 3 is written.
+    actions.bad_users = {2}
+    writer = make_writer()
+
+    async def scenario():
+        original_create = actions.create
+
+        async def create(data: Dict[str, Any]) -> Dict[str, Any]:
+            if data["userId"] == 3 and writer.retries == 0:
+                raise engine_error("P1001")
+            return await original_create(data)
+
+        actions.create = create
+        await write(writer, [1, 2, 3])
+
+    asyncio.run(scenario())
+    assert [row["userId"] for row in actions.rows] == [1, 3]
+    assert writer.written == 2
+    assert writer.failed == 1
+    assert writer.retries == 1
+
+
+def test_batch_is_dropped_at_shutdown_once_retry_max_has_passed(actions):
+    actions.errors = [engine_error("P1001")] * 100
+    writer = make_writer(retry_max=0.01)
+    asyncio.run(write(writer, [1, 2]))
+    assert actions.rows == []
+    assert writer.failed == 2
+    assert writer.written == 0
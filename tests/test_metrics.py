@@ -0,0 +1,113 @@
+import asyncio
+import re
+from typing import Dict, List, Tuple
+
+import httpx
+import project.metrics
+import pytest
+from fastapi import FastAPI
+from project.metrics import MetricsMiddleware, MetricsRegistry, TimedRoute
+
+
+def samples(text: str) -> Dict[Tuple[str, str], float]:
+    """
+    Parses Prometheus text exposition into {(name, labels): value}.
+    """
+    parsed = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            name, _, labels = series.partition("{")
+            parsed[(name, labels.rstrip("}"))] = float(value)
+    return parsed
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.inc("requests_total", route="/a", status="200")
+    registry.inc("requests_total", 2, route="/a", status="200")
+    registry.observe("duration_seconds", 0.05, route='/say "hi"')
+    registry.observe("duration_seconds", 0.5, route='/say "hi"')
+    registry.observe("duration_seconds", 5, route='/say "hi"')
+    registry.register_collector(
+        project.metrics.stats_collector("cache", lambda: {"size": 3, "name": "lru"})
+    )
+    assert registry.render().splitlines() == [
+        "# TYPE requests_total counter",
+        'requests_total{route="/a",status="200"} 3',
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{route="/say \\"hi\\"",le="0.1"} 1',
+        'duration_seconds_bucket{route="/say \\"hi\\"",le="1.0"} 2',
+        'duration_seconds_bucket{route="/say \\"hi\\"",le="+Inf"} 3',
+        'duration_seconds_sum{route="/say \\"hi\\""} 5.55',
+        'duration_seconds_count{route="/say \\"hi\\""} 3',
+        "# TYPE cache_size gauge",
+        "cache_size 3.0",
+    ]
+
+
+@pytest.fixture
+def registry(monkeypatch) -> MetricsRegistry:
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(project.metrics, "registry", fresh)
+    return fresh
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = TimedRoute
+
+    @app.get("/items/{itemId}")
+    async def get_item(itemId: int) -> Dict[str, List[int]]:
+        await asyncio.sleep(0.02)
+        return {"values": list(range(itemId))}
+
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def get(app, *paths: str) -> List[httpx.Response]:
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return [await c.get(path) for path in paths]
+
+    return asyncio.run(scenario())
+
+
+def test_timed_route_splits_endpoint_from_validation_and_serialization(registry):
+    responses = get(make_app(), "/items/1", "/items/2", "/items/x", "/missing")
+    assert [r.status_code for r in responses] == [200, 200, 422, 404]
+    exposed = samples(registry.render())
+    # Requests are labelled by route template, so /items/1 and /items/2 share a series.
+    requests = 'method="GET",route="/items/{itemId}"'
+    assert exposed[("http_requests_total", requests + ',status="200"')] == 2
+    assert exposed[("http_requests_total", requests + ',status="422"')] == 1
+    unmatched = 'method="GET",route="<unmatched>",status="404"'
+    assert exposed[("http_requests_total", unmatched)] == 1
+    assert exposed[("http_request_duration_seconds_count", requests)] == 3
+    endpoint = 'kind="endpoint",operation="/items/{itemId}"'
+    around = 'kind="validation_serialization",operation="/items/{itemId}"'
+    assert exposed[("operation_duration_seconds_count", endpoint)] == 3
+    assert exposed[("operation_duration_seconds_count", around)] == 3
+    # Two calls ran the endpoint, which sleeps; the invalid one never reached it.
+    assert exposed[("operation_duration_seconds_sum", endpoint)] >= 0.04
+    assert exposed[("operation_duration_seconds_sum", around)] < 0.04
+    total = exposed[("http_request_duration_seconds_sum", requests)]
+    assert total >= exposed[("operation_duration_seconds_sum", endpoint)]
+
+
+def test_metrics_endpoint_exposes_the_apps_metrics(api):
+    assert api("GET", "/hello-world").status_code == 200
+    response = api("GET", "/metrics")
+    assert response.status_code == 200
+    assert (
+        response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    )
+    exposed = samples(response.text)
+    hello = 'method="GET",route="/hello-world",status="200"'
+    assert exposed[("http_requests_total", hello)] >= 1
+    assert ("cli_commands_commands", "") in exposed
+    for name, labels in exposed:
+        if name.endswith("_bucket"):
+            assert re.search(r'le="[^"]+"$', labels)
@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+import project.auth_tokens
+import project.rate_limit
+import project.session_cache
+import pytest
+from project.rate_limit import LocalRateLimitBackend, RateLimit, RateLimiter
+from project.session_cache import CachedSession, SessionCache
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    fake = Clock()
+    monkeypatch.setattr(project.rate_limit, "time", fake)
+    return fake
+
+
+def take(backend: LocalRateLimitBackend, key: str, limit: RateLimit) -> float:
+    return asyncio.run(backend.take(key, limit))
+
+
+def test_backend_must_implement_take():
+    with pytest.raises(TypeError):
+        project.rate_limit.RateLimitBackend()
+
+
+def test_parse_rate_limits():
+    assert project.rate_limit.parse_rate_limits(
+        "POST  /login=10/60, GET /users/{userId}=5"
+    ) == {
+        "POST /login": RateLimit(rate=10 / 60, burst=10.0),
+        "GET /users/{userId}": RateLimit(rate=5.0, burst=5.0),
+    }
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    backend = LocalRateLimitBackend(max_keys=10)
+    limit = RateLimit(rate=0.5, burst=2)
+    assert take(backend, "k", limit) == 0
+    assert take(backend, "k", limit) == 0
+    assert take(backend, "k", limit) == pytest.approx(2.0)
+    clock.now += 1
+    assert take(backend, "k", limit) == pytest.approx(1.0)
+    clock.now += 1
+    assert take(backend, "k", limit) == 0
+    # Idle time never refills beyond the burst.
+    clock.now += 100
+    assert take(backend, "k", limit) == 0
+    assert take(backend, "k", limit) == 0
+    assert take(backend, "k", limit) > 0
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    backend = LocalRateLimitBackend(max_keys=2)
+    limit = RateLimit(rate=0.001, burst=1)
+    take(backend, "a", limit)
+    take(backend, "b", limit)
+    assert take(backend, "a", limit) > 0
+    take(backend, "c", limit)
+    assert backend.stats() == {"buckets": 2, "evictions": 1}
+    # "b" was evicted and starts again from a full bucket; "a" was kept.
+    assert take(backend, "b", limit) == 0
+    assert take(backend, "c", limit) > 0
+
+
+def make_app(limits: str):
+    limiter = RateLimiter(
+        LocalRateLimitBackend(max_keys=100),
+        project.rate_limit.parse_rate_limits(limits),
+    )
+
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(
+        routes=[
+            Route("/login", ok, methods=["POST"]),
+            Route("/users/{userId}", ok),
+        ]
+    )
+    return project.rate_limit.RateLimitMiddleware(app, limiter), limiter
+
+
+async def send(app, method: str, path: str, address: str = "10.0.0.1", **kwargs):
+    transport = httpx.ASGITransport(app=app, client=(address, 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.request(method, path, **kwargs)
+
+
+def test_limited_route_answers_429_with_retry_after(clock):
+    app, limiter = make_app("POST /login=2/60")
+
+    async def scenario():
+        allowed = [await send(app, "POST", "/login") for _ in range(2)]
+        rejected = await send(app, "POST", "/login")
+        other_address = await send(app, "POST", "/login", address="10.0.0.2")
+        unlimited = [await send(app, "GET", "/users/1") for _ in range(5)]
+        return allowed, rejected, other_address, unlimited
+
+    allowed, rejected, other_address, unlimited = asyncio.run(scenario())
+    assert [r.status_code for r in allowed] == [200, 200]
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "30"
+    assert rejected.json() == {"error": "Too many requests."}
+    assert other_address.status_code == 200
+    assert {r.status_code for r in unlimited} == {200}
+    assert limiter.stats()["rejected"] == 1
+
+
+def scope(query: str, address: str = "10.0.0.1"):
+    return {"query_string": query.encode(), "client": (address, 5000)}
+
+
+def test_callers_are_keyed_by_user_when_known_without_a_query(monkeypatch):
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", "signed")
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_SECRET", "secret")
+    monkeypatch.setattr(
+        project.auth_tokens,
+        "revocation_list",
+        project.auth_tokens.RevocationList(sync_interval=5, sync_overlap=300),
+    )
+    cache = SessionCache(max_size=10, ttl_seconds=60)
+    cache.put(42, CachedSession(userId=8, role="User", expiresAt=time.time() + 60))
+    monkeypatch.setattr(project.session_cache, "session_cache", cache)
+    signed = project.auth_tokens.issue_signed_token(
+        user_id=7,
+        role="User",
+        session_id=3,
+        expires_at=datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(hours=1),
+    )
+    limiter = RateLimiter(LocalRateLimitBackend(max_keys=10), {})
+    assert limiter.client_key(scope(f"token={signed}")) == "user:7"
+    assert limiter.client_key(scope("session_token=token-42")) == "user:8"
+    # Not cached: identifying the user would need a query, so the address is used.
+    assert limiter.client_key(scope("token=token-43")) == "ip:10.0.0.1"
+    assert limiter.client_key(scope("")) == "ip:10.0.0.1"
+    assert limiter.client_key({"query_string": b""}) == "ip:unknown"
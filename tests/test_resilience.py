@@ -0,0 +1,221 @@
+import asyncio
+import time
+
+import httpx
+import prisma.errors
+import project.resilience
+import project.server
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+
+def make_breaker(**overrides) -> project.resilience.CircuitBreaker:
+    settings = dict(
+        enabled=True,
+        window_size=4,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=10,
+        slow_call_rate=1.0,
+        open_seconds=0.05,
+        half_open_calls=2,
+        max_inflight=0,
+    )
+    settings.update(overrides)
+    return project.resilience.CircuitBreaker(**settings)
+
+
+async def succeed() -> str:
+    return "ok"
+
+
+async def fail() -> str:
+    raise ConnectionError("database unreachable")
+
+
+def engine_error(
+    code: str, error: type = prisma.errors.DataError
+) -> prisma.errors.DataError:
+    return error({"user_facing_error": {"error_code": code, "message": code}})
+
+
+async def trip(breaker: project.resilience.CircuitBreaker) -> None:
+    while breaker.state != "open":
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+
+
+def test_breaker_opens_once_the_failure_rate_is_reached():
+    async def scenario():
+        breaker = make_breaker()
+        await breaker.call(succeed)
+        await breaker.call(succeed)
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+        # Too few calls tracked to judge yet.
+        assert breaker.state == "closed"
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+        assert breaker.state == "open"
+        assert breaker.trips == 1
+        with pytest.raises(project.resilience.CircuitOpenError) as raised:
+            await breaker.call(succeed)
+        assert 0 < raised.value.retry_after <= 0.05
+        assert breaker.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_breaker_closes_after_successful_half_open_probes():
+    async def scenario():
+        breaker = make_breaker()
+        await trip(breaker)
+        await asyncio.sleep(0.06)
+        assert await breaker.call(succeed) == "ok"
+        assert breaker.state == "half_open"
+        assert await breaker.call(succeed) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_breaker_reopens_when_a_half_open_probe_fails():
+    async def scenario():
+        breaker = make_breaker()
+        await trip(breaker)
+        await asyncio.sleep(0.06)
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+        assert breaker.state == "open"
+        assert breaker.trips == 2
+        with pytest.raises(project.resilience.CircuitOpenError):
+            await breaker.call(succeed)
+
+    asyncio.run(scenario())
+
+
+def test_breaker_admits_only_half_open_calls_trial_queries():
+    async def scenario():
+        breaker = make_breaker(half_open_calls=1)
+        await trip(breaker)
+        await asyncio.sleep(0.06)
+        release = asyncio.Event()
+
+        async def held() -> str:
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.create_task(breaker.call(held))
+        await asyncio.sleep(0)
+        with pytest.raises(project.resilience.CircuitOpenError):
+            await breaker.call(succeed)
+        release.set()
+        assert await probe == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("code", ["P1001", "P1008", "P2024"])
+def test_unanswered_queries_open_the_breaker(code):
+    async def scenario():
+        breaker = make_breaker()
+
+        async def unanswered() -> str:
+            raise engine_error(code)
+
+        for _ in range(4):
+            with pytest.raises(prisma.errors.DataError):
+                await breaker.call(unanswered)
+        assert breaker.state == "open"
+        assert breaker.failures == 4
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        engine_error("P2002", prisma.errors.UniqueViolationError),
+        engine_error("P2025", prisma.errors.RecordNotFoundError),
+        engine_error("P2003", prisma.errors.ForeignKeyViolationError),
+        engine_error("P2000"),
+    ],
+)
+def test_answered_queries_count_as_successes(error):
+    async def scenario():
+        breaker = make_breaker()
+
+        async def rejected() -> str:
+            raise error
+
+        for _ in range(4):
+            with pytest.raises(prisma.errors.DataError):
+                await breaker.call(rejected)
+        assert breaker.state == "closed"
+        assert breaker.failures == 0
+
+    asyncio.run(scenario())
+
+
+def make_app(breaker: project.resilience.CircuitBreaker, deadline: float):
+    async def query(request: Request):
+        # Answered the way the API routes answer a failed service call.
+        try:
+            await breaker.call(lambda: asyncio.sleep(1))
+        except Exception as e:
+            return project.server._error_response(e)
+
+    return project.resilience.DeadlineMiddleware(
+        Starlette(routes=[Route("/query", query)]),
+        default_seconds=deadline,
+        overrides={},
+    )
+
+
+async def get(app, path: str, **kwargs) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, **kwargs)
+
+
+def test_deadline_turns_into_503_with_retry_after():
+    async def scenario():
+        breaker = make_breaker()
+        started = time.monotonic()
+        response = await get(make_app(breaker, deadline=0.05), "/query")
+        assert time.monotonic() - started < 0.5
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert breaker.deadline_exceeded == 1
+
+    asyncio.run(scenario())
+
+
+def test_request_timeout_header_shortens_the_deadline():
+    async def scenario():
+        breaker = make_breaker()
+        started = time.monotonic()
+        response = await get(
+            make_app(breaker, deadline=5),
+            "/query",
+            headers={"X-Request-Timeout": "0.05"},
+        )
+        assert time.monotonic() - started < 0.5
+        assert response.status_code == 503
+        assert "retry-after" in response.headers
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_answers_503_with_its_remaining_open_time():
+    async def scenario():
+        breaker = make_breaker(open_seconds=3)
+        await trip(breaker)
+        response = await get(make_app(breaker, deadline=5), "/query")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "3"
+
+    asyncio.run(scenario())
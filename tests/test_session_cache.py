@@ -0,0 +1,199 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+import prisma.models
+import project.auth_tokens
+import project.logoutUser_service
+import project.session_cache
+import pytest
+from project.session_cache import CachedSession, SessionCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    fake = Clock()
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+def session(user_id: int, expires_in: float = 3600) -> CachedSession:
+    return CachedSession(
+        userId=user_id, role="User", expiresAt=time.time() + expires_in
+    )
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    cache = SessionCache(max_size=2, ttl_seconds=60)
+    cache.put(1, session(1))
+    cache.put(2, session(2))
+    assert cache.get(1) is not None
+    cache.put(3, session(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.evictions == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = SessionCache(max_size=10, ttl_seconds=60)
+    cache.put(1, session(1))
+    clock.now += 59
+    assert cache.get(1) is not None
+    clock.now += 1
+    assert cache.peek(1) is None
+    assert cache.get(1) is None
+    assert cache.expirations == 1
+
+
+def test_entries_expire_with_their_session(clock):
+    cache = SessionCache(max_size=10, ttl_seconds=60)
+    cache.put(1, session(1, expires_in=5))
+    clock.now += 5
+    assert cache.get(1) is None
+
+
+def test_invalidation_drops_a_session_or_all_of_a_users_sessions(clock):
+    cache = SessionCache(max_size=10, ttl_seconds=60)
+    cache.put(1, session(1))
+    cache.put(2, session(1))
+    cache.put(3, session(2))
+    cache.invalidate(3)
+    assert cache.get(3) is None
+    cache.invalidate_user(1)
+    assert cache.get(1) is None and cache.get(2) is None
+    assert cache.invalidations == 3
+    assert cache.stats()["size"] == 0
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = SessionCache(max_size=0, ttl_seconds=60)
+    cache.put(1, session(1))
+    assert cache.get(1) is None
+
+
+class FakeRevokedSessions:
+    """
+    Stands in for the RevokedSession table, as written by another worker.
+    """
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def prisma(self) -> "FakeRevokedSessions":
+        return self
+
+    async def find_many(self, where):
+        since = where.get("revokedAt", {}).get("gte")
+        return [row for row in self.rows if since is None or row.revokedAt >= since]
+
+
+@pytest.fixture
+def revocations(monkeypatch) -> project.auth_tokens.RevocationList:
+    revocation_list = project.auth_tokens.RevocationList(
+        sync_interval=5, sync_overlap=300
+    )
+    monkeypatch.setattr(project.auth_tokens, "revocation_list", revocation_list)
+    monkeypatch.setattr(project.auth_tokens, "AUTH_TOKEN_MODE", "session")
+    monkeypatch.setattr(
+        project.session_cache,
+        "session_cache",
+        SessionCache(max_size=10, ttl_seconds=60),
+    )
+    return revocation_list
+
+
+def test_session_revoked_on_another_worker_is_denied_once_synced(
+    monkeypatch, revocations
+):
+    table = FakeRevokedSessions()
+    monkeypatch.setattr(prisma.models, "RevokedSession", table, raising=False)
+    cached = session(7)
+    project.session_cache.session_cache.put(42, cached)
+
+    async def scenario():
+        assert await project.auth_tokens.resolve_token("token-42") == cached
+        assert project.auth_tokens.peek_user_id("token-42") == 7
+        # Another worker logs the session out.
+        now = datetime.datetime.now(datetime.timezone.utc)
+        table.rows.append(
+            SimpleNamespace(
+                sessionId=42,
+                expiresAt=now + datetime.timedelta(hours=1),
+                revokedAt=now,
+            )
+        )
+        await revocations.sync()
+        assert await project.auth_tokens.resolve_token("token-42") is None
+        assert project.auth_tokens.peek_user_id("token-42") is None
+
+    asyncio.run(scenario())
+
+
+def test_revocations_are_pruned_once_the_session_would_have_expired(clock, revocations):
+    revocations.add(42, time.time() + 10)
+    revocations.add(43, None)
+    clock.now += 10
+    revocations.prune()
+    assert not revocations.is_revoked(42)
+    assert revocations.is_revoked(43)
+
+
+class FakeSessions:
+    def __init__(self, sessions) -> None:
+        self.sessions = sessions
+
+    def prisma(self) -> "FakeSessions":
+        return self
+
+    async def delete(self, where):
+        return self.sessions.pop(where["id"], None)
+
+
+class FakeRevokedSessionWrites:
+    def __init__(self) -> None:
+        self.rows = []
+
+    def prisma(self) -> "FakeRevokedSessionWrites":
+        return self
+
+    async def create_many(self, data, skip_duplicates):
+        self.rows.extend(data)
+        return len(data)
+
+
+def test_logout_of_a_session_token_is_revoked_for_other_workers(
+    monkeypatch, revocations
+):
+    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        hours=1
+    )
+    table = FakeRevokedSessionWrites()
+    monkeypatch.setattr(
+        prisma.models,
+        "Session",
+        FakeSessions({42: SimpleNamespace(id=42, expiresAt=expires_at)}),
+        raising=False,
+    )
+    monkeypatch.setattr(prisma.models, "RevokedSession", table, raising=False)
+    project.session_cache.session_cache.put(42, session(7))
+
+    async def scenario():
+        response = await project.logoutUser_service.logoutUser("token-42")
+        assert response.logout_success
+        again = await project.logoutUser_service.logoutUser("token-42")
+        assert not again.logout_success
+
+    asyncio.run(scenario())
+    assert table.rows == [{"sessionId": 42, "expiresAt": expires_at}]
+    assert revocations.is_revoked(42)
+    assert project.session_cache.session_cache.peek(42) is None